@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+按照主键范围分块比对Oracle与MySQL表数据的校验和
+每行数据转换为两边一致的字符串后计算MD5，每块汇总行数以及MD5前后各8位十六进制数的和(与行的顺序无关)，
+校验和不一致的块按照主键继续拆分，直到行数不超过leaf_rows，再读取该范围每行的主键以及MD5找出不一致的行
+"""
+import decimal
+
+import cx_Oracle
+
+# 可以按范围拆分的主键字段类型，字符串主键在Oracle与MySQL的排序规则不同，整表作为一块
+RANGE_TYPES = ('NUMBER', 'FLOAT', 'INTEGER', 'DATE')
+# 行字符串在Oracle中拼接，varchar2最长4000字节，按照字段的最大长度分组，每组单独计算MD5
+GROUP_BYTES = 2000
+# 超过该长度的字符串以及二进制字段先计算MD5再拼接
+INLINE_BYTES = 200
+NULL_MARK = '#N'
+
+
+def oracle_md5(expr, oracle_version):
+    # 12c以上使用STANDARD_HASH，11g使用DBMS_OBFUSCATION_TOOLKIT，统一转为UTF8后计算，结果为大写十六进制
+    if int(str(oracle_version).split('.')[0]) >= 12:
+        return "RAWTOHEX(STANDARD_HASH(CONVERT(%s,'AL32UTF8'),'MD5'))" % expr
+    return "RAWTOHEX(DBMS_OBFUSCATION_TOOLKIT.MD5(input => UTL_RAW.CAST_TO_RAW(CONVERT(%s,'AL32UTF8'))))" % expr
+
+
+def mysql_md5(expr):
+    return 'UPPER(MD5(%s))' % expr
+
+
+def canonical_expr(data_type, data_length, column_name):
+    """
+    返回(Oracle表达式, MySQL表达式, 最大字节数, 是否先计算MD5)，不支持的字段类型返回None
+    数值去掉末尾的0，日期以及时间戳按照固定格式，CHAR去掉末尾空格，大字段按照长度以及前900个字符比较
+    MySQL表达式用于带参数执行，百分号需要写为%%
+    """
+    ora_col = '"%s"' % column_name
+    my_col = '`%s`' % column_name
+    if data_type in ('NUMBER', 'INTEGER'):
+        return ("REGEXP_REPLACE(TO_CHAR(%s),'^(-?)\\.','\\10.')" % ora_col,
+                "TRIM(TRAILING '.' FROM TRIM(TRAILING '0' FROM CAST(%s AS DECIMAL(65,30))))" % my_col, 45, False)
+    if data_type in ('FLOAT', 'BINARY_FLOAT', 'BINARY_DOUBLE'):  # 浮点数保留6位小数比较
+        return ("REGEXP_REPLACE(TO_CHAR(ROUND(CAST(%s AS NUMBER),6)),'^(-?)\\.','\\10.')" % ora_col,
+                "TRIM(TRAILING '.' FROM TRIM(TRAILING '0' FROM CAST(%s AS DECIMAL(65,6))))" % my_col, 45, False)
+    if data_type == 'DATE':
+        return ("TO_CHAR(%s,'YYYY-MM-DD HH24:MI:SS')" % ora_col,
+                "DATE_FORMAT(%s,'%%%%Y-%%%%m-%%%%d %%%%H:%%%%i:%%%%s')" % my_col, 19, False)
+    if data_type.startswith('TIMESTAMP') and 'ZONE' not in data_type:
+        return ("TO_CHAR(%s,'YYYY-MM-DD HH24:MI:SS.FF6')" % ora_col,
+                "DATE_FORMAT(%s,'%%%%Y-%%%%m-%%%%d %%%%H:%%%%i:%%%%s.%%%%f')" % my_col, 26, False)
+    if data_type in ('CHAR', 'NCHAR'):
+        return 'RTRIM(%s)' % ora_col, 'RTRIM(%s)' % my_col, data_length, data_length > INLINE_BYTES
+    if data_type in ('VARCHAR2', 'NVARCHAR2'):
+        return ora_col, my_col, data_length, data_length > INLINE_BYTES
+    # Oracle中null与字符串拼接结果不为null，大字段为null时需要单独判断
+    if data_type in ('CLOB', 'NCLOB'):
+        return ("CASE WHEN %s IS NULL THEN NULL ELSE TO_CHAR(DBMS_LOB.GETLENGTH(%s))||':'||DBMS_LOB.SUBSTR(%s,900,1) END"
+                % (ora_col, ora_col, ora_col),
+                "CONCAT(CHAR_LENGTH(%s),':',SUBSTRING(%s,1,900))" % (my_col, my_col), 4000, True)
+    if data_type == 'BLOB':
+        return ("CASE WHEN %s IS NULL THEN NULL ELSE TO_CHAR(DBMS_LOB.GETLENGTH(%s))||':'||"
+                "RAWTOHEX(DBMS_LOB.SUBSTR(%s,900,1)) END" % (ora_col, ora_col, ora_col),
+                "CONCAT(LENGTH(%s),':',HEX(SUBSTRING(%s,1,900)))" % (my_col, my_col), 4000, True)
+    if data_type == 'RAW':
+        return 'RAWTOHEX(%s)' % ora_col, 'HEX(%s)' % my_col, data_length * 2, data_length * 2 > INLINE_BYTES
+    return None  # LONG、LONG RAW、XMLTYPE等类型不参与校验
+
+
+def oracle_value(expr):
+    return "NVL(%s,'%s')" % (expr, NULL_MARK)
+
+
+def mysql_value(expr):
+    # Oracle中空字符串即为null，MySQL这边同样处理
+    return "IFNULL(NULLIF(%s,''),'%s')" % (expr, NULL_MARK)
+
+
+def fetch_one(cursor, sql, args):
+    cursor.execute(sql, args)
+    return cursor.fetchone()
+
+
+def fetch_limit(cursor, sql, args, limit):
+    cursor.execute(sql, args)
+    return cursor.fetchmany(limit + 1)
+
+
+def number_to_decimal(cursor, name, default_type, size, precision, scale):
+    if default_type == cx_Oracle.DB_TYPE_NUMBER:
+        return cursor.var(decimal.Decimal, arraysize=cursor.arraysize)
+
+
+def fetch_bounds(cursor, sql, args):
+    # 主键的拆分边界，number按照Decimal获取，避免float丢失精度导致两边范围不一致
+    cursor.outputtypehandler = number_to_decimal
+    try:
+        cursor.execute(sql, args)
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.outputtypehandler = None
+
+
+def table_meta(cursor, table_name):
+    cursor.execute("""select column_name,data_type,data_length from user_tab_columns where table_name=:t
+    order by column_id""", t=table_name)
+    columns = cursor.fetchall()
+    cursor.execute("""select b.column_name,c.data_type from user_constraints a,user_cons_columns b,user_tab_columns c
+    where a.constraint_name=b.constraint_name and a.table_name=:t and a.constraint_type='P'
+    and c.table_name=b.table_name and c.column_name=b.column_name order by b.position""", t=table_name)
+    key_columns = cursor.fetchall()
+    cursor.execute("""select nvl(num_rows,0) from user_tables where table_name=:t""", t=table_name)
+    row = cursor.fetchone()
+    return columns, key_columns, int(row[0]) if row else 0
+
+
+class TableChecksum(object):
+    """一张表两边的校验和SQL，target_name为MySQL中的表名，默认与源表名相同"""
+
+    def __init__(self, sourcedb, table_name, columns, key_columns, oracle_version, target_name=None):
+        self.table_name = table_name
+        self.ora_table = '%s."%s"' % (sourcedb, table_name)
+        self.my_table = '`%s`' % (target_name or table_name)
+        self.skipped_columns = []
+        groups = []  # 每组为[(Oracle表达式, MySQL表达式)]
+        group_bytes = GROUP_BYTES
+        for column_name, data_type, data_length in columns:
+            expr = canonical_expr(data_type, int(data_length or 0), column_name)
+            if expr is None:
+                self.skipped_columns.append(column_name)
+                continue
+            ora_expr, my_expr, size, hashed = expr
+            if hashed:
+                ora_expr, my_expr, size = oracle_md5(oracle_value(ora_expr), oracle_version), mysql_md5(
+                    mysql_value(my_expr)), 32
+            if group_bytes + size + 1 > GROUP_BYTES:
+                groups.append([])
+                group_bytes = 0
+            groups[-1].append((oracle_value(ora_expr), mysql_value(my_expr)))
+            group_bytes += size + 1
+        self.ora_hash = [oracle_md5("||'|'||".join(e[0] for e in group), oracle_version) for group in groups]
+        self.my_hash = [mysql_md5("CONCAT(%s)" % ",'|',".join(e[1] for e in group)) for group in groups]
+        self.key_names = [k[0] for k in key_columns]
+        key_exprs = [canonical_expr(k[1], 0, k[0]) or ('"%s"' % k[0], '`%s`' % k[0], 0, False) for k in key_columns]
+        self.ora_keys = [oracle_value(e[0]) for e in key_exprs]
+        self.my_keys = [mysql_value(e[1]) for e in key_exprs]
+        # 第一个主键字段为数值或者日期时按照范围拆分
+        self.range_key = key_columns[0][0] if key_columns and (
+                key_columns[0][1] in RANGE_TYPES or key_columns[0][1].startswith('TIMESTAMP')) else None
+
+    def where(self, lo, hi):
+        # 返回(Oracle条件, Oracle参数, MySQL条件, MySQL参数)，范围为(lo, hi]，None表示不限制
+        ora_where, my_where, ora_args, my_args = ['1 = 1'], ['1 = 1'], {}, []
+        if lo is not None:
+            ora_where.append('"%s" > :lo' % self.range_key)
+            my_where.append('`%s` > %%s' % self.range_key)
+            ora_args['lo'] = lo
+            my_args.append(lo)
+        if hi is not None:
+            ora_where.append('"%s" <= :hi' % self.range_key)
+            my_where.append('`%s` <= %%s' % self.range_key)
+            ora_args['hi'] = hi
+            my_args.append(hi)
+        return ' and '.join(ora_where), ora_args, ' and '.join(my_where), tuple(my_args)
+
+    def chunk_sql(self, lo, hi):
+        # 返回Oracle以及MySQL的(sql, 参数)，结果为行数以及每组MD5前后8位的和
+        ora_where, ora_args, my_where, my_args = self.where(lo, hi)
+        ora_sums, my_sums = ['count(*)'], ['count(*)']
+        for i in range(len(self.ora_hash)):
+            for start in (1, 9):
+                ora_sums.append("nvl(sum(to_number(substr(h%s,%s,8),'XXXXXXXX')),0)" % (i, start))
+                my_sums.append('ifnull(sum(cast(conv(substring(h%s,%s,8),16,10) as unsigned)),0)' % (i, start))
+        ora_cols = ','.join(['1 c'] + ['%s h%s' % (h, i) for i, h in enumerate(self.ora_hash)])
+        my_cols = ','.join(['1 c'] + ['%s h%s' % (h, i) for i, h in enumerate(self.my_hash)])
+        return ('select %s from (select %s from %s where %s)' % (','.join(ora_sums), ora_cols, self.ora_table,
+                                                                 ora_where), ora_args), \
+               ('select %s from (select %s from %s where %s) t' % (','.join(my_sums), my_cols, self.my_table,
+                                                                   my_where), my_args)
+
+    def split_sql(self, lo, hi, parts):
+        # Oracle中该范围按照主键分为parts份，返回每份的最大主键
+        ora_where, ora_args, my_where, my_args = self.where(lo, hi)
+        ora_args['parts'] = parts
+        return ('select max(k) from (select "%s" k,ntile(:parts) over (order by "%s") nt from %s where %s) '
+                'group by nt order by 1' % (self.range_key, self.range_key, self.ora_table, ora_where), ora_args)
+
+    def row_sql(self, lo, hi):
+        # 每行的主键以及MD5，没有主键的表只有MD5
+        ora_where, ora_args, my_where, my_args = self.where(lo, hi)
+        ora_hash = "||".join(self.ora_hash) or "'1'"
+        my_hash = "CONCAT(%s)" % ','.join(self.my_hash) if self.my_hash else "'1'"
+        return ('select %s from %s where %s' % (','.join(self.ora_keys + [ora_hash]), self.ora_table, ora_where),
+                ora_args), \
+               ('select %s from %s where %s' % (','.join(self.my_keys + [my_hash]), self.my_table, my_where),
+                my_args)
+
+
+class ChecksumCompare(object):
+    """
+    使用oracle_pool以及mysql_pool的会话并行计算每块的校验和，同一块两边同时计算
+    compare_table返回该表的比对结果，可以在多个线程中同时比对不同的表
+    """
+
+    def __init__(self, sourcedb, oracle_pool, mysql_pool, oracle_version, chunk_rows=100000, leaf_rows=1000,
+                 fanout=8, max_diff_rows=100):
+        self.sourcedb = sourcedb
+        self.oracle_pool = oracle_pool
+        self.mysql_pool = mysql_pool
+        self.oracle_version = oracle_version
+        self.chunk_rows = max(int(chunk_rows), 1)
+        self.leaf_rows = max(int(leaf_rows), 1)
+        self.fanout = max(int(fanout), 2)
+        self.max_diff_rows = int(max_diff_rows)
+
+    def compare_table(self, table_name, target_name=None):
+        """
+        返回dict: source_rows, target_rows, chunks(比对的块数), mismatch_chunks, diff_rows(不一致的行,
+        每行为(类型, 主键)), skipped_columns, is_success
+        """
+        columns, key_columns, num_rows = self.oracle_pool.submit(table_meta, table_name).result()
+        checksum = TableChecksum(self.sourcedb, table_name, columns, key_columns, self.oracle_version, target_name)
+        result = {'source_rows': 0, 'target_rows': 0, 'chunks': 0, 'mismatch_chunks': 0, 'diff_rows': [],
+                  'truncated': False, 'skipped_columns': checksum.skipped_columns}
+        ranges = [(None, None)]
+        parts = -(-num_rows // self.chunk_rows)
+        if checksum.range_key and parts > 1:
+            ranges = self.split(checksum, None, None, parts)
+        self.check_ranges(checksum, ranges, result)
+        result['is_success'] = 'Y' if result['mismatch_chunks'] == 0 else 'N'
+        return result
+
+    def split(self, checksum, lo, hi, parts):
+        sql, args = checksum.split_sql(lo, hi, parts)
+        bounds = []
+        for bound in self.oracle_pool.submit(fetch_bounds, sql, args).result()[:-1]:
+            if bound is not None and (not bounds or bound > bounds[-1]):
+                bounds.append(bound)
+        # 最后一块不设上限，包含MySQL中超出Oracle最大主键的行
+        return list(zip([lo] + bounds, bounds + [hi]))
+
+    def check_ranges(self, checksum, ranges, result, parent_rows=None):
+        # parent_rows为空时是第一层的块，统计行数以及不一致的块数
+        top_level = parent_rows is None
+        futures = []
+        for lo, hi in ranges:
+            ora_sql, my_sql = checksum.chunk_sql(lo, hi)
+            futures.append((lo, hi, self.oracle_pool.submit(fetch_one, *ora_sql),
+                            self.mysql_pool.submit(fetch_one, *my_sql)))
+        for lo, hi, ora_future, my_future in futures:
+            ora_sum = [int(v) for v in ora_future.result()]
+            my_sum = [int(v) for v in my_future.result()]
+            result['chunks'] += 1
+            if top_level:
+                result['source_rows'] += ora_sum[0]
+                result['target_rows'] += my_sum[0]
+            if ora_sum == my_sum:
+                continue
+            if top_level:
+                result['mismatch_chunks'] += 1
+            # 拆分之后行数没有减少(复合主键第一个字段的值相同)时不再拆分
+            if checksum.range_key and self.leaf_rows < ora_sum[0] and (top_level or ora_sum[0] < parent_rows):
+                sub_ranges = self.split(checksum, lo, hi, self.fanout)
+                if len(sub_ranges) > 1:
+                    self.check_ranges(checksum, sub_ranges, result, ora_sum[0])
+                    continue
+            self.diff_rows(checksum, lo, hi, result)
+
+    def diff_rows(self, checksum, lo, hi, result):
+        # 读取该范围两边每行的主键以及MD5，没有主键时按照MD5的出现次数比较
+        if len(result['diff_rows']) >= self.max_diff_rows:
+            result['truncated'] = True
+            return
+        limit = max(self.leaf_rows * self.fanout, self.max_diff_rows)
+        ora_sql, my_sql = checksum.row_sql(lo, hi)
+        ora_future = self.oracle_pool.submit(fetch_limit, ora_sql[0], ora_sql[1], limit)
+        my_future = self.mysql_pool.submit(fetch_limit, my_sql[0], my_sql[1], limit)
+        ora_rows, my_rows = ora_future.result(), my_future.result()
+        if len(ora_rows) > limit or len(my_rows) > limit:
+            # 不能继续拆分的大块，两边没有排序的前limit行是不同的子集，逐行比较会得到错误的结果，只记录块不一致
+            result['truncated'] = True
+            chunk = 'whole table' if lo is None and hi is None else 'range (%s, %s]' % (lo, hi)
+            result['diff_rows'].append(('CHUNK MISMATCH', '%s more than %s rows, please run --mode diff' % (chunk, limit)))
+            return
+        source, target = {}, {}
+        for rows, side in ((ora_rows, source), (my_rows, target)):
+            for row in rows:
+                key = tuple(row[:-1]) if checksum.key_names else (row[-1],)
+                side.setdefault(key, []).append(row[-1])
+        for key in sorted(set(source) | set(target), key=str):
+            if len(result['diff_rows']) >= self.max_diff_rows:
+                result['truncated'] = True
+                break
+            ora_hash, my_hash = source.get(key, []), target.get(key, [])
+            if not my_hash:
+                result['diff_rows'].append(('MISSING IN TARGET', key))
+            elif not ora_hash:
+                result['diff_rows'].append(('EXTRA IN TARGET', key))
+            elif sorted(ora_hash) != sorted(my_hash):
+                result['diff_rows'].append(('DIFFERENT' if checksum.key_names else 'COUNT DIFFERENT', key))
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+按照字段比较Oracle与MySQL表数据的统计特征，每张表两边各执行一次聚合查询
+每个字段统计null的行数，数值以及日期字段的最小值、最大值，数值字段的和，字符串以及大字段的总长度
+可以发现dataconvert转换时数值截断、小数丢失、字符串截断等问题，代价远小于逐行比较
+"""
+import decimal
+
+import data_checksum
+
+NUMBER_TYPES = ('NUMBER', 'INTEGER')
+FLOAT_TYPES = ('FLOAT', 'BINARY_FLOAT', 'BINARY_DOUBLE')
+# 每条查询最多包含的字段数，超过的宽表分为多条查询，Oracle查询的字段数上限为1000
+MAX_COLUMNS = 100
+
+
+def column_metrics(data_type, column_name):
+    """
+    返回[(统计项, Oracle表达式, MySQL表达式)]，不支持的字段类型返回空列表
+    Oracle中空字符串即为null，MySQL的字符串字段空字符串同样统计为null
+    字符串的最小值、最大值受两边排序规则影响，只比较总长度，MySQL表达式不带参数执行，百分号不需要转义
+    """
+    ora_col = '"%s"' % column_name
+    my_col = '`%s`' % column_name
+    ora_nulls = 'sum(case when %s is null then 1 else 0 end)' % ora_col
+    my_nulls = 'sum(case when %s is null then 1 else 0 end)' % my_col
+    if data_type in NUMBER_TYPES or data_type in FLOAT_TYPES:
+        return [('NULLS', ora_nulls, my_nulls)] + [
+            (func.upper(), '%s(%s)' % (func, ora_col), '%s(%s)' % (func, my_col)) for func in ('min', 'max', 'sum')]
+    if data_type == 'DATE':
+        return [('NULLS', ora_nulls, my_nulls)] + [
+            (func.upper(), "to_char(%s(%s),'YYYY-MM-DD HH24:MI:SS')" % (func, ora_col),
+             "date_format(%s(%s),'%%Y-%%m-%%d %%H:%%i:%%s')" % (func, my_col)) for func in ('min', 'max')]
+    if data_type.startswith('TIMESTAMP') and 'ZONE' not in data_type:
+        return [('NULLS', ora_nulls, my_nulls)] + [
+            (func.upper(), "to_char(%s(%s),'YYYY-MM-DD HH24:MI:SS.FF6')" % (func, ora_col),
+             "date_format(%s(%s),'%%Y-%%m-%%d %%H:%%i:%%s.%%f')" % (func, my_col)) for func in ('min', 'max')]
+    if data_type in ('CHAR', 'NCHAR'):  # CHAR去掉末尾空格之后比较长度
+        return [('NULLS', ora_nulls, my_nulls),
+                ('LENGTH', 'sum(length(rtrim(%s)))' % ora_col, 'sum(char_length(rtrim(%s)))' % my_col)]
+    my_nulls = "sum(case when %s is null or %s='' then 1 else 0 end)" % (my_col, my_col)
+    if data_type in ('VARCHAR2', 'NVARCHAR2'):
+        return [('NULLS', ora_nulls, my_nulls),
+                ('LENGTH', 'sum(length(%s))' % ora_col, 'sum(char_length(%s))' % my_col)]
+    if data_type in ('CLOB', 'NCLOB'):
+        return [('NULLS', ora_nulls, my_nulls),
+                ('LENGTH', 'sum(dbms_lob.getlength(%s))' % ora_col, 'sum(char_length(%s))' % my_col)]
+    if data_type in ('BLOB', 'RAW'):  # 二进制字段比较总字节数
+        return [('NULLS', ora_nulls, my_nulls),
+                ('LENGTH', 'sum(%s)' % ('dbms_lob.getlength(%s)' % ora_col if data_type == 'BLOB' else
+                                        'length(%s)' % ora_col), 'sum(length(%s))' % my_col)]
+    return []  # LONG、LONG RAW、XMLTYPE等类型不参与比较
+
+
+def oracle_fetch(cursor, sql):
+    # number按照Decimal获取，与MySQL的decimal结果精确比较
+    cursor.outputtypehandler = data_checksum.number_to_decimal
+    try:
+        cursor.execute(sql)
+        return cursor.fetchone()
+    finally:
+        cursor.outputtypehandler = None
+
+
+def mysql_fetch(cursor, sql):
+    cursor.execute(sql)
+    return cursor.fetchone()
+
+
+def same_value(source_value, target_value, data_type, float_tolerance):
+    # 浮点数按照相对误差比较，其他类型精确比较
+    if source_value is None or target_value is None:
+        return source_value is None and target_value is None
+    if isinstance(source_value, str) or isinstance(target_value, str):
+        return str(source_value) == str(target_value)
+    if data_type in FLOAT_TYPES:
+        source_value, target_value = float(source_value), float(target_value)
+        return abs(source_value - target_value) <= float_tolerance * max(abs(source_value), abs(target_value), 1.0)
+    return decimal.Decimal(str(source_value)) == decimal.Decimal(str(target_value))
+
+
+class TableProfile(object):
+    """一张表两边的聚合查询，第一条查询的第一个字段为表的行数，target_name为MySQL中的表名，默认与源表名相同"""
+
+    def __init__(self, sourcedb, table_name, columns, target_name=None):
+        self.table_name = table_name
+        self.metrics = []  # [(字段名, 字段类型, 统计项, Oracle表达式, MySQL表达式)]
+        self.skipped_columns = []
+        for column_name, data_type in columns:
+            metrics = column_metrics(data_type, column_name)
+            if not metrics:
+                self.skipped_columns.append(column_name)
+            for metric, ora_expr, my_expr in metrics:
+                self.metrics.append((column_name, data_type, metric, ora_expr, my_expr))
+        self.queries = []  # [(Oracle sql, MySQL sql, 该条查询的统计项)]
+        column_names = []
+        for m in self.metrics:
+            if m[0] not in column_names:
+                column_names.append(m[0])
+        for i in range(0, max(len(column_names), 1), MAX_COLUMNS):
+            group = set(column_names[i:i + MAX_COLUMNS])
+            metrics = [m for m in self.metrics if m[0] in group]
+            ora_exprs = ['count(*)'] + [m[3] for m in metrics]
+            my_exprs = ['count(*)'] + [m[4] for m in metrics]
+            self.queries.append(('select %s from %s."%s"' % (','.join(ora_exprs), sourcedb, table_name),
+                                 'select %s from `%s`' % (','.join(my_exprs), target_name or table_name), metrics))
+
+
+class ProfileCompare(object):
+    """
+    使用oracle_pool以及mysql_pool的会话，同一张表两边的聚合查询同时执行
+    submit只提交查询不等待，result等待查询完成并比较，可以先提交所有表再依次获取结果
+    """
+
+    def __init__(self, sourcedb, oracle_pool, mysql_pool, float_tolerance=0.000001):
+        self.sourcedb = sourcedb
+        self.oracle_pool = oracle_pool
+        self.mysql_pool = mysql_pool
+        self.float_tolerance = float(float_tolerance)
+
+    def submit(self, table_name, columns, target_name=None):
+        # columns为[(字段名, 字段类型)]，按照column_id排序
+        profile = TableProfile(self.sourcedb, table_name, columns, target_name)
+        return profile, [(self.oracle_pool.submit(oracle_fetch, ora_sql), self.mysql_pool.submit(mysql_fetch, my_sql),
+                          metrics) for ora_sql, my_sql, metrics in profile.queries]
+
+    def result(self, submitted):
+        """
+        返回dict: source_rows, target_rows, mismatches(不一致的统计项, 每项为(字段名, 统计项, 源值, 目标值)),
+        skipped_columns, is_success
+        """
+        profile, futures = submitted
+        result = {'source_rows': -1, 'target_rows': -1, 'mismatches': [],
+                  'skipped_columns': profile.skipped_columns}
+        for i, (ora_future, my_future, metrics) in enumerate(futures):
+            ora_row, my_row = ora_future.result(), my_future.result()
+            if i == 0:
+                result['source_rows'], result['target_rows'] = int(ora_row[0]), int(my_row[0])
+            for (column_name, data_type, metric, ora_expr, my_expr), source_value, target_value in zip(
+                    metrics, ora_row[1:], my_row[1:]):
+                if metric in ('NULLS', 'LENGTH'):  # 空表的sum结果为null
+                    source_value, target_value = source_value or 0, target_value or 0
+                if not same_value(source_value, target_value, data_type, self.float_tolerance):
+                    result['mismatches'].append((column_name, metric, source_value, target_value))
+        result['is_success'] = 'Y' if result['source_rows'] == result['target_rows'] and not result[
+            'mismatches'] else 'N'
+        return result
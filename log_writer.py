@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import atexit
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+
+
+class LogWriter(object):
+    """
+    替换sys.stdout，同时输出到终端以及日志文件
+    write只把内容放入有界队列，由写入线程合并之后一次写入，日志文件只打开一次，
+    按照flush_interval定时刷新，调用flush或者程序退出时立即写入
+    队列满时write会等待写入线程，避免日志过多占满内存
+    """
+    _STOP = object()
+
+    def __init__(self, filename='run.log', add_flag=True, stream=None, max_lines=10000, flush_interval=0.5):
+        self.terminal = stream if stream is not None else open(sys.stdout.fileno(), mode='w', encoding='utf8',
+                                                               buffering=1)
+        self.filename = filename
+        self.add_flag = add_flag
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_lines)
+        self._child_queue = None  # 子进程输出的日志
+        self._child_thread = None
+        self._thread = threading.Thread(target=self._run, name='log_writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        # encoding、fileno等属性使用终端的
+        if name == 'terminal':
+            raise AttributeError(name)
+        return getattr(self.terminal, name)
+
+    def write(self, message):
+        if message and self._thread.is_alive():
+            self._queue.put(message)
+        elif message:
+            self.terminal.write(message)
+
+    def flush(self):
+        """等待队列中已有的内容写入终端以及日志文件，input()显示提示之前也会调用"""
+        if self._thread.is_alive() and threading.current_thread() is not self._thread:
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+
+    def close(self):
+        if self._child_thread is not None:
+            self._child_queue.put(None)
+            self._child_thread.join()
+            self._child_thread = None
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def child_queue(self):
+        """
+        子进程输出日志使用的队列，需要在启动子进程之前调用
+        子进程调用redirect_stdout(queue)之后，print的内容由主进程的写入线程写入，子进程不需要打开日志文件
+        """
+        if self._child_queue is None:
+            self._child_queue = multiprocessing.Queue()
+            self._child_thread = threading.Thread(target=self._receive_child, name='log_receiver', daemon=True)
+            self._child_thread.start()
+        return self._child_queue
+
+    def _receive_child(self):
+        while True:
+            message = self._child_queue.get()
+            if message is None:
+                break
+            self.write(message)
+
+    def _run(self):
+        log = open(self.filename, 'a+' if self.add_flag else 'w', encoding='utf-8')
+        pending = []
+        last_flush = time.time()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if isinstance(item, str):
+                pending.append(item)
+                if len(pending) < 1000 and time.time() - last_flush < self.flush_interval:
+                    continue
+            if pending:
+                text = ''.join(pending)
+                pending = []
+                try:
+                    self.terminal.write(text)
+                    self.terminal.flush()
+                    log.write(text)
+                    log.flush()
+                except Exception as e:
+                    sys.__stderr__.write(str(e) + '\n')
+                last_flush = time.time()
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._STOP:
+                break
+        log.close()
+
+
+class ChildLogStream(object):
+    """子进程的sys.stdout，按行把内容发送到主进程LogWriter的队列"""
+
+    def __init__(self, log_queue):
+        self.log_queue = log_queue
+        self.buffer = ''
+        self.lock = threading.Lock()
+
+    def write(self, message):
+        with self.lock:
+            self.buffer += message
+            if '\n' in self.buffer:
+                lines, self.buffer = self.buffer.rsplit('\n', 1)
+                self.log_queue.put(lines + '\n')
+
+    def flush(self):
+        with self.lock:
+            if self.buffer:
+                self.log_queue.put(self.buffer)
+                self.buffer = ''
+
+
+def redirect_stdout(log_queue):
+    # 在子进程开始时调用，log_queue为空时保持原来的输出，子进程结束前需要调用sys.stdout.flush()
+    if log_queue is not None:
+        sys.stdout = ChildLogStream(log_queue)
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+import datetime
+import http.server
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+# 批次耗时直方图的分桶，单位秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def batch_bytes(rows):
+    """估算一批数据的字节数，字符串以及二进制按长度计算，其他非空值按8字节计算"""
+    size = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+            elif value is not None:
+                size += 8
+    return size
+
+
+def batch_event(table_name, thread, chunk, rows, size, start_time, fetch_ms, insert_ms, failed=False):
+    # 数据迁移线程每插入一批数据产生一个事件
+    return {'event': 'batch', 'ts': start_time, 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'table': table_name, 'thread': thread, 'chunk': chunk, 'rows': rows, 'bytes': size,
+            'fetch_ms': round(fetch_ms, 3), 'insert_ms': round(insert_ms, 3), 'failed': failed}
+
+
+def table_event(event, table_name, source_rows=0):
+    # 表开始迁移(table_start)以及迁移完成(table_end)的事件
+    return {'event': event, 'ts': time.time(), 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'table': table_name, 'source_rows': source_rows}
+
+
+def session_event(event, table_name):
+    # 迁移线程打开(session_start)以及关闭(session_end)Oracle和MySQL会话的事件
+    return {'event': event, 'ts': time.time(), 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'table': table_name}
+
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    return '%02d:%02d:%02d' % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+class MetricsAggregator(object):
+    """
+    在主进程汇总数据迁移子进程发送的事件
+    子进程把batch_event/table_event放入event_queue，汇总线程写入metrics.jsonl，
+    并且每隔progress_interval秒输出一行进度，包括行数、速度以及按照剩余行数估算的剩余时间
+    add_sink注册的对象会收到每个事件(on_event)，结束时调用close
+    """
+
+    def __init__(self, log_path, estimate_rows=None, progress_interval=10):
+        self.filename = log_path + 'metrics.jsonl'
+        self.progress_interval = progress_interval
+        self.event_queue = multiprocessing.Queue()
+        self.table_rows = dict(estimate_rows or {})  # 每张表的源表行数，开始迁移之前为统计信息的估算值
+        self.table_done_rows = {}  # 每张表已经插入的行数
+        self.table_bytes = {}
+        self.tables_done = 0
+        self.tables_started = 0
+        self.failed_batches = 0
+        self.active_sessions = 0
+        self.total_rows = 0
+        self.total_bytes = 0
+        self.sinks = []
+        self.begin_time = time.time()
+        self._thread = None
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def start(self):
+        self.begin_time = time.time()
+        self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self.event_queue.put(None)
+            self._thread.join()
+            self._thread = None
+            for sink in self.sinks:
+                sink.close()
+            self.print_progress(final=True)
+
+    def _run(self):
+        f = open(self.filename, 'a', encoding='utf-8')
+        last_progress = time.time()
+        while True:
+            try:
+                event = self.event_queue.get(timeout=1)
+            except queue.Empty:
+                event = False  # 超时，只检查是否需要输出进度
+            if event is None:
+                break
+            if event:
+                self.add_event(event)
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + '\n')
+            if time.time() - last_progress >= self.progress_interval:
+                f.flush()
+                self.print_progress()
+                last_progress = time.time()
+        f.close()
+
+    def add_event(self, event):
+        table_name = event['table']
+        if event['event'] == 'batch':
+            if event['failed']:
+                self.failed_batches += 1
+            else:
+                self.table_done_rows[table_name] = self.table_done_rows.get(table_name, 0) + event['rows']
+                self.total_rows += event['rows']
+            self.table_bytes[table_name] = self.table_bytes.get(table_name, 0) + event['bytes']
+            self.total_bytes += event['bytes']
+        elif event['event'] == 'table_start':
+            self.table_rows[table_name] = event['source_rows']
+            self.tables_started += 1
+        elif event['event'] == 'table_end':
+            self.tables_done += 1
+        elif event['event'] == 'session_start':
+            self.active_sessions += 1
+        elif event['event'] == 'session_end':
+            self.active_sessions -= 1
+        for sink in self.sinks:
+            sink.on_event(event)
+
+    def queue_depth(self):
+        try:
+            return self.event_queue.qsize()
+        except NotImplementedError:  # macOS不支持Queue.qsize
+            return 0
+
+    def print_progress(self, final=False):
+        elapsed = max(time.time() - self.begin_time, 0.001)
+        expect_rows = max(sum(self.table_rows.values()), self.total_rows)
+        rows_per_second = self.total_rows / elapsed
+        if final:
+            eta = 'FINISH'
+        elif rows_per_second > 0:
+            eta = 'ETA ' + format_seconds((expect_rows - self.total_rows) / rows_per_second)
+        else:
+            eta = 'ETA --:--:--'
+        percent = self.total_rows * 100.0 / expect_rows if expect_rows else 100.0
+        print('%s PROGRESS tables %s/%s rows %s/%s (%.1f%%) %.0f rows/s %.2f MB/s failed batches %s elapsed %s %s' % (
+            str(datetime.datetime.now())[:19], self.tables_done, len(self.table_rows), self.total_rows, expect_rows,
+            percent, rows_per_second, self.total_bytes / elapsed / 1048576, self.failed_batches,
+            format_seconds(elapsed), eta))
+
+
+class PrometheusSink(object):
+    """
+    把MetricsAggregator汇总的指标输出为Prometheus文本格式
+    port不为0时在127.0.0.1:port提供/metrics，textfile不为空时定时写入node_exporter textfile collector目录的文件
+    """
+
+    def __init__(self, aggregator, port=0, textfile='', interval=10):
+        self.aggregator = aggregator
+        self.textfile = textfile
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.table_rows = {}
+        self.table_bytes = {}
+        self.latency = {'oracle_fetch': [0] * (len(LATENCY_BUCKETS) + 1),
+                        'mysql_insert': [0] * (len(LATENCY_BUCKETS) + 1)}
+        self.latency_sum = {'oracle_fetch': 0.0, 'mysql_insert': 0.0}
+        self.failed_batches = {}
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+        if port:
+            sink = self
+
+            class MetricsHandler(http.server.BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = sink.render().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):  # 不把每次抓取写入mig.log
+                    pass
+
+            try:
+                self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+                self._threads.append(threading.Thread(target=self._server.serve_forever, name='prometheus',
+                                                      daemon=True))
+                print('PROMETHEUS METRICS http://127.0.0.1:%s/metrics' % port)
+            except Exception as e:
+                print(e, 'start prometheus metrics endpoint failed')
+        if textfile:
+            self._threads.append(threading.Thread(target=self._write_loop, name='prometheus_textfile', daemon=True))
+        [t.start() for t in self._threads]
+
+    def on_event(self, event):
+        if event['event'] != 'batch':
+            return
+        table_name = event['table']
+        with self.lock:
+            if event['failed']:
+                self.failed_batches[table_name] = self.failed_batches.get(table_name, 0) + 1
+            else:
+                self.table_rows[table_name] = self.table_rows.get(table_name, 0) + event['rows']
+            self.table_bytes[table_name] = self.table_bytes.get(table_name, 0) + event['bytes']
+            for side, ms in (('oracle_fetch', event['fetch_ms']), ('mysql_insert', event['insert_ms'])):
+                seconds = ms / 1000.0
+                self.latency_sum[side] += seconds
+                index = 0
+                while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+                    index += 1
+                self.latency[side][index] += 1
+
+    def render(self):
+        aggregator = self.aggregator
+        out = []
+        with self.lock:
+            for name, kind, help_text, values in (
+                    ('oracle_mig_rows_total', 'counter', 'Rows inserted into MySQL', self.table_rows),
+                    ('oracle_mig_bytes_total', 'counter', 'Estimated bytes inserted into MySQL', self.table_bytes),
+                    ('oracle_mig_failed_batches_total', 'counter', 'Batches failed to insert',
+                     self.failed_batches)):
+                out.append('# HELP %s %s' % (name, help_text))
+                out.append('# TYPE %s %s' % (name, kind))
+                for table_name in sorted(values):
+                    out.append('%s{table="%s"} %s' % (name, table_name, values[table_name]))
+            out.append('# HELP oracle_mig_batch_seconds Batch latency, oracle_fetch is fetchmany, '
+                       'mysql_insert is executemany and commit')
+            out.append('# TYPE oracle_mig_batch_seconds histogram')
+            for side in ('oracle_fetch', 'mysql_insert'):
+                count = 0
+                for index, bucket in enumerate(LATENCY_BUCKETS):
+                    count += self.latency[side][index]
+                    out.append('oracle_mig_batch_seconds_bucket{side="%s",le="%s"} %s' % (side, bucket, count))
+                count += self.latency[side][-1]
+                out.append('oracle_mig_batch_seconds_bucket{side="%s",le="+Inf"} %s' % (side, count))
+                out.append('oracle_mig_batch_seconds_sum{side="%s"} %.6f' % (side, self.latency_sum[side]))
+                out.append('oracle_mig_batch_seconds_count{side="%s"} %s' % (side, count))
+        for name, help_text, value in (
+                ('oracle_mig_active_sessions', 'Copy threads holding an Oracle and a MySQL session',
+                 aggregator.active_sessions),
+                ('oracle_mig_event_queue_depth', 'Metric events waiting in the queue', aggregator.queue_depth()),
+                ('oracle_mig_tables_pending', 'Tables not yet started',
+                 max(len(aggregator.table_rows) - aggregator.tables_started, 0)),
+                ('oracle_mig_tables_done', 'Tables finished', aggregator.tables_done),
+                ('oracle_mig_expected_rows', 'Expected rows of all tables', sum(aggregator.table_rows.values()))):
+            out.append('# HELP %s %s' % (name, help_text))
+            out.append('# TYPE %s gauge' % name)
+            out.append('%s %s' % (name, value))
+        return '\n'.join(out) + '\n'
+
+    def write_textfile(self):
+        # 先写临时文件再rename，避免node_exporter读到写了一半的文件
+        try:
+            tmp_file = self.textfile + '.%s.tmp' % os.getpid()
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_file, self.textfile)
+        except Exception as e:
+            print(e, 'write prometheus textfile failed')
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write_textfile()
+
+    def close(self):
+        self._stop.set()
+        if self.textfile:
+            self.write_textfile()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
+import argparse
+import concurrent.futures
+import csv
 import datetime
+import fnmatch
+import json
 import os
 import platform
 import sys
+import threading
 import cx_Oracle
 import prettytable as pt
+import pymysql
+import data_checksum
+import data_diff
+import data_profile
+import log_writer
 import readConfig
 import configDB
 import ctypes
@@ -15,34 +26,6 @@ v1.3.21
 """
 
 
-class Logger(object):
-    def __init__(self, filename='com.log', add_flag=True,
-                 stream=open(sys.stdout.fileno(), mode='w', encoding='utf8', buffering=1)):
-        self.terminal = stream
-        self.filename = filename
-        self.add_flag = add_flag
-        # self.log = open(filename, 'a+')
-
-    def write(self, message):
-        if self.add_flag:
-            with open(self.filename, 'a+', encoding='utf-8') as log:
-                try:
-                    self.terminal.write(message)
-                    log.write(message)
-                except Exception as e:
-                    print(e)
-        else:
-            with open(self.filename, 'w', encoding='utf-8') as log:
-                try:
-                    self.terminal.write(message)
-                    log.write(message)
-                except Exception as e:
-                    print(e)
-
-    def flush(self):
-        pass
-
-
 def table_prepare(mysql_cursor):
     mysql_cursor.execute("""drop table if exists data_compare""")
     mysql_cursor.execute("""create table data_compare
@@ -54,10 +37,300 @@ db_type varchar(100),
 target_table_name varchar(100),
 target_rows int,
 is_success varchar(10),
-compare_time TIMESTAMP default CURRENT_TIMESTAMP
+compare_time TIMESTAMP default CURRENT_TIMESTAMP,
+column_name varchar(128),
+check_item varchar(30),
+source_value varchar(200),
+target_value varchar(200)
 )""")
 
 
+INSERT_COMPARE_SQL = """insert into data_compare(id,source_db_name,source_table_name,source_rows,db_type,
+target_table_name,target_rows,is_success) values(%s,%s,%s,%s,%s,%s,%s,%s)"""
+# --mode profile不一致的字段统计项，column_name以及后面的字段只有该模式写入
+INSERT_PROFILE_SQL = """insert into data_compare(id,source_db_name,source_table_name,source_rows,db_type,
+target_table_name,target_rows,is_success,column_name,check_item,source_value,target_value) 
+values(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"""
+# 每种比对方式对应的db_type，增量比对按照该类型记录每张表上一次的结果
+MODE_DB_TYPES = {'count': 'TABLE', 'checksum': 'CHECKSUM', 'profile': 'PROFILE'}
+
+
+def marker_prepare(mysql_cursor):
+    # data_compare每次比对都会重建，上一次的结果以及表的修改标记保存在data_compare_marker
+    mysql_cursor.execute("""create table if not exists data_compare_marker
+(table_name varchar(100),
+db_type varchar(100),
+marker varchar(500),
+source_rows bigint,
+target_rows bigint,
+is_success varchar(10),
+compare_time TIMESTAMP default CURRENT_TIMESTAMP,
+primary key(table_name, db_type)
+)""")
+
+
+def source_table_markers(oracle_cursor, oracle_pool, sourcedb, use_rowscn):
+    """
+    返回{表名: 修改标记}，标记由LAST_DDL_TIME、LAST_ANALYZED以及USER_TAB_MODIFICATIONS的DML次数组成，
+    收集统计信息会清空USER_TAB_MODIFICATIONS，所以同时记录LAST_ANALYZED
+    use_rowscn为True时再加上max(ORA_ROWSCN)，需要扫描全表，在没有开启表监控的库使用
+    """
+    try:  # 把内存中的DML监控信息写入user_tab_modifications
+        oracle_cursor.execute("""begin dbms_stats.flush_database_monitoring_info; end;""")
+    except Exception as e:
+        print(e, 'flush database monitoring info failed')
+    oracle_cursor.execute("""select t.table_name,to_char(o.last_ddl_time,'YYYYMMDDHH24MISS'),
+    to_char(t.last_analyzed,'YYYYMMDDHH24MISS'),m.inserts,m.updates,m.deletes,m.truncated,
+    to_char(m.last_time,'YYYYMMDDHH24MISS') from user_tables t 
+    join user_objects o on o.object_name=t.table_name and o.object_type='TABLE'
+    left join (select table_name,sum(inserts) inserts,sum(updates) updates,sum(deletes) deletes,
+    max(truncated) truncated,max(timestamp) last_time from user_tab_modifications group by table_name) m 
+    on m.table_name=t.table_name where t.table_name !='DATA_COMPARE'""")
+    markers = dict((row[0], '|'.join(str(v) for v in row[1:])) for row in oracle_cursor.fetchall())
+    if use_rowscn:
+        futures = [(table_name, oracle_pool.submit(data_checksum.fetch_one, 'select max(ora_rowscn) from %s."%s"' % (
+            sourcedb, table_name), {})) for table_name in markers]
+        for table_name, future in futures:
+            try:
+                markers[table_name] += '|' + str(future.result()[0])
+            except Exception as e:
+                print(e, 'get max ora_rowscn failed', table_name)
+                markers[table_name] += '|' + 'UNKNOWN'
+    return markers
+
+
+def table_markers(oracle_cursor, mysql_cursor, oracle_pool, sourcedb, target_db, use_rowscn):
+    # 源表的修改标记加上目标表的CREATE_TIME、UPDATE_TIME，目标表重新迁移之后同样需要重新比对
+    markers = source_table_markers(oracle_cursor, oracle_pool, sourcedb, use_rowscn)
+    mysql_cursor.execute("""select table_name,create_time,update_time from information_schema.TABLES where 
+    TABLE_SCHEMA=%s and TABLE_TYPE='BASE TABLE'""", (target_db,))
+    # lower_case_table_names为1或2时MySQL中的表名为小写，按照大写匹配源表
+    source_names = dict((table_name.upper(), table_name) for table_name in markers)
+    for table_name, create_time, update_time in mysql_cursor.fetchall():
+        if table_name.upper() in source_names:
+            markers[source_names[table_name.upper()]] += '|' + str(create_time) + '|' + str(update_time)
+    return markers
+
+
+def unchanged_tables(mysql_cursor, db_type, markers):
+    """
+    返回{表名: (上一次的源表行数, 目标表行数)}，上一次比对一致并且修改标记没有变化的表不需要再次比对
+    """
+    mysql_cursor.execute("""select table_name,marker,source_rows,target_rows from data_compare_marker where db_type=%s 
+    and is_success='Y'""", (db_type,))
+    return dict((table_name, (int(source_rows), int(target_rows)))
+                for table_name, marker, source_rows, target_rows in mysql_cursor.fetchall()
+                if markers.get(table_name) == marker)
+
+
+def save_markers(mysql_cursor, db_type, markers):
+    # 本次比对的结果以及比对之前获取的修改标记，比对期间修改过的表下次会重新比对
+    try:
+        mysql_cursor.execute("""select source_table_name,source_rows,target_rows,is_success from data_compare 
+        where db_type=%s""", (db_type,))
+        # data_compare中的表名为大写，对应回源表名
+        source_names = dict((table_name.upper(), table_name) for table_name in markers)
+        rows = [(source_names[table_name.upper()], db_type, markers[source_names[table_name.upper()]], source_rows,
+                 target_rows, is_success)
+                for table_name, source_rows, target_rows, is_success in mysql_cursor.fetchall()
+                if table_name.upper() in source_names]
+        mysql_cursor.executemany("""replace into data_compare_marker(table_name,db_type,marker,source_rows,
+        target_rows,is_success) values(%s,%s,%s,%s,%s,%s)""", rows)
+        mysql_cursor.execute('commit')
+    except Exception as e:
+        print(e, 'save compare marker failed')
+        mysql_cursor.execute('rollback')
+
+
+class SessionPool(object):
+    """
+    固定数量的数据库会话，每个线程独占一个会话，submit的函数第一个参数为该会话的游标
+    Oracle和MySQL各使用一个SessionPool，同一张表两边的count同时执行
+    """
+
+    def __init__(self, sessions, connect):
+        self.sessions = max(int(sessions), 1)
+        self.connect = connect  # 创建连接的函数
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.sessions)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def cursor(self):
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            conn = self.connect()
+            cursor = conn.cursor()
+            self._local.cursor = cursor
+            with self._lock:
+                self._connections.append((conn, cursor))
+        return cursor
+
+    def submit(self, fn, *args):
+        return self._executor.submit(lambda: fn(self.cursor(), *args))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        for conn, cursor in self._connections:
+            try:
+                cursor.close()
+                conn.close()
+            except Exception as e:
+                print(e)
+        self._connections = []
+
+
+def oracle_connect():
+    return cx_Oracle.connect(configDB.ora_conn)
+
+
+def mysql_connect():
+    conn = configDB.MySQLPOOL.connection()
+    if str(conn._con.server_version)[:1] == '8':
+        conn._setsession_sql = ['SET AUTOCOMMIT=0;', 'SET foreign_key_checks=0;',
+                                'set session sql_require_primary_key=OFF']
+    return conn
+
+
+def source_table_rows(oracle_cursor, sourcedb, source_table, parallel=0):
+    # 源表行数，parallel大于1时使用PARALLEL提示并行扫描，查询失败返回-1
+    hint = '/*+ parallel(t %s) */ ' % parallel if parallel > 1 else ''
+    try:
+        oracle_cursor.execute("""select %scount(*) from %s.\"%s\" t""" % (hint, sourcedb, source_table))
+        return oracle_cursor.fetchone()[0]
+    except Exception as e:
+        print(e, 'get source table row count failed', source_table)
+        return -1
+
+
+def target_table_rows(mysql_cursor, table_name):
+    # 目标表行数，查询失败返回-1
+    try:
+        mysql_cursor.execute("""select count(*) from `%s`""" % table_name)
+        return mysql_cursor.fetchone()[0]
+    except Exception as e:
+        print(e, ' target db table  ' + table_name + ' select failed')
+        return -1
+
+
+class TableFilter(object):
+    """
+    比对范围，include为空时比对所有表，表名匹配include中任意一项并且不匹配exclude中任何一项时比对
+    每一项可以是表名或者*、?通配符，不区分大小写
+    """
+
+    def __init__(self, include=None, exclude=None):
+        self.include = [p.strip().upper() for p in include or [] if p.strip()]
+        self.exclude = [p.strip().upper() for p in exclude or [] if p.strip()]
+
+    def match(self, table_name):
+        table_name = table_name.upper()
+        if self.include and not any(fnmatch.fnmatchcase(table_name, p) for p in self.include):
+            return False
+        return not any(fnmatch.fnmatchcase(table_name, p) for p in self.exclude)
+
+
+def read_custom_tables(filename='custom_table.txt'):
+    # 与oracle_mig_mysql -c相同的表清单，每行第一个逗号之前为表名，忽略空行
+    with open(filename, 'r', encoding='utf-8') as f:
+        return [line.strip('\n').split(',')[0].strip() for line in f if line.split(',')[0].strip()]
+
+
+def source_tables(oracle_cursor, table_filter=None):
+    # 需要比对的源表，按照统计信息的块数以及行数从大到小排列，最大的表最先提交到会话池，减少最后只剩大表在执行的时间
+    oracle_cursor.execute("""select table_name from user_tables where table_name !='DATA_COMPARE' 
+    order by nvl(blocks,0) desc,nvl(num_rows,0) desc,table_name""")
+    return [row[0] for row in oracle_cursor.fetchall() if table_filter is None or table_filter.match(row[0])]
+
+
+def target_range_keys(mysql_cursor, target_db):
+    """
+    返回{大写表名: (主键第一个字段, TABLE_ROWS)}，只包括主键第一个字段为整数的表，这些表可以按照主键范围拆分count
+    """
+    mysql_cursor.execute("""select t.table_name,k.column_name,t.table_rows from information_schema.TABLES t
+    join information_schema.KEY_COLUMN_USAGE k on k.table_schema=t.table_schema and k.table_name=t.table_name 
+    and k.constraint_name='PRIMARY' and k.ordinal_position=1
+    join information_schema.COLUMNS c on c.table_schema=k.table_schema and c.table_name=k.table_name 
+    and c.column_name=k.column_name
+    where t.table_schema=%s and t.table_type='BASE TABLE' and (c.data_type in 
+    ('tinyint','smallint','mediumint','int','bigint') or (c.data_type='decimal' and c.numeric_scale=0))""",
+                         (target_db,))
+    return dict((row[0].upper(), (row[1], int(row[2] or 0))) for row in mysql_cursor.fetchall())
+
+
+def target_key_range(mysql_cursor, table_name, key):
+    # 主键的最小值以及最大值，通过主键索引获取，查询失败返回(None, None)
+    try:
+        mysql_cursor.execute("""select min(`%s`),max(`%s`) from `%s`""" % (key, key, table_name))
+        return mysql_cursor.fetchone()
+    except Exception as e:
+        print(e, ' target db table  ' + table_name + ' get key range failed')
+        return None, None
+
+
+def target_range_rows(mysql_cursor, table_name, key, lo, hi):
+    # 主键范围[lo, hi)的行数，None表示不限制，查询失败返回-1
+    where, args = ['1 = 1'], []
+    if lo is not None:
+        where.append('`%s` >= %%s' % key)
+        args.append(lo)
+    if hi is not None:
+        where.append('`%s` < %%s' % key)
+        args.append(hi)
+    try:
+        mysql_cursor.execute("""select count(*) from `%s` where %s""" % (table_name, ' and '.join(where)), tuple(args))
+        return mysql_cursor.fetchone()[0]
+    except Exception as e:
+        print(e, ' target db table  ' + table_name + ' range ' + str(lo) + ' - ' + str(hi) + ' select failed')
+        return -1
+
+
+def submit_target_counts(mysql_cursor, mysql_pool, target_db, target_names, chunk_rows):
+    """
+    target_names为{源表名: MySQL中的表名}，提交目标表的count，返回{源表名: [future]}，由sum_rows把各future的结果相加为表的行数
+    TABLE_ROWS超过chunk_rows并且主键第一个字段为整数的表，按照主键的最小值到最大值等分为多个范围，
+    在mysql_pool的多个会话同时count，MySQL5.7单个count(*)只能使用一个线程，chunk_rows为0时不拆分
+    """
+    range_keys = target_range_keys(mysql_cursor, target_db) if chunk_rows > 0 else {}
+    futures, key_ranges = {}, []
+    for table_name, target_name in target_names.items():
+        key, table_rows = range_keys.get(target_name.upper(), (None, 0))
+        if key is not None and table_rows > chunk_rows:
+            key_ranges.append((table_name, target_name, key, table_rows,
+                               mysql_pool.submit(target_key_range, target_name, key)))
+        else:
+            futures[table_name] = [mysql_pool.submit(target_table_rows, target_name)]
+    for table_name, target_name, key, table_rows, future in key_ranges:
+        lo, hi = future.result()
+        if lo is None:
+            futures[table_name] = [mysql_pool.submit(target_table_rows, target_name)]
+            continue
+        lo, hi = int(lo), int(hi)
+        parts = min(-(-table_rows // chunk_rows), mysql_pool.sessions * 4)
+        step = max(-(-(hi - lo + 1) // parts), 1)
+        bounds = list(range(lo + step, hi + 1, step))
+        # 第一块不设下限，最后一块不设上限，count期间新插入的行也会统计在内
+        futures[table_name] = [mysql_pool.submit(target_range_rows, target_name, key, begin, end)
+                               for begin, end in zip([None] + bounds, bounds + [None])]
+    return futures
+
+
+def sum_rows(futures):
+    # 分块count的结果相加，任意一块失败返回-1
+    rows = [future.result() for future in futures]
+    return -1 if -1 in rows else sum(rows)
+
+
+def target_objects(mysql_cursor, target_db, table_type):
+    """
+    返回{大写名称: MySQL中的名称}，目标库所有表或者视图一次查询后在内存中判断是否存在
+    lower_case_table_names为1或2时MySQL中的名称为小写，与information_schema一样不区分大小写匹配，生成SQL时使用实际名称
+    """
+    mysql_cursor.execute("""select table_name from information_schema.TABLES where TABLE_SCHEMA=%s and 
+    TABLE_TYPE=%s""", (target_db, table_type))
+    return dict((row[0].upper(), row[0]) for row in mysql_cursor.fetchall())
+
+
 def check_db_exist(source_name, target_name, oracle_cursor, mysql_cursor):
     src_result = 0
     trg_result = 0
@@ -72,13 +345,15 @@ def check_db_exist(source_name, target_name, oracle_cursor, mysql_cursor):
     return src_result, trg_result
 
 
-def data_compare_single(sourcedb, target_db, oracle_cursor, mysql_cursor):  # 手动输入源数据库、目标数据库名称，比对全表数据
+def data_compare_single(sourcedb, target_db, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool,
+                        config, unchanged=None, table_filter=None):  # 手动输入源数据库、目标数据库名称，比对全表数据
+    """
+    表的行数由oracle_pool以及mysql_pool的会话并行统计，同一张表源库和目标库同时count，大表在MySQL按照主键范围分块count，
+    目标库的表以及视图名称各查询一次，在内存中比对是否存在，表以及视图的比对结果各批量写入data_compare并提交一次
+    unchanged中的表不再count，使用上一次的行数，db_type为TABLE UNCHANGED
+    """
+    unchanged = unchanged or {}
     table_id = 0
-    source_rows = 0
-    target_rows = 0
-    target_db_name = ''
-    target_table_name = ''
-    target_view_name = ''
     src_out, trg_out = check_db_exist(sourcedb, target_db, oracle_cursor, mysql_cursor)
     if src_out == 0:
         print(sourcedb, 'source db not exist\nEXIT!')
@@ -90,116 +365,445 @@ def data_compare_single(sourcedb, target_db, oracle_cursor, mysql_cursor):  # 
         print('begin compare source and target db\nsource_db:', sourcedb, 'target_db:', target_db)
         print('----------------------')
         # 先根据oracle的表名查每个表的行数
-        oracle_cursor.execute("""select table_name from user_tables where table_name !='DATA_COMPARE'""")
-        out_table = oracle_cursor.fetchall()  # 获取所有Oracle表名
+        out_table = source_tables(oracle_cursor, table_filter)  # 获取需要比对的Oracle表名，大表在前
         source_table_total = len(out_table)  # 获取Oracle表总数
-        mysql_cursor.execute("""select count(*) from information_schema.TABLES where TABLE_SCHEMA='%s' and TABLE_TYPE='BASE TABLE' and 
-                    table_name not in ('DATA_COMPARE','MY_MIG_TASK_INFO')""" % target_db)  # 获取MySQL表总数
-        target_table_total = mysql_cursor.fetchone()[0]  # 获取MySQL表总数
+        target_tables = target_objects(mysql_cursor, target_db, 'BASE TABLE')
+        target_table_total = len([t for t in set(target_tables) - {'DATA_COMPARE', 'MY_MIG_TASK_INFO'}
+                                  if table_filter is None or table_filter.match(t)])  # 获取MySQL表总数
         print('table total count:' + 'source db ' + str(source_table_total) + ' target db ' + str(target_table_total))
-        for v_out_table in out_table:
-            source_table = v_out_table[0]
+        count_parallel = int(config.get_oracle('count_parallel', 0))
+        source_futures = [(table_name, oracle_pool.submit(source_table_rows, sourcedb, table_name, count_parallel)
+                           if table_name not in unchanged else None) for table_name in out_table]
+        # 目标表不存在时不需要count
+        target_futures = submit_target_counts(mysql_cursor, mysql_pool, target_db,
+                                              dict((t, target_tables[t.upper()]) for t, f in source_futures
+                                                   if t.upper() in target_tables and f is not None),
+                                              int(config.get_compare('count_chunk_rows', 1000000)))
+        compare_result = []
+        for source_table, source_future in source_futures:
             table_id += 1
-            print('正在比对表[' + source_table + '] ' + str(table_id) + '/' + str(source_table_total))
-            try:
-                oracle_cursor.execute("""select count(*) from %s.\"%s\"""" % (sourcedb, source_table))
-                source_rows = oracle_cursor.fetchone()[0]  # 源表行数
-            except Exception as e:
-                print(e, 'get source table row count failed')
-            try:
-                target_db_name = target_db
-                # 这里判断下源表的名称在目标数据库是否存在
-                mysql_cursor.execute("""select count(*) from information_schema.TABLES where TABLE_SCHEMA='%s' and TABLE_TYPE='BASE TABLE' and table_name
-                             ='%s'""" % (target_db_name, source_table))
-                target_table = mysql_cursor.fetchone()[0]
-                if target_table > 0:
-                    target_table_name = source_table  # 目标表名称与源库表名称实际相同
-                    mysql_cursor.execute(
-                        """select count(*) from %s""" % target_table_name)
-                    target_rows = mysql_cursor.fetchone()[0]  # 目标表行数
-                else:
-                    target_table_name = 'TABLE NOT EXIST'  # 目标表不存在就将表命名为TABLE NOT EXIST
-                    target_rows = -1
-            except Exception as e:
-                print(e, ' target db table  ' + source_table + ' select failed')
-            try:  # 将以上比对的数据保存在目标库的表里
-                if (source_rows != target_rows) or (source_table.upper() != target_table_name.upper()):
-                    is_success = 'N'
-                else:
-                    is_success = 'Y'
-                mysql_cursor.execute("""insert into data_compare
-                                                        (id,
-                                                                    source_db_name,
-                                                                    source_table_name,
-                                                                    source_rows,
-                                                                    db_type,
-                                                                    target_table_name,
-                                                                    target_rows,
-                                                                    is_success
-                                                                    ) values(%s,'%s','%s',%s,'%s','%s',%s,'%s')""" % (
-                    table_id, sourcedb.upper(), source_table.upper(), source_rows,
-                    'TABLE',
-                    target_table_name.upper(),
-                    target_rows, is_success.upper()))
-                mysql_cursor.execute('commit')
-            except Exception as e:
-                print(e, 'save result failed in target db')
-                mysql_cursor.execute('rollback')
+            if source_future is None:
+                source_rows, target_rows = unchanged[source_table]
+                compare_result.append((table_id, sourcedb.upper(), source_table.upper(), source_rows,
+                                       'TABLE UNCHANGED', source_table.upper(), target_rows, 'Y'))
+                continue
+            source_rows = source_future.result()
+            if source_table in target_futures:
+                target_table_name, target_rows = target_tables[source_table.upper()], sum_rows(
+                    target_futures[source_table])  # 目标表名称与源库表名称不区分大小写相同
+            else:
+                target_table_name, target_rows = 'TABLE NOT EXIST', -1  # 目标表不存在就将表命名为TABLE NOT EXIST
+            print('比对表[' + source_table + '] ' + str(table_id) + '/' + str(source_table_total) + ' source_rows: ' +
+                  str(source_rows) + ' target_rows: ' + str(target_rows))
+            if (source_rows != target_rows) or (source_table.upper() != target_table_name.upper()):
+                is_success = 'N'
+            else:
+                is_success = 'Y'
+            compare_result.append((table_id, sourcedb.upper(), source_table.upper(), source_rows, 'TABLE',
+                                   target_table_name.upper(), target_rows, is_success))
+        save_compare_result(mysql_cursor, compare_result)
         # 视图比较
+        out_view = []
+        target_views = {}
         try:
             oracle_cursor.execute("""select view_name from user_views """)  # oracle所有视图名称
-            out_view = oracle_cursor.fetchall()
-            source_view_total = len(out_view)  # Oracle所有视图数量
+            out_view = [row for row in oracle_cursor.fetchall() if table_filter is None or table_filter.match(row[0])]
         except Exception as e:
             print(e, 'fetch source view name failed')
         try:
-            mysql_cursor.execute(
-                """select count(*) from information_schema.TABLES where TABLE_SCHEMA='%s' and TABLE_TYPE='VIEW'""" % target_db_name)  # mysql视图总数
-            target_view_total = mysql_cursor.fetchone()[0]
+            target_views = dict((k, v) for k, v in target_objects(mysql_cursor, target_db, 'VIEW').items()
+                                if table_filter is None or table_filter.match(k))  # mysql所有视图名称
         except Exception as e:
-            print(e, 'get target view total count failed')
-        print('view totals:' + 'source_db ' + str(source_view_total) + ' target_db ' + str(target_view_total))
+            print(e, 'get target view name failed')
+        print('view totals:' + 'source_db ' + str(len(out_view)) + ' target_db ' + str(len(target_views)))
+        compare_result = []
         for v_out_view in out_view:
             source_view_name = v_out_view[0]
             table_id += 1
+            target_view_name = target_views.get(source_view_name.upper(), 'NOT EXISTS VIEW')
+            is_success = 'Y' if source_view_name.upper() == target_view_name.upper() else 'N'
+            compare_result.append((table_id, sourcedb.upper(), source_view_name.upper(), 0, 'VIEW',
+                                   target_view_name.upper(), 0, is_success))
+        save_compare_result(mysql_cursor, compare_result)
+
+
+def save_compare_result(mysql_cursor, compare_result, batch_size=1000, sql=INSERT_COMPARE_SQL):
+    # 多行insert批量写入data_compare，整组比对结果只提交一次
+    try:
+        for i in range(0, len(compare_result), batch_size):
+            mysql_cursor.executemany(sql, compare_result[i:i + batch_size])
+        mysql_cursor.execute('commit')
+    except Exception as e:
+        print(e, 'save result failed in target db')
+        mysql_cursor.execute('rollback')
+
+
+def data_compare_checksum(sourcedb, target_db, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool, log_path,
+                          config, unchanged=None, table_filter=None):
+    """
+    --mode checksum，按照主键范围分块比对两边数据的校验和，不一致的块拆分到行，不一致的行写入checksum_diff.log
+    结果写入data_compare，db_type为CHECKSUM，source_rows、target_rows为实际比对的行数
+    unchanged中的表不再比对，db_type为CHECKSUM UNCHANGED
+    """
+    unchanged = unchanged or {}
+    src_out, trg_out = check_db_exist(sourcedb, target_db, oracle_cursor, mysql_cursor)
+    if src_out == 0:
+        print(sourcedb, 'source db not exist\nEXIT!')
+        sys.exit()
+    elif trg_out == 0:
+        print(target_db, 'target database not exists schema\nEXIT!')
+        sys.exit()
+    print('begin checksum compare source and target db\nsource_db:', sourcedb, 'target_db:', target_db)
+    print('----------------------')
+    out_table = source_tables(oracle_cursor, table_filter)
+    target_tables = target_objects(mysql_cursor, target_db, 'BASE TABLE')
+    checker = data_checksum.ChecksumCompare(sourcedb, oracle_pool, mysql_pool, oracle_cursor.connection.version,
+                                            config.get_compare('checksum_chunk_rows', 100000),
+                                            config.get_compare('checksum_leaf_rows', 1000),
+                                            max_diff_rows=config.get_compare('max_diff_rows', 100))
+    # 每张表由一个线程拆分以及汇总，各块的校验和在oracle_pool、mysql_pool中并行计算
+    with concurrent.futures.ThreadPoolExecutor(max_workers=oracle_pool.sessions) as executor:
+        futures = [(table_name, executor.submit(checker.compare_table, table_name, target_tables[table_name.upper()])
+                    if table_name.upper() in target_tables and table_name not in unchanged else None)
+                   for table_name in out_table]
+        compare_result = []
+        diff_log = open(log_path + 'checksum_diff.log', 'a', encoding='utf-8')
+        for table_id, (table_name, future) in enumerate(futures, 1):
+            target_table_name, db_type = target_tables.get(table_name.upper(), table_name), 'CHECKSUM'
+            if table_name in unchanged:
+                (source_rows, target_rows), is_success, db_type = unchanged[table_name], 'Y', 'CHECKSUM UNCHANGED'
+            elif future is None:
+                target_table_name, source_rows, target_rows, is_success = 'TABLE NOT EXIST', 0, -1, 'N'
+            else:
+                try:
+                    result = future.result()
+                    source_rows, target_rows, is_success = result['source_rows'], result['target_rows'], result[
+                        'is_success']
+                    print('比对表[' + table_name + '] ' + str(table_id) + '/' + str(len(out_table)) + ' rows: ' +
+                          str(source_rows) + '/' + str(target_rows) + ' chunks: ' + str(result['chunks']) +
+                          ' mismatch chunks: ' + str(result['mismatch_chunks']))
+                    if result['skipped_columns']:
+                        print(table_name, 'columns not checked:', ','.join(result['skipped_columns']))
+                    if is_success == 'N':
+                        diff_log.write('-- ' + table_name + ' mismatch chunks: ' + str(result['mismatch_chunks']) +
+                                       ('' if not result['truncated'] else ' (diff rows truncated)') + '\n')
+                        for diff_type, key in result['diff_rows']:
+                            diff_log.write(diff_type + ' ' + str(key) + '\n')
+                        diff_log.write('\n')
+                except Exception as e:
+                    print(e, 'checksum compare failed', table_name)
+                    diff_log.write('-- ' + table_name + ' checksum compare failed\n' + str(e) + '\n\n')
+                    source_rows, target_rows, is_success = -1, -1, 'N'
+            compare_result.append((table_id, sourcedb.upper(), table_name.upper(), source_rows, db_type,
+                                   target_table_name.upper(), target_rows, is_success))
+        diff_log.close()
+    save_compare_result(mysql_cursor, compare_result)
+    print('checksum mismatch rows please check ' + log_path + 'checksum_diff.log')
+
+
+def data_compare_profile(sourcedb, target_db, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool, config,
+                         unchanged=None, table_filter=None):
+    """
+    --mode profile，每张表两边各执行一次聚合查询，比较每个字段的null行数、最小值、最大值、数值的和以及字符串的总长度
+    每张表写入一行db_type为PROFILE的结果，不一致的统计项各写入一行db_type为PROFILE COLUMN的结果，
+    column_name、check_item、source_value、target_value为字段名称、统计项以及两边的值
+    unchanged中的表不再比对，db_type为PROFILE UNCHANGED
+    """
+    unchanged = unchanged or {}
+    src_out, trg_out = check_db_exist(sourcedb, target_db, oracle_cursor, mysql_cursor)
+    if src_out == 0:
+        print(sourcedb, 'source db not exist\nEXIT!')
+        sys.exit()
+    elif trg_out == 0:
+        print(target_db, 'target database not exists schema\nEXIT!')
+        sys.exit()
+    print('begin profile compare source and target db\nsource_db:', sourcedb, 'target_db:', target_db)
+    print('----------------------')
+    # 所有表的字段一次查询
+    oracle_cursor.execute("""select c.table_name,c.column_name,c.data_type from user_tab_columns c,user_tables t 
+    where c.table_name=t.table_name and t.table_name !='DATA_COMPARE' order by c.table_name,c.column_id""")
+    table_columns = {}
+    for table_name, column_name, data_type in oracle_cursor.fetchall():
+        table_columns.setdefault(table_name, []).append((column_name, data_type))
+    table_columns = dict((table_name, table_columns.get(table_name, []))
+                         for table_name in source_tables(oracle_cursor, table_filter))
+    target_tables = target_objects(mysql_cursor, target_db, 'BASE TABLE')
+    checker = data_profile.ProfileCompare(sourcedb, oracle_pool, mysql_pool,
+                                          config.get_compare('profile_float_tolerance', 0.000001))
+    submitted = [(table_name, checker.submit(table_name, columns, target_tables[table_name.upper()])
+                  if table_name.upper() in target_tables and table_name not in unchanged else None)
+                 for table_name, columns in table_columns.items()]
+    compare_result = []
+    for table_index, (table_name, profile) in enumerate(submitted, 1):
+        row = [len(compare_result) + 1, sourcedb.upper(), table_name.upper(), 0, 'PROFILE', table_name.upper(), -1,
+               'N', None, None, None, None]
+        if table_name in unchanged:
+            row[3], row[4], row[6], row[7] = unchanged[table_name][0], 'PROFILE UNCHANGED', unchanged[table_name][1], 'Y'
+            compare_result.append(tuple(row))
+            continue
+        if profile is None:
+            row[5] = 'TABLE NOT EXIST'
+            compare_result.append(tuple(row))
+            continue
+        try:
+            result = checker.result(profile)
+        except Exception as e:
+            print(e, 'profile compare failed', table_name)
+            row[3] = -1
+            compare_result.append(tuple(row))
+            continue
+        row[3], row[6], row[7] = result['source_rows'], result['target_rows'], result['is_success']
+        print('比对表[' + table_name + '] ' + str(table_index) + '/' + str(len(submitted)) + ' rows: ' +
+              str(result['source_rows']) + '/' + str(result['target_rows']) + ' mismatch items: ' +
+              str(len(result['mismatches'])))
+        if result['skipped_columns']:
+            print(table_name, 'columns not checked:', ','.join(result['skipped_columns']))
+        compare_result.append(tuple(row))
+        for column_name, check_item, source_value, target_value in result['mismatches']:
+            compare_result.append((len(compare_result) + 1, sourcedb.upper(), table_name.upper(), row[3],
+                                   'PROFILE COLUMN', table_name.upper(), row[6], 'N', column_name, check_item,
+                                   str(source_value)[:200], str(target_value)[:200]))
+    save_compare_result(mysql_cursor, compare_result, sql=INSERT_PROFILE_SQL)
+
+
+def source_table_stats(oracle_cursor):
+    """
+    返回{表名: 统计信息行数}，统计信息不存在、已过期或者收集之后有DML的表行数为None
+    """
+    try:  # 把内存中的DML监控信息写入user_tab_modifications，没有权限时使用已有的监控信息
+        oracle_cursor.execute("""begin dbms_stats.flush_database_monitoring_info; end;""")
+    except Exception as e:
+        print(e, 'flush database monitoring info failed')
+    oracle_cursor.execute("""select t.table_name,t.num_rows,t.last_analyzed,s.stale_stats,
+    (select count(*) from user_tab_modifications m where m.table_name=t.table_name) modifications
+    from user_tables t left join user_tab_statistics s on s.table_name=t.table_name and s.object_type='TABLE'
+    where t.table_name !='DATA_COMPARE'""")
+    stats = {}
+    for table_name, num_rows, last_analyzed, stale_stats, modifications in oracle_cursor.fetchall():
+        fresh = num_rows is not None and last_analyzed is not None and stale_stats != 'YES' and modifications == 0
+        stats[table_name] = int(num_rows) if fresh else None
+    return stats
+
+
+def target_table_stats(mysql_cursor, target_db):
+    """
+    返回{大写表名: (MySQL中的表名, 迁移记录的插入行数, 迁移时源表行数, TABLE_ROWS)}，没有迁移记录时中间两项为None
+    """
+    mysql_cursor.execute("""select table_name,table_rows from information_schema.TABLES where TABLE_SCHEMA=%s and 
+    TABLE_TYPE='BASE TABLE'""", (target_db,))
+    stats = dict((row[0].upper(), (row[0], None, None, int(row[1] or 0))) for row in mysql_cursor.fetchall())
+    try:
+        mysql_cursor.execute("""select table_name,sum(target_table_rows),max(source_table_rows) from my_mig_task_info 
+        where type='TABLE' group by table_name""")
+        for table_name, inserted_rows, migrated_rows in mysql_cursor.fetchall():
+            if table_name.upper() in stats:
+                stat = stats[table_name.upper()]
+                stats[table_name.upper()] = (stat[0], int(inserted_rows or 0), int(migrated_rows or 0), stat[3])
+    except Exception as e:
+        print(e, 'read my_mig_task_info failed')
+    return stats
+
+
+def data_compare_fast(sourcedb, target_db, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool, config,
+                      table_filter=None):
+    """
+    --mode fast，先比较Oracle统计信息的NUM_ROWS与MySQL的行数估算值，只对可疑的表执行count
+    MySQL的行数优先使用迁移记录my_mig_task_info中插入的行数，没有迁移记录时使用TABLE_ROWS
+    可疑的表为: Oracle没有最新的统计信息，迁移插入的行数与迁移时源表行数不一致，或者两边相差超过tolerance的比例
+    按照估算值判断一致的表db_type为TABLE ESTIMATE，执行了count的表为TABLE
+    """
+    src_out, trg_out = check_db_exist(sourcedb, target_db, oracle_cursor, mysql_cursor)
+    if src_out == 0:
+        print(sourcedb, 'source db not exist\nEXIT!')
+        sys.exit()
+    elif trg_out == 0:
+        print(target_db, 'target database not exists schema\nEXIT!')
+        sys.exit()
+    print('begin fast compare source and target db\nsource_db:', sourcedb, 'target_db:', target_db)
+    print('----------------------')
+    tolerance = float(config.get_compare('fast_tolerance', 0.1))
+    source_stats = source_table_stats(oracle_cursor)
+    target_stats = target_table_stats(mysql_cursor, target_db)
+    compare_result = []
+    suspect = []
+    out_table = source_tables(oracle_cursor, table_filter)  # 大表在前，可疑的表同样按照大小顺序count
+    for table_name in out_table:
+        source_est = source_stats.get(table_name)
+        if table_name.upper() not in target_stats:
+            compare_result.append((table_name, 0, 'TABLE', 'TABLE NOT EXIST', -1, 'N'))
+            continue
+        target_name, inserted_rows, migrated_rows, table_rows = target_stats[table_name.upper()]
+        if source_est is None or (inserted_rows is not None and inserted_rows != migrated_rows):
+            suspect.append(table_name)
+            continue
+        target_est = inserted_rows if inserted_rows is not None else table_rows
+        if abs(source_est - target_est) > tolerance * max(source_est, target_est):
+            suspect.append(table_name)
+            continue
+        compare_result.append((table_name, source_est, 'TABLE ESTIMATE', target_name, target_est, 'Y'))
+    print('tables: ' + str(len(out_table)) + ' matched by estimate: ' + str(
+        sum(1 for r in compare_result if r[2] == 'TABLE ESTIMATE')) + ' exact count: ' + str(len(suspect)))
+    # 可疑的表两边同时count
+    count_parallel = int(config.get_oracle('count_parallel', 0))
+    source_futures = [(table_name, oracle_pool.submit(source_table_rows, sourcedb, table_name, count_parallel))
+                      for table_name in suspect]
+    target_futures = submit_target_counts(mysql_cursor, mysql_pool, target_db,
+                                          dict((t, target_stats[t.upper()][0]) for t in suspect),
+                                          int(config.get_compare('count_chunk_rows', 1000000)))
+    for table_id, (table_name, source_future) in enumerate(source_futures, 1):
+        source_rows = source_future.result()
+        target_rows = sum_rows(target_futures[table_name])
+        print('比对表[' + table_name + '] ' + str(table_id) + '/' + str(len(suspect)) + ' source_rows: ' +
+              str(source_rows) + ' target_rows: ' + str(target_rows))
+        is_success = 'Y' if source_rows == target_rows else 'N'
+        compare_result.append((table_name, source_rows, 'TABLE', target_stats[table_name.upper()][0], target_rows,
+                               is_success))
+    save_compare_result(mysql_cursor, [(table_id, sourcedb.upper(), r[0].upper(), r[1], r[2], r[3].upper(), r[4], r[5])
+                                       for table_id, r in enumerate(compare_result, 1)])
+
+
+def previous_failed_tables(mysql_cursor):
+    # 上一次比对结果中不一致的表，data_compare不存在时返回空列表
+    try:
+        mysql_cursor.execute("""select distinct source_table_name from data_compare where is_success='N' and 
+        db_type in ('TABLE','CHECKSUM','DIFF','PROFILE')""")
+        return [row[0] for row in mysql_cursor.fetchall()]
+    except Exception as e:
+        print(e)
+        return []
+
+
+def data_compare_diff(sourcedb, target_db, table_list, mysql_cursor, sessions, log_path, config, out_format,
+                      apply):
+    """
+    --mode diff，按照主键顺序归并比较表的每一行，生成修复SQL或者LOAD DATA文件，apply时直接在MySQL执行
+    每张表使用单独的Oracle以及MySQL连接，sessions张表同时比较，目标库不存在的表不比较
+    """
+    print('begin row diff tables:', len(table_list), 'format:', out_format, 'apply:', apply)
+    batch_rows = config.get_compare('diff_batch_rows', 1000)
+    target_tables = target_objects(mysql_cursor, target_db, 'BASE TABLE')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [(table_name, executor.submit(data_diff.TableDiff(sourcedb, table_name, log_path, out_format, apply,
+                                                                    batch_rows, target_tables[table_name.upper()]).run)
+                    if table_name.upper() in target_tables else None) for table_name in table_list]
+        compare_result = []
+        for table_id, (table_name, future) in enumerate(futures, 1):
+            target_table_name = target_tables.get(table_name.upper(), 'TABLE NOT EXIST')
+            if future is None:
+                print('比对表[' + table_name + '] ' + str(table_id) + '/' + str(len(table_list)) +
+                      ' target table not exist')
+                compare_result.append((table_id, sourcedb.upper(), table_name.upper(), 0, 'DIFF', target_table_name,
+                                       -1, 'N'))
+                continue
             try:
-                target_db_name = target_db
-                mysql_cursor.execute(
-                    """select count(*) from information_schema.TABLES where TABLE_SCHEMA='%s' and TABLE_TYPE='VIEW' and table_name='%s'""" % (
-                        target_db_name, source_view_name))
-                target_view = mysql_cursor.fetchone()[0]  # 目标视图名称
-                if target_view == 0:
-                    target_view_name = 'NOT EXISTS VIEW'
-                else:
-                    target_view_name = source_view_name
+                result = future.result()
+                source_rows, target_rows, is_success = result['source_rows'], result['target_rows'], result[
+                    'is_success']
+                print('比对表[' + table_name + '] ' + str(table_id) + '/' + str(len(table_list)) + ' rows: ' +
+                      str(source_rows) + '/' + str(target_rows) + ' missing: ' + str(result['missing']) +
+                      ' extra: ' + str(result['extra']) + ' different: ' + str(result['different']))
+                if is_success == 'N':
+                    print('repair file: ' + ', '.join(result['files']))
             except Exception as e:
-                print(e, ' get target view name failed ', target_view_name)
-            if source_view_name.upper() != str(target_view_name).upper():
-                is_success = 'N'
+                print(e, 'row diff failed', table_name)
+                source_rows, target_rows, is_success = -1, -1, 'N'
+            compare_result.append((table_id, sourcedb.upper(), table_name.upper(), source_rows, 'DIFF',
+                                   target_table_name.upper(), target_rows, is_success))
+    save_compare_result(mysql_cursor, compare_result)
+
+
+def write_report(log_path, out_format, batch_rows=1000):
+    """
+    data_compare的全部结果写入log_path下的compare_report.csv或者compare_report.json，返回(文件名, 行数)
+    使用单独的连接以及SSCursor流式读取，每次fetchmany一批直接写入文件，不在内存中缓存整个结果集
+    """
+    filename = log_path + 'compare_report.' + out_format
+    rows = 0
+    conn = pymysql.connect(host=configDB.mysql_host, user=configDB.mysql_user, password=configDB.mysql_passwd,
+                           database=configDB.mysql_database, charset=configDB.mysql_dbchar, port=configDB.mysql_port,
+                           cursorclass=pymysql.cursors.SSCursor)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""select * from data_compare order by id""")
+        columns = [d[0] for d in cursor.description]
+        # csv带BOM，Excel直接打开中文不会乱码
+        with open(filename, 'w', encoding='utf-8-sig' if out_format == 'csv' else 'utf-8', newline='') as f:
+            writer = csv.writer(f) if out_format == 'csv' else None
+            if writer is not None:
+                writer.writerow(columns)
             else:
-                is_success = 'Y'
-            try:  # 将以上比对的数据保存在目标库的表里
-                mysql_cursor.execute("""insert into data_compare
-                                                        (id,
-                                                                    source_db_name,
-                                                                    source_table_name,
-                                                                    source_rows,
-                                                                    db_type,
-                                                                    target_table_name,
-                                                                    target_rows,
-                                                                    is_success
-                                                                    ) values(%s,'%s','%s',%s,'%s','%s',%s,'%s')""" % (
-                    table_id, sourcedb.upper(), source_view_name.upper(), 0,
-                    'VIEW',
-                    target_view_name.upper(),
-                    0, is_success.upper()))
-                mysql_cursor.execute('commit')
-            except Exception as e:
-                print(e, 'save compare result failed')
-                mysql_cursor.execute('rollback')
+                f.write('[')
+            while True:
+                batch = cursor.fetchmany(batch_rows)
+                if not batch:
+                    break
+                for row in batch:
+                    if writer is not None:
+                        writer.writerow(row)
+                    else:
+                        f.write((',\n' if rows else '\n') + json.dumps(dict(zip(columns, row)), ensure_ascii=False,
+                                                                       default=str))
+                    rows += 1
+            if writer is None:
+                f.write('\n]\n')
+        cursor.close()
+    finally:
+        conn.close()
+    return filename, rows
+
+
+def print_failed_summary(mysql_cursor, limit):
+    # 控制台只输出每种比对类型的汇总以及前limit行不一致的结果，全部结果在报告文件中
+    mysql_cursor.execute("""select db_type,count(*),sum(case when is_success='N' then 1 else 0 end) from data_compare 
+    group by db_type order by db_type""")
+    tb = pt.PrettyTable()
+    tb.field_names = ['type', 'total', 'failed']
+    for row in mysql_cursor.fetchall():
+        tb.add_row([row[0], row[1], int(row[2] or 0)])
+    print(tb)
+    mysql_cursor.execute("""select count(*) from data_compare where is_success='N'""")
+    failed_total = mysql_cursor.fetchone()[0]
+    if failed_total == 0:
+        print('all compared objects matched')
+        return
+    print('below maybe failed table:')
+    mysql_cursor.execute(
+        """SELECT id,source_table_name,source_rows,db_type,target_table_name,target_rows,is_success,column_name,
+        check_item FROM data_compare WHERE is_success='N' order by target_rows,target_table_name limit %s""", (limit,))
+    tb = pt.PrettyTable()
+    tb.field_names = ['id', 'source_table_name', 'source_rows', 'type', 'target_table_name',
+                      'target_rows', 'is_success', 'column_name', 'check_item']
+    for v_data_compare_out in mysql_cursor.fetchall():
+        tb.add_row(['' if v is None else v for v in v_data_compare_out])
+    print(tb)
+    if failed_total > limit:
+        print(str(failed_total - limit) + ' more failed rows not shown, please check the report file')
 
 
 def main():
+    parser = argparse.ArgumentParser(prog='oracle_compare_mysql')
+    parser.add_argument('--mode', help='count: compare row count, fast: compare statistics first and count only '
+                                       'suspect tables, checksum: compare chunk checksum of row data, '
+                                       'diff: compare every row and generate repair sql, '
+                                       'profile: compare null count, min, max, sum and length of every column',
+                        choices=['count', 'fast', 'checksum', 'diff', 'profile'], default='count')
+    parser.add_argument('--tables', help='diff mode tables separated by comma, default failed tables of last compare')
+    parser.add_argument('--diff_format', help='diff mode repair file, sql or load(LOAD DATA file)',
+                        choices=['sql', 'load'], default='sql')
+    parser.add_argument('--apply', help='diff mode apply repair to MySQL in batches', action='store_true',
+                        default=False)
+    parser.add_argument('--report', help='write all compare result to compare_report.csv or compare_report.json '
+                                         'in log dir', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--custom_table', '-c', help='compare only tables in custom_table.txt like oracle_mig_mysql -c,'
+                                                     ' wildcard * and ? are allowed', action='store_true',
+                        default=False)
+    parser.add_argument('--include', help='compare only tables and views matching these names or patterns, '
+                                          'separated by comma, for example ORDERS,CUST_*')
+    parser.add_argument('--exclude', help='skip tables and views matching these names or patterns, separated by comma')
+    parser.add_argument('--force', help='count, checksum and profile mode compare all tables, by default tables '
+                                        'matched last time and not modified since then are skipped',
+                        action='store_true', default=False)
+    args, unparsed = parser.parse_known_args()
     if platform.system().upper() == 'WINDOWS':
         kernel32 = ctypes.windll.kernel32
         kernel32.SetConsoleMode(kernel32.GetStdHandle(-10), 128)
@@ -258,38 +862,69 @@ def main():
     oracle_conn = cx_Oracle.connect(
         oracle_user + '/' + oracle_passwd + '@' + oracle_host + ':' + oracle_port + '/' + oracle_service_name)
     oracle_cursor = oracle_conn.cursor()
-    sys.stdout = Logger(log_path + "compare.log", True, sys.stdout)
+    sys.stdout = log_writer.LogWriter(log_path + "compare.log", True, sys.stdout)  # 后台线程批量写入日志
+    # 比对范围，-c使用custom_table.txt的表清单，--include、--exclude可以使用通配符
+    include = args.include.split(',') if args.include else []
+    if args.custom_table:
+        try:
+            custom_tables = read_custom_tables()
+        except Exception as e:
+            print(e, 'read custom_table.txt failed\nEXIT!')
+            sys.exit(0)
+        if not custom_tables:
+            print('please check custom_table.txt file content is blank\nEXIT!')
+            sys.exit(0)
+        include += custom_tables
+    table_filter = TableFilter(include, args.exclude.split(',') if args.exclude else [])
+    if args.mode == 'diff':
+        diff_tables = [t.strip().upper() for t in args.tables.split(',') if t.strip()] if args.tables else \
+            previous_failed_tables(mysql_cursor)
+        size_order = dict((t, i) for i, t in enumerate(source_tables(oracle_cursor)))  # 大表先开始比较
+        diff_tables = sorted([t for t in diff_tables if table_filter.match(t)],
+                             key=lambda t: size_order.get(t, len(size_order)))
     table_prepare(mysql_cursor)
-    data_compare_single(oracle_user, mysql_database, oracle_cursor, mysql_cursor)
-    print('compare result below:')
-    mysql_cursor.execute("""select * from DATA_COMPARE""")
-    data_compare_out = mysql_cursor.fetchall()
-    tb = pt.PrettyTable()
-    tb.field_names = ['id', 'source_db_name', 'source_table_name', 'source_rows', 'type', 'target_table_name',
-                      'target_rows', 'is_success', 'compare_time']
-    tb.align['id'] = 'l'
-    tb.align['source_db_name'] = 'l'
-    tb.align['source_object_name'] = 'l'
-    tb.align['source_rows'] = 'l'
-    tb.align['target_object_type'] = 'l'
-    tb.align['target_object_name'] = 'l'
-    tb.align['target_rows'] = 'l'
-    tb.align['is_success'] = 'l'
-    for v_data_compare_out in data_compare_out:
-        tb.add_row(list(v_data_compare_out))
-    print(tb)
+    # 源库以及目标库并行统计行数的会话数
+    oracle_pool = SessionPool(config.get_oracle('compare_sessions', 4), oracle_connect)
+    mysql_pool = SessionPool(config.get_mysql('compare_sessions', 4), mysql_connect)
+    # 增量比对，比对之前获取表的修改标记，上一次比对一致并且没有修改的表跳过
+    markers, unchanged = {}, {}
+    if args.mode in MODE_DB_TYPES:
+        try:
+            marker_prepare(mysql_cursor)
+            markers = table_markers(oracle_cursor, mysql_cursor, oracle_pool, oracle_user, mysql_database,
+                                    config.get_compare('incremental_marker', 'modifications') == 'rowscn')
+            if not args.force:
+                unchanged = unchanged_tables(mysql_cursor, MODE_DB_TYPES[args.mode], markers)
+                print('unchanged tables since last compare: ' + str(len(unchanged)) + ', use --force to compare all')
+        except Exception as e:
+            print(e, 'get table modification marker failed, compare all tables')
+            markers, unchanged = {}, {}
+    if args.mode == 'diff':
+        data_compare_diff(oracle_user, mysql_database, diff_tables, mysql_cursor, oracle_pool.sessions, log_path,
+                          config, args.diff_format, args.apply)
+    elif args.mode == 'fast':
+        data_compare_fast(oracle_user, mysql_database, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool, config,
+                          table_filter)
+    elif args.mode == 'profile':
+        data_compare_profile(oracle_user, mysql_database, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool, config,
+                             unchanged, table_filter)
+    elif args.mode == 'checksum':
+        data_compare_checksum(oracle_user, mysql_database, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool,
+                              log_path, config, unchanged, table_filter)
+    else:
+        data_compare_single(oracle_user, mysql_database, oracle_cursor, mysql_cursor, oracle_pool, mysql_pool,
+                            config, unchanged, table_filter)
+    if markers:
+        save_markers(mysql_cursor, MODE_DB_TYPES[args.mode], markers)
+    oracle_pool.shutdown()
+    mysql_pool.shutdown()
+    try:
+        report_file, report_rows = write_report(log_path, args.report)
+        print('compare result ' + str(report_rows) + ' rows write to ' + report_file)
+    except Exception as e:
+        print(e, 'write compare report failed')
     print('compare finish please select * from ' + mysql_database.upper() + '.' + 'DATA_COMPARE')
-    print('below maybe failed table:')
-    mysql_cursor.execute(
-        """SELECT id,source_table_name,source_rows,db_type,target_table_name,target_rows,is_success FROM data_compare WHERE  is_success='N'
-         order by target_rows,target_table_name""")
-    data_compare_out = mysql_cursor.fetchall()
-    tb = pt.PrettyTable()
-    tb.field_names = ['id', 'source_table_name', 'source_rows', 'type', 'target_table_name',
-                      'target_rows', 'is_success']
-    for v_data_compare_out in data_compare_out:
-        tb.add_row(list(v_data_compare_out))
-    print(tb)
+    print_failed_summary(mysql_cursor, int(config.get_compare('report_console_rows', 50)))
     mysql_cursor.close()
     oracle_conn.close()
 
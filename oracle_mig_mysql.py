@@ -6,6 +6,7 @@ import logging
 import multiprocessing
 import os
 import platform
+import queue
 import re
 import sys
 import time
@@ -14,7 +15,13 @@ import pymysql
 import configDB
 import cx_Oracle
 import db_info
+import ddl_executor
+import log_writer
+import mig_metrics
+import mig_profiler
+import mig_trace
 import readConfig
+import task_recorder
 import concurrent
 from concurrent.futures import ThreadPoolExecutor
 
@@ -31,34 +38,6 @@ split_page_size = int(config.get_oracle('split_page_size'))
 split_process = int(config.get_oracle('split_process'))
 
 
-# 记录执行日志
-class Logger(object):
-    def __init__(self, filename='run.log', add_flag=True,
-                 stream=open(sys.stdout.fileno(), mode='w', encoding='utf8', buffering=1)):
-        self.terminal = stream
-        self.filename = filename
-        self.add_flag = add_flag
-
-    def write(self, message):
-        if self.add_flag:
-            with open(self.filename, 'a+', encoding='utf-8') as log:
-                try:
-                    self.terminal.write(message)
-                    log.write(message)
-                except Exception as e:
-                    print(e)
-        else:
-            with open(self.filename, 'w', encoding='utf-8') as log:
-                try:
-                    self.terminal.write(message)
-                    log.write(message)
-                except Exception as e:
-                    print(e)
-
-    def flush(self):
-        pass
-
-
 def dataconvert(cursor, name, defaultType, size, precision, scale):
     """
     clob、blob、nclob要在读取源表前加载outputtypehandler属性,即将Oracle大字段转为string类型
@@ -104,7 +83,8 @@ def list_of_groups(init_list, childern_list_len):
 
 
 def insert_child2_thread(sql_list, start_index, insert_sql, table_name, get_table_count, log_path,
-                         insert_size):
+                         insert_size, recorder, metrics_queue=None, profile_dir=None):
+    profiler = mig_profiler.start(profile_dir)  # 指定--profile时分析本线程的耗时
     mysql_host = configDB.mysql_host  # 单个任务里查询源库，插入到目标数据库
     mysql_port = configDB.mysql_port
     mysql_user = configDB.mysql_user
@@ -118,52 +98,69 @@ def insert_child2_thread(sql_list, start_index, insert_sql, table_name, get_tabl
     my_conn = pymysql.connect(host=mysql_host, user=mysql_user, password=mysql_passwd, database=mysql_database,
                               charset=mysql_dbchar, port=mysql_port)  # 目标库
     my_cur = my_conn.cursor()
-    for sp_sql in sql_list[start_index]:
-        # print('子线程->thread ', start_index, ' ',sp_sql)
-        try:
-            ora_cur.execute(sp_sql)  # 执行
-        except Exception as e:
-            print(e, 'select source table failed please check where lowcase table_name')
-            continue  # 这里需要显式指定continue，否则某张表不存在就会跳出此函数
-        while True:
-            rows = list(ora_cur.fetchmany(insert_size))
-            if not rows:
+    # metrics_queue不为空时，每批数据的行数、字节数、查询以及插入耗时发送给主进程的MetricsAggregator
+    if metrics_queue is not None:
+        metrics_queue.put(mig_metrics.session_event('session_start', table_name))
+    try:
+        for chunk, sp_sql in enumerate(sql_list[start_index]):
+            # print('子线程->thread ', start_index, ' ',sp_sql)
+            try:
+                ora_cur.execute(sp_sql)  # 执行
+            except Exception as e:
+                print(e, 'select source table failed please check where lowcase table_name')
+                continue  # 这里需要显式指定continue，否则某张表不存在就会跳出此函数
+            while True:
+                batch_start_time = datetime.datetime.now()
+                fetch_begin = time.time()
+                rows = list(ora_cur.fetchmany(insert_size))
+                fetch_ms = (time.time() - fetch_begin) * 1000
+                if not rows:
+                    recorder.record(table_name=table_name, source_table_rows=0, target_table_rows=0, type='TABLE')
+                    break
+                insert_begin = time.time()
+                insert_failed = False
                 try:
-                    run_info_sql = "insert into my_mig_task_info(table_name,source_table_rows,target_table_rows,type) values('%s','%s','%s','%s')" % (
-                    table_name, 0, 0, 'TABLE')
-                    my_cur.execute(run_info_sql)
+                    my_cur.executemany(insert_sql, rows)  # 批量插入获取的结果集，需要注意的是 rows 必须是 list [] 数据类型
+                    if metrics_queue is None:  # 有MetricsAggregator时由主进程定时输出汇总进度
+                        print(
+                            "{0} {1} thread: {2} source_table_count: {3} insert_count: {4}".format(
+                                str(datetime.datetime.now()),
+                                table_name, start_index,
+                                get_table_count,
+                                my_cur.rowcount))
                     my_conn.commit()
                 except Exception as e:
-                    print(e, 'insert into my_mig_task_info failed')
-                break
-            try:
-                my_cur.executemany(insert_sql, rows)  # 批量插入获取的结果集，需要注意的是 rows 必须是 list [] 数据类型
-                print(
-                    "{0} {1} thread: {2} source_table_count: {3} insert_count: {4}".format(
-                        str(datetime.datetime.now()),
-                        table_name, start_index,
-                        get_table_count,
-                        my_cur.rowcount))
-                my_conn.commit()
-            except Exception as e:
-                sql_insert_error = '\n' + '/* ' + str(e) + ' */' + '\n'
-                print(sql_insert_error)
-                filename = log_path + 'insert_failed_table.log'
-                f = open(filename, 'a', encoding='utf-8')
-                f.write(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()) + '\n')
-                f.write(insert_sql + '\n\n\n')
-                f.write(str(rows[0]) + '\n\n')
-                f.write(sql_insert_error + '\n\n')
-                f.close()
-            try:
-                run_info_sql = "insert into my_mig_task_info(table_name,source_table_rows,target_table_rows,type) values('%s','%s','%s','%s')" % (table_name ,get_table_count, my_cur.rowcount,'TABLE')
-                my_cur.execute(run_info_sql)
-                my_conn.commit()
-            except Exception as e:
-                print(e, 'insert into my_mig_task_info failed')
+                    insert_failed = True
+                    sql_insert_error = '\n' + '/* ' + str(e) + ' */' + '\n'
+                    print(sql_insert_error)
+                    filename = log_path + 'insert_failed_table.log'
+                    f = open(filename, 'a', encoding='utf-8')
+                    f.write(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()) + '\n')
+                    f.write(insert_sql + '\n\n\n')
+                    f.write(str(rows[0]) + '\n\n')
+                    f.write(sql_insert_error + '\n\n')
+                    f.close()
+                if metrics_queue is not None:
+                    metrics_queue.put(mig_metrics.batch_event(
+                        table_name, start_index, chunk, len(rows) if insert_failed else my_cur.rowcount,
+                        mig_metrics.batch_bytes(rows), fetch_begin, fetch_ms, (time.time() - insert_begin) * 1000,
+                        insert_failed))
+                batch_end_time = datetime.datetime.now()
+                recorder.record(table_name=table_name, task_start_time=batch_start_time, task_end_time=batch_end_time,
+                                thread=start_index, run_time=(batch_end_time - batch_start_time).total_seconds(),
+                                source_table_rows=get_table_count, target_table_rows=my_cur.rowcount, type='TABLE')
+    finally:
+        if metrics_queue is not None:
+            metrics_queue.put(mig_metrics.session_event('session_end', table_name))
+        mig_profiler.stop(profiler, profile_dir, '%s_%s' % (table_name, start_index))
 
 
-def split_child1_mp(task_id, table_list, log_path):  # 在单个进程，处理表集合里面每个表，生成能同时运行的分页查询拼接SQL
+def split_child1_mp(task_id, table_list, log_path, table_done_queue=None, log_queue=None, metrics_queue=None,
+                    profile_dir=None):  # 在单个进程，处理表集合里面每个表，生成能同时运行的分页查询拼接SQL
+    # table_done_queue不为空时，每张表数据迁移完成之后把表名放入队列，主进程收到后开始创建该表的索引
+    # log_queue不为空时，print的内容发送给主进程写入mig.log
+    log_writer.redirect_stdout(log_queue)
+    profiler = mig_profiler.start(profile_dir)
     mysql_host = configDB.mysql_host
     mysql_port = configDB.mysql_port
     mysql_user = configDB.mysql_user
@@ -178,6 +175,7 @@ def split_child1_mp(task_id, table_list, log_path):  # 在单个进程，处理
     mysql_con_total = pymysql.connect(host=mysql_host, user=mysql_user, password=mysql_passwd, database=mysql_database,
                                       charset=mysql_dbchar, port=mysql_port)
     mysql_cursor_total = mysql_con_total.cursor()
+    recorder = task_recorder.TaskRecorder()  # 本进程所有线程的迁移记录批量写入my_mig_task_info
     print('current table task id:',task_id)
     for v_table_name in table_list:  # 获取每个进程表名的结果集
         table_name = v_table_name
@@ -221,6 +219,8 @@ def split_child1_mp(task_id, table_list, log_path):  # 在单个进程，处理
             f.write(str(e))
             f.close()
             continue  # 这里需要显式指定continue，否则表不存在或者其他问题，会直接跳出for循环
+        if metrics_queue is not None:  # 用实际行数替换统计信息的估算行数
+            metrics_queue.put(mig_metrics.table_event('table_start', table_name, get_table_count))
         val_str = ''  # 用于生成批量插入的列字段变量
         for i in range(1, col_len):
             val_str = val_str + '%s' + ','
@@ -258,13 +258,22 @@ def split_child1_mp(task_id, table_list, log_path):  # 在单个进程，处理
             task = {
                 executor.submit(insert_child2_thread, split_sql, v_index, insert_sql, table_name,
                                 get_table_count,
-                                log_path, row_batch_size): v_index for v_index in range(len(split_sql))}
+                                log_path, row_batch_size, recorder, metrics_queue, profile_dir): v_index
+                for v_index in range(len(split_sql))}
             for future in concurrent.futures.as_completed(task):
                 task_name = task[future]
                 try:
                     future.result()
                 except Exception as e:
                     print('split_child1_mp %r generated an exception: %s' % (task_name, e))
+        if metrics_queue is not None:
+            metrics_queue.put(mig_metrics.table_event('table_end', table_name, get_table_count))
+        if table_done_queue is not None:
+            recorder.flush()
+            table_done_queue.put(table_name)
+    recorder.close()
+    mig_profiler.stop(profiler, profile_dir, 'process_%s' % task_id)
+    sys.stdout.flush()
 
 
 class DataTransfer(object):
@@ -272,6 +281,8 @@ class DataTransfer(object):
         self.ora_info = configDB.ora_conn
         self.ora_con = None
         self.row_batch_size = int(config.get_mysql('row_batch_size'))
+        self.profile_dir = None  # 指定--profile时每个迁移进程以及线程的pstats文件目录
+        self.trace = None  # 指定--trace时记录每批数据的时间段
         try:
             self.mysql_cursor = configDB.MySQLPOOL.connection().cursor()
             if str(self.mysql_cursor._con._con.server_version)[:1] == '8':
@@ -283,29 +294,77 @@ class DataTransfer(object):
         except Exception as e:
             print(e)
 
-    def parent_process(self, new_list, log_path):  # 这里是主进程,多进程调用split_child1_mp分页查询任务,每个进程同时对每个表list集合进行分页切片
+    def parent_process(self, new_list, log_path, executor=None):  # 这里是主进程,多进程调用split_child1_mp分页查询任务,每个进程同时对每个表list集合进行分页切片
+        process_list, table_done_queue = self.start_process(new_list, log_path, executor is not None)
+        self.wait_process(process_list, table_done_queue, executor)
+
+    def start_process(self, new_list, log_path, notify_table_done=False):
+        # 启动数据迁移的子进程，不等待结束，notify_table_done为True时子进程每迁移完一张表就通知主进程
         process_list = []
+        table_done_queue = multiprocessing.Queue() if notify_table_done else None
+        log_queue = sys.stdout.child_queue() if isinstance(sys.stdout, log_writer.LogWriter) else None
+        self.metrics = mig_metrics.MetricsAggregator(log_path, self.estimate_rows(new_list))
+        prometheus_port = int(config.get_metrics('prometheus_port', 0))
+        prometheus_textfile = config.get_metrics('prometheus_textfile', '')
+        if prometheus_port or prometheus_textfile:
+            self.metrics.add_sink(mig_metrics.PrometheusSink(self.metrics, prometheus_port, prometheus_textfile))
+        if self.trace is not None:
+            self.metrics.add_sink(self.trace)
         print('START MIGRATING ROW DATA! ' + str(datetime.datetime.now()) + ' \n')
-        begin_time = datetime.datetime.now()  # new_list被分割的小list表集合
+        self.mig_begin_time = datetime.datetime.now()  # new_list被分割的小list表集合
+        self.log_path = log_path
+        self.metrics.start()
         for p_id in range(len(new_list[0])):  # 以下是同时运行N个进程，每个进程处理一部分表集合，计算每个表分页查询
             print('table wait for insert process list ->','len[',len(new_list[0][p_id]),']',new_list[0][p_id])
             process = multiprocessing.Process(target=split_child1_mp,
                                               args=(
                                                   p_id, new_list[0][p_id],
-                                                  log_path))  # p_id，任务序列，new_list[0][p_id])，小list的表
+                                                  log_path, table_done_queue, log_queue,
+                                                  self.metrics.event_queue, self.profile_dir))  # p_id，任务序列，new_list[0][p_id])，小list的表
             process_list.append(process)
         [p.start() for p in process_list]  # 开启了n个进程
+        return process_list, table_done_queue
+
+    def estimate_rows(self, new_list):
+        # 迁移开始前用Oracle统计信息的num_rows估算每张表的行数，用于计算进度以及剩余时间
+        table_names = set(table_name for p_list in new_list[0] for table_name in p_list)
+        estimate = dict.fromkeys(table_names, 0)
+        try:
+            self.cur_oracle_result.execute('select table_name,nvl(num_rows,0) from user_tables')
+            for table_name, num_rows in self.cur_oracle_result.fetchall():
+                if table_name in estimate:
+                    estimate[table_name] = int(num_rows)
+        except Exception as e:
+            print(e, 'get table num_rows failed')
+        return estimate
+
+    def wait_process(self, process_list, table_done_queue=None, executor=None):
+        # 等待数据迁移的子进程结束，期间每张表迁移完成就release该表，executor开始创建该表的索引等DDL
+        begin_time = self.mig_begin_time
+        if table_done_queue is not None:
+            while any(p.is_alive() for p in process_list):
+                try:
+                    table_name = table_done_queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                print('TABLE ' + table_name + ' DATA MIGRATION FINISH ' + str(datetime.datetime.now()) + '\n')
+                executor.release(table_name)
         [p.join() for p in process_list]  # 等待两个进程依次结束
+        self.metrics.close()
+        if self.profile_dir:  # 合并所有迁移进程以及线程的性能分析结果
+            mig_profiler.merge(self.profile_dir, self.log_path)
+        if executor is not None:
+            while True:  # 子进程退出前放入队列的表名
+                try:
+                    executor.release(table_done_queue.get_nowait())
+                except queue.Empty:
+                    break
+            executor.release_all()  # 迁移失败或者进程异常退出的表，也开始创建DDL
         end_time = datetime.datetime.now()
+        if self.trace is not None:
+            self.trace.complete('copy', 'phase', begin_time.timestamp(), end_time.timestamp())
         print('FINISH MIGRATING! ' + str(datetime.datetime.now()) + ' \n')
         print('ELAPSED TIME:' + str((end_time - begin_time).seconds) + '\n')
-        #  计算每张表插入时间
-        try:
-            self.mysql_cursor.execute(
-                """update my_mig_task_info set run_time=(UNIX_TIMESTAMP(task_end_time) - UNIX_TIMESTAMP(task_start_time))""")
-            self.mysql_cursor.execute("""commit""")
-        except Exception as e:
-            print(e, 'compute my_mig_task_info error')
         self.ora_con.close()
 
     def mig_part_tbl_columns(self, log_path):
@@ -317,12 +376,11 @@ class DataTransfer(object):
         cur_oracle_result.outputtypehandler = dataconvert
         err_count = 0
         list_index = 1
+        recorder = task_recorder.TaskRecorder()  # 每张表的迁移记录批量写入my_mig_task_info
         try:
             # 创建迁移任务表，用来统计表插入以及完成的时间
             mysql_cur.execute("""drop table if exists my_mig_task_info""")
-            mysql_cur.execute("""create table my_mig_task_info(table_name varchar(100),task_start_time datetime,
-                    task_end_time datetime ,thread int,run_time decimal(30,6),source_table_rows bigint default 0,target_table_rows bigint default 0,
-                    is_success varchar(100) default '',type varchar(100) default 'TABLE',detail varchar(100) default '')""")
+            mysql_cur.execute(task_recorder.CREATE_TASK_TABLE_SQL)
         except Exception as e:
             print(e)
         with open(log_path + "table.txt", "r") as f:  # 读取自定义表
@@ -395,12 +453,7 @@ class DataTransfer(object):
                     print(e)
                 insert_sql = 'insert into ' + target_table + '(' + str(
                     concat_target_source) + ')' + ' values(' + val_str + ')'  # 拼接insert into 目标表 values  #目标表插入语句
-                try:
-                    mysql_cur.execute("""insert into my_mig_task_info(table_name, task_start_time,thread) values ('%s',
-                            current_timestamp(3),%s)""" % (table_name, list_index))  # %s占位符的值需要引号包围
-                    mysql_cur.execute('commit')
-                except Exception as e:
-                    print('target table not exists', e)
+                task_start_time = datetime.datetime.now()
                 page_size = split_page_size
                 total_page_num = round((get_table_count + page_size - 1) / page_size)  # 自动计算总共有几页
                 for page_index in range(total_page_num):  # 例如总共有100行记录，每页10条记录，那么需要循环10次
@@ -450,15 +503,12 @@ class DataTransfer(object):
                     print(
                         f'[{table_name}]  source rows:{get_table_count} target rows:{mysql_insert_count}  THREAD {list_index} {str(datetime.datetime.now())}\n',
                         end='')
-                try:
-                    mysql_cur.execute("""update my_mig_task_info set task_end_time=current_timestamp(3), 
-                            source_table_rows=%s,
-                            target_table_rows=%s,
-                            is_success='%s' where table_name='%s'""" % (
-                        get_table_count, mysql_insert_count, is_success, table_name))  # 占位符需要引号包围
-                    mysql_cur.execute('commit')
-                except Exception as e:
-                    print(e)
+                task_end_time = datetime.datetime.now()
+                recorder.record(table_name=table_name, task_start_time=task_start_time, task_end_time=task_end_time,
+                                thread=list_index, run_time=(task_end_time - task_start_time).total_seconds(),
+                                source_table_rows=get_table_count, target_table_rows=mysql_insert_count,
+                                is_success=is_success)
+        recorder.close()
         self.ora_con.close()
 
 
@@ -508,6 +558,10 @@ def main():
     parser.add_argument('--metadata_only', '-m', help='MIG ONLY METADATA', action='store_true', default='false')
     parser.add_argument('--parallel_degree', '-p', help='parallel degree default 2', type=int)
     parser.add_argument('--quite_mode', '-q', help='quite mode mig', action='store_true', default='false')
+    parser.add_argument('--profile', help='profile row data migration, write pstats to log dir', action='store_true',
+                        default=False)
+    parser.add_argument('--trace', help='write chrome trace json of phases and chunks to log dir', action='store_true',
+                        default=False)
     parser.add_argument('-v', '--version', action='version', version=version, help='Display version')
     args, unparsed = parser.parse_known_args()  # 只解析正确的参数列表，无效参数会被忽略且不报错，args是解析正确参数，unparsed是不被解析的错误参数，win多进程需要此写法
     # -c命令与-d命令不能同时使用的判断
@@ -582,6 +636,12 @@ def main():
     else:
         print('can not create dir,please run on win or linux!\n')
     data_mig = DataTransfer()
+    if args.profile:
+        data_mig.profile_dir = log_path + 'profile'
+        os.makedirs(data_mig.profile_dir, exist_ok=True)
+    trace = mig_trace.ChromeTrace()  # 主进程各阶段的时间段，指定--trace时保存
+    if args.trace:
+        data_mig.trace = trace
     # 同时迁移表数据的并行度,可指定并行度，默认为2
     if args.parallel_degree:
         degree = args.parallel_degree
@@ -614,37 +674,66 @@ def main():
             for text in fr.readlines():
                 if text.split():
                     fd.write(text)
-    sys.stdout = Logger(log_path + "mig.log", True, sys.stdout)
+    sys.stdout = log_writer.LogWriter(log_path + "mig.log", True, sys.stdout)  # 后台线程批量写入日志
     if str(args.metadata_only).upper() == 'TRUE':
         run_method = 2
     db_meta_data.get_info(run_method, mode, log_path, version)
     # 创建目标表结构
     if str(args.data_only).upper() != 'TRUE':
-        all_table_count, list_success_table, ddl_failed_table_result = db_meta_data.cte_tab(log_path, is_custom_table)
+        with trace.span('cte_tab'):
+            all_table_count, list_success_table, ddl_failed_table_result = db_meta_data.cte_tab(log_path,
+                                                                                                is_custom_table)
         new_list = split_success_list(degree, list_success_table)
+        # 每张表的数据迁移完成之后就开始创建该表的索引、自增列以及注释，不需要等待所有表迁移完成
+        # 外键在子表和父表的索引都创建完成之后开始创建
+        executor = ddl_executor.DdlExecutor(db_meta_data.ddl_sessions)
+        executor.trace = data_mig.trace
+        ddl_begin_time = time.time()
+        process_list, table_done_queue = [], None
         # 多进程获取源表数据结果集插入到目标库
         if str(args.metadata_only).upper() != 'TRUE':
-            data_mig.parent_process(new_list, log_path)  # 默认是全库迁移，分页方式迁移数据，多进程时调用子进程mig_table_task_total
+            executor.hold(list_success_table)
+            process_list, table_done_queue = data_mig.start_process(new_list, log_path, True)  # 默认是全库迁移，分页方式迁移数据，多进程时调用子进程mig_table_task_total
+        # 按照索引、自增列、注释、外键的顺序提交，同一张表的DDL按照提交顺序执行
+        executor.phase = 'cte_idx'
+        idx_task = db_meta_data.submit_idx(executor, log_path, is_custom_table)
+        executor.phase = 'cte_trg'
+        trg_task = db_meta_data.submit_trg(executor, log_path, is_custom_table)
+        executor.phase = 'cte_comt'
+        comt_task = db_meta_data.submit_comt(executor, log_path, is_custom_table)
+        executor.phase = 'fk'
+        fk_task = db_meta_data.submit_fk(executor, log_path, is_custom_table)
+        if str(args.metadata_only).upper() != 'TRUE':
+            data_mig.wait_process(process_list, table_done_queue, executor)
+        executor.shutdown()
+        trace.complete('ddl', 'phase', ddl_begin_time, time.time(), args={'sessions': executor.sessions})
         # 创建约束包括索引
         all_constraints_count, all_constraints_success_count, function_based_index_count, \
-        constraint_failed_count = db_meta_data.cte_idx(log_path, is_custom_table)
+        constraint_failed_count = db_meta_data.collect_idx(idx_task, log_path)
         # 创建外键
-        all_fk_count, all_fk_success_count, foreignkey_failed_count = db_meta_data.fk(log_path, is_custom_table)
+        all_fk_count, all_fk_success_count, foreignkey_failed_count = db_meta_data.collect_fk(fk_task, log_path)
         # 创建触发器包括自增列
         all_inc_col_success_count, all_inc_col_failed_count, normal_trigger_count, \
-        trigger_success_count, trigger_failed_count, oracle_autocol_total = db_meta_data.cte_trg(log_path,
-                                                                                                 is_custom_table)
+        trigger_success_count, trigger_failed_count, oracle_autocol_total = db_meta_data.collect_trg(trg_task, log_path,
+                                                                                                     is_custom_table)
         # 创建comment
-        db_meta_data.cte_comt(log_path, is_custom_table)
+        db_meta_data.collect_comt(comt_task, log_path)
     # 仅迁移表数据
     if str(args.data_only).upper() != 'FALSE' and str(args.metadata_only).upper() != 'TRUE':  # 只有指定了-d选项才会执行此单步迁移
-        data_mig.mig_part_tbl_columns(log_path)  # -d 选项进行分页查询迁移，并且比对源库和目标库表结构，只迁移共同拥有的列字段，此方式会在迁移前truncate表
+        with trace.span('mig_part_tbl_columns'):
+            data_mig.mig_part_tbl_columns(log_path)  # -d 选项进行分页查询迁移，并且比对源库和目标库表结构，只迁移共同拥有的列字段，此方式会在迁移前truncate表
     # 编译视图以及创建目标视图
     if str(args.data_only).upper() != 'TRUE' and str(args.custom_table).upper() != 'TRUE':
-        db_meta_data.cp_vw()
-        all_view_count, all_view_success_count, all_view_failed_count, view_failed_result = db_meta_data.c_vw(log_path,
-                                                                                                              is_custom_table)
-    db_meta_data.func_proc(log_path)
+        with trace.span('cp_vw'):
+            db_meta_data.cp_vw()
+        with trace.span('c_vw'):
+            all_view_count, all_view_success_count, all_view_failed_count, view_failed_result = db_meta_data.c_vw(
+                log_path, is_custom_table)
+    with trace.span('func_proc'):
+        db_meta_data.func_proc(log_path)
+    db_meta_data.task_recorder.close()  # 写入剩余的my_mig_task_info记录，run_info需要读取
+    if args.trace:
+        trace.save(log_path + 'mig_trace.json')
     mig_end_time = datetime.datetime.now()
     if platform.system().upper() == 'WINDOWS' or platform.system().upper() == 'LINUX':
         db_meta_data.run_info(exepath, log_path, mig_start_time, mig_end_time, all_table_count, list_success_table,
@@ -3,6 +3,16 @@ cp db_info.py package
 cp configDB.py package
 cp readConfig.py package
 cp sql_format.py package
+cp type_mapping.py package
+cp ddl_executor.py package
+cp task_recorder.py package
+cp log_writer.py package
+cp mig_metrics.py package
+cp mig_profiler.py package
+cp mig_trace.py package
+cp data_checksum.py package
+cp data_diff.py package
+cp data_profile.py package
 rm -rf /opt/pycode/oracle_to_mysql/oracle_to_mysql/*
 pyinstaller -F --clean -p package oracle_mig_mysql.py --distpath oracle_to_mysql
 pyinstaller -F --clean -p package oracle_compare_mysql.py --distpath oracle_to_mysql
@@ -145,14 +145,18 @@ class OraclePool:
 
     def fetch_one(self, sql, args=None):  # in use
         """
-        获取全部结果
+        获取全部结果，大字段在连接放回连接池之前读取为字符串，放回之后LOB定位符不可再使用
         :param sql:     str     sql语句
         :param args:    list    sql语句参数
         :return:        tuple   fetch结果
         """
         conn, cursor = self.__execute(sql, args)
-        result = cursor.fetchone()
-        self.__reset_conn(conn, cursor)
+        try:
+            result = cursor.fetchone()
+            if result is not None:
+                result = tuple(v.read() if isinstance(v, cx_Oracle.LOB) else v for v in result)
+        finally:
+            self.__reset_conn(conn, cursor)
 
         return result
 
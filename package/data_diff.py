@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+按照主键顺序同时读取Oracle与MySQL的表数据，归并比较找出不一致的行，内存占用与表大小无关
+不一致的行生成修复的insert/update/delete语句，或者生成LOAD DATA文件，也可以直接在MySQL分批执行
+"""
+import decimal
+import os
+
+import cx_Oracle
+import pymysql
+
+import configDB
+
+BINARY_TYPES = ('BLOB', 'RAW', 'LONG RAW')
+CHAR_TYPES = ('CHAR', 'NCHAR')
+FLOAT_TYPES = ('FLOAT', 'BINARY_FLOAT', 'BINARY_DOUBLE')
+STRING_KEY_TYPES = ('VARCHAR2', 'NVARCHAR2', 'CHAR', 'NCHAR')
+
+
+def output_type_handler(cursor, name, default_type, size, precision, scale):
+    # 与数据迁移相同，大字段读取为字符串以及二进制，number读取为Decimal
+    if default_type in (cx_Oracle.DB_TYPE_CLOB, cx_Oracle.DB_TYPE_NCLOB):
+        return cursor.var(cx_Oracle.DB_TYPE_LONG, arraysize=cursor.arraysize)
+    if default_type == cx_Oracle.DB_TYPE_BLOB:
+        return cursor.var(cx_Oracle.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    if default_type == cx_Oracle.DB_TYPE_NUMBER:
+        return cursor.var(decimal.Decimal, arraysize=cursor.arraysize)
+
+
+def normalize(value, data_type):
+    # 转换为可以比较的值，Oracle中空字符串即为null
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool):
+        value = decimal.Decimal(str(value))
+        if data_type in FLOAT_TYPES:
+            return value.quantize(decimal.Decimal('0.000001'))
+        return value.normalize()
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if data_type in CHAR_TYPES and isinstance(value, str):
+        return value.rstrip(' ') or None
+    return value
+
+
+def load_field(value, is_binary):
+    # LOAD DATA默认格式的字段，二进制字段写十六进制，由UNHEX转换
+    if value is None:
+        return '\\N'
+    if is_binary:
+        return bytes(value).hex()
+    if not isinstance(value, str):
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r').replace(
+        '\0', '\\0')
+
+
+def oracle_key_order(column_name, data_type):
+    # 字符串主键两边都按照UTF8编码的字节排序，UTF8的字节顺序与Python字符串按照码位比较的顺序一致
+    # 不能只用nls_sort=binary，数据库字符集为ZHS16GBK等时Oracle按照GBK编码的字节排序
+    if data_type in CHAR_TYPES:  # CHAR在MySQL中读取时已去掉末尾空格
+        return "UTL_RAW.CAST_TO_RAW(CONVERT(RTRIM(\"%s\"),'AL32UTF8'))" % column_name
+    if data_type in STRING_KEY_TYPES:
+        return "UTL_RAW.CAST_TO_RAW(CONVERT(\"%s\",'AL32UTF8'))" % column_name
+    return '"%s"' % column_name
+
+
+def mysql_key_order(column_name, data_type):
+    if data_type in STRING_KEY_TYPES:
+        return 'CAST(CONVERT(`%s` USING utf8mb4) AS BINARY)' % column_name
+    return '`%s`' % column_name
+
+
+def read_rows(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
+
+class TableDiff(object):
+    """
+    比较一张表，target_name为MySQL中的表名，默认与源表名相同，Oracle与MySQL各使用一个单独的连接流式读取，MySQL使用SSCursor不缓存结果集
+    out_format为sql时生成repair_表名.sql，为load时生成repair_表名.txt以及repair_表名.sql(delete以及LOAD DATA语句)
+    apply为True时直接在MySQL执行，每batch_rows行提交一次
+    任意一边的主键不是严格递增时终止该表，未执行的修复全部丢弃
+    """
+
+    def __init__(self, sourcedb, table_name, log_path, out_format='sql', apply=False, batch_rows=1000,
+                 target_name=None):
+        self.sourcedb = sourcedb
+        self.table_name = table_name
+        self.target_name = target_name or table_name  # MySQL中的实际表名，查询以及修复语句使用
+        self.log_path = log_path
+        self.out_format = out_format
+        self.apply = apply
+        self.batch_rows = max(int(batch_rows), 1)
+        self.missing = self.extra = self.different = 0
+        self.source_rows = self.target_rows = 0
+        self._replace_rows = []
+        self._delete_keys = []
+        self.aborted = False
+
+    def run(self):
+        """返回dict: source_rows, target_rows, missing, extra, different, is_success, files"""
+        ora_conn = cx_Oracle.connect(configDB.ora_conn)
+        my_conn = pymysql.connect(host=configDB.mysql_host, user=configDB.mysql_user, password=configDB.mysql_passwd,
+                                  database=configDB.mysql_database, charset=configDB.mysql_dbchar,
+                                  port=configDB.mysql_port, cursorclass=pymysql.cursors.SSCursor)
+        apply_conn = None
+        try:
+            ora_cur = ora_conn.cursor()
+            ora_cur.execute("""select column_name,data_type from user_tab_columns where table_name=:t
+            order by column_id""", t=self.table_name)
+            columns = ora_cur.fetchall()
+            ora_cur.execute("""select b.column_name from user_constraints a,user_cons_columns b
+            where a.constraint_name=b.constraint_name and a.table_name=:t and a.constraint_type='P'
+            order by b.position""", t=self.table_name)
+            key_names = [row[0] for row in ora_cur.fetchall()]
+            if not key_names:
+                raise Exception('table ' + self.table_name + ' has no primary key, row diff skipped')
+            self.columns = [c[0] for c in columns]
+            self.types = [c[1] for c in columns]
+            self.key_index = [self.columns.index(k) for k in key_names]
+            self.value_index = [i for i in range(len(self.columns)) if i not in self.key_index]
+            if self.apply:
+                apply_conn = pymysql.connect(host=configDB.mysql_host, user=configDB.mysql_user,
+                                             password=configDB.mysql_passwd, database=configDB.mysql_database,
+                                             charset=configDB.mysql_dbchar, port=configDB.mysql_port)
+                apply_conn.cursor().execute('SET foreign_key_checks=0')
+            self.literal = my_conn.literal
+            self.open_files()
+            ora_order = ','.join(oracle_key_order(k, self.types[self.columns.index(k)]) for k in key_names)
+            my_order = ','.join(mysql_key_order(k, self.types[self.columns.index(k)]) for k in key_names)
+            ora_cur = ora_conn.cursor()
+            ora_cur.execute('alter session set nls_sort=binary')
+            ora_cur.arraysize = 1000
+            ora_cur.outputtypehandler = output_type_handler
+            ora_cur.execute('select %s from %s."%s" order by %s' % (','.join('"%s"' % c for c in self.columns),
+                                                                     self.sourcedb, self.table_name, ora_order))
+            my_cur = my_conn.cursor()
+            my_cur.execute('select %s from `%s` order by %s' % (','.join('`%s`' % c for c in self.columns),
+                                                                 self.target_name, my_order))
+            try:
+                self.merge(self.ordered(read_rows(ora_cur, 1000), 'oracle'),
+                           self.ordered(read_rows(my_cur, 1000), 'mysql'), apply_conn)
+            except Exception as e:
+                # 未执行的修复全部丢弃，修复文件中注明不完整
+                self._replace_rows, self._delete_keys = [], []
+                self.aborted = True
+                self.sql_file.write('-- ABORTED: %s\n' % e)
+                raise
+            self.flush(apply_conn)
+        finally:
+            self.close_files()
+            for conn in (ora_conn, my_conn, apply_conn):
+                try:
+                    if conn is not None:
+                        conn.close()
+                except Exception as e:
+                    print(e)
+        return {'source_rows': self.source_rows, 'target_rows': self.target_rows, 'missing': self.missing,
+                'extra': self.extra, 'different': self.different,
+                'is_success': 'Y' if self.missing + self.extra + self.different == 0 else 'N', 'files': self.files}
+
+    def key(self, row):
+        return tuple(normalize(row[i], self.types[i]) for i in self.key_index)
+
+    def ordered(self, rows, side):
+        # 归并比较要求两边的主键严格递增，顺序不一致时会得到错误的MISSING、EXTRA，直接终止该表的比较以及修复
+        last_key = None
+        for row in rows:
+            key = self.key(row)
+            if last_key is not None and not key > last_key:
+                raise Exception('%s rows of table %s are not in strictly increasing key order at %s, row diff aborted'
+                                % (side, self.table_name, key))
+            last_key = key
+            yield row
+
+    def merge(self, ora_rows, my_rows, apply_conn):
+        ora_row, my_row = next(ora_rows, None), next(my_rows, None)
+        while ora_row is not None or my_row is not None:
+            ora_key = self.key(ora_row) if ora_row is not None else None
+            my_key = self.key(my_row) if my_row is not None else None
+            if my_row is None or (ora_row is not None and ora_key < my_key):
+                self.missing += 1
+                self.write_replace(ora_row, None)
+                self.source_rows += 1
+                ora_row = next(ora_rows, None)
+            elif ora_row is None or my_key < ora_key:
+                self.extra += 1
+                self.write_delete(my_row)
+                self.target_rows += 1
+                my_row = next(my_rows, None)
+            else:
+                changed = [i for i in self.value_index
+                           if normalize(ora_row[i], self.types[i]) != normalize(my_row[i], self.types[i])]
+                if changed:
+                    self.different += 1
+                    self.write_replace(ora_row, changed)
+                self.source_rows += 1
+                self.target_rows += 1
+                ora_row, my_row = next(ora_rows, None), next(my_rows, None)
+            if len(self._replace_rows) + len(self._delete_keys) >= self.batch_rows:
+                self.flush(apply_conn)
+
+    def open_files(self):
+        name = self.log_path + 'repair_' + self.table_name
+        self.files = [name + '.sql']
+        self.sql_file = open(name + '.sql', 'w', encoding='utf-8')
+        self.load_file = None
+        if self.out_format == 'load':
+            self.files.append(name + '.txt')
+            self.load_file = open(name + '.txt', 'w', encoding='utf-8', newline='\n')
+
+    def close_files(self):
+        if getattr(self, 'sql_file', None) is None:
+            return
+        if self.load_file is not None:
+            self.load_file.close()
+        if self.load_file is not None and not self.aborted:  # 比较终止时不生成LOAD DATA语句
+            columns, sets = [], []
+            for i, column in enumerate(self.columns):
+                if self.types[i] in BINARY_TYPES:
+                    columns.append('@v%s' % i)
+                    sets.append('`%s`=UNHEX(@v%s)' % (column, i))
+                else:
+                    columns.append('`%s`' % column)
+            self.sql_file.write("LOAD DATA LOCAL INFILE '%s' REPLACE INTO TABLE `%s` CHARACTER SET utf8mb4 (%s)%s;\n" % (
+                os.path.abspath(self.files[1]).replace('\\', '/'), self.target_name, ','.join(columns),
+                ' SET ' + ','.join(sets) if sets else ''))
+        self.sql_file.close()
+        self.sql_file = None
+
+    def where(self, row):
+        return ' and '.join('`%s`=%s' % (self.columns[i], self.literal(row[i])) for i in self.key_index)
+
+    def write_replace(self, row, changed):
+        # changed为None表示目标表缺少该行，否则为不一致的字段
+        if self.load_file is not None:
+            self.load_file.write('\t'.join(load_field(v, self.types[i] in BINARY_TYPES) for i, v in enumerate(row))
+                                 + '\n')
+        elif changed is None:
+            self.sql_file.write('insert into `%s`(%s) values(%s);\n' % (
+                self.target_name, ','.join('`%s`' % c for c in self.columns), ','.join(self.literal(v) for v in row)))
+        else:
+            self.sql_file.write('update `%s` set %s where %s;\n' % (
+                self.target_name, ','.join('`%s`=%s' % (self.columns[i], self.literal(row[i])) for i in changed),
+                self.where(row)))
+        if self.apply:
+            self._replace_rows.append(row)
+
+    def write_delete(self, row):
+        self.sql_file.write('delete from `%s` where %s;\n' % (self.target_name, self.where(row)))
+        if self.apply:
+            self._delete_keys.append(tuple(row[i] for i in self.key_index))
+
+    def flush(self, apply_conn):
+        # 在MySQL执行修复，删除多余的行，replace缺少以及不一致的行，每批提交一次
+        if apply_conn is None or not (self._replace_rows or self._delete_keys):
+            return
+        cursor = apply_conn.cursor()
+        if self._delete_keys:
+            cursor.executemany('delete from `%s` where %s' % (
+                self.target_name, ' and '.join('`%s`=%%s' % self.columns[i] for i in self.key_index)),
+                               self._delete_keys)
+        if self._replace_rows:
+            cursor.executemany('replace into `%s`(%s) values(%s)' % (
+                self.target_name, ','.join('`%s`' % c for c in self.columns), ','.join(['%s'] * len(self.columns))),
+                               self._replace_rows)
+        apply_conn.commit()
+        cursor.close()
+        self._replace_rows, self._delete_keys = [], []
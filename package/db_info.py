@@ -1,14 +1,21 @@
 import csv
 import datetime
+import hashlib
+import json
 import logging
 import os
 import re
 import sys
 import time
 import traceback
+import concurrent.futures
+import itertools
 import configDB
+import ddl_executor
 import prettytable
 import sql_format
+import task_recorder
+import type_mapping
 import platform
 from HTMLTable import (HTMLTable)
 import ctypes
@@ -35,8 +42,184 @@ else:
     print('set oracle client failed\n')
 
 
+# 查询主键、唯一索引以及普通索引，%s处可以追加表名过滤条件
+INDEX_COLUMNS_SQL = """SELECT T.TABLE_NAME,
+               T.INDEX_NAME,
+               I.UNIQUENESS,
+               I.INDEX_TYPE,
+               C.CONSTRAINT_TYPE,
+               listagg(T.COLUMN_NAME,',') within group(order by T.COLUMN_position) COLUMN_LIST
+          FROM USER_IND_COLUMNS T, USER_INDEXES I, USER_CONSTRAINTS C
+         WHERE T.INDEX_NAME = I.INDEX_NAME
+           AND T.INDEX_NAME = C.CONSTRAINT_NAME(+)
+           and i.index_type != 'FUNCTION-BASED NORMAL'
+           %s
+         GROUP BY T.TABLE_NAME,
+                  T.INDEX_NAME,
+                  I.UNIQUENESS,
+                  I.INDEX_TYPE,
+                  C.CONSTRAINT_TYPE"""
+
+
+# 查询外键的创建语句、父表以及子表，%s处可以追加表名过滤条件
+FOREIGN_KEY_SQL = """SELECT 'ALTER TABLE ' || B.TABLE_NAME || ' ADD CONSTRAINT ' ||
+                B.CONSTRAINT_NAME || ' FOREIGN KEY (' ||
+                (SELECT listagg(A.COLUMN_NAME,',') within group(order by a.position)
+                   FROM USER_CONS_COLUMNS A
+                  WHERE A.CONSTRAINT_NAME = B.CONSTRAINT_NAME) || ') REFERENCES ' ||
+                (SELECT B1.table_name FROM USER_CONSTRAINTS B1
+                  WHERE B1.CONSTRAINT_NAME = B.R_CONSTRAINT_NAME) || '(' ||
+                (SELECT listagg(A.COLUMN_NAME,',') within group(order by a.position)
+                   FROM USER_CONS_COLUMNS A
+                  WHERE A.CONSTRAINT_NAME = B.R_CONSTRAINT_NAME) || ');',
+                (SELECT B1.table_name FROM USER_CONSTRAINTS B1
+                  WHERE B1.CONSTRAINT_NAME = B.R_CONSTRAINT_NAME),
+                B.TABLE_NAME
+           FROM USER_CONSTRAINTS B
+          WHERE B.CONSTRAINT_TYPE = 'R' %s
+          ORDER BY B.TABLE_NAME"""
+
+
+def table_in_filter(column_name, table_names):
+    """
+    生成按表名过滤的条件，例如 AND (T.TABLE_NAME IN ('A','B'))
+    Oracle的IN列表最多1000个值，超过时拆成多个IN用OR连接，这样自定义表再多也只需要查询一次
+    """
+    if not table_names:
+        return 'AND 1 = 0'
+    in_list = []
+    for i in range(0, len(table_names), 1000):
+        in_list.append(column_name + ' IN (' + ','.join(
+            "'" + str(table_name).replace("'", "''") + "'" for table_name in table_names[i:i + 1000]) + ')')
+    return 'AND (' + ' OR '.join(in_list) + ')'
+
+
+# 序列实现的自增列触发器，例如 SELECT SEQ.NEXTVAL INTO :NEW.ID FROM DUAL; 或者 :NEW.ID := SEQ.NEXTVAL;
+AUTO_INC_PATTERNS = (
+    re.compile(r'INTO\s*:\s*NEW\.\s*"?([\w$#]+)"?\s+FROM\s+(?:SYS\s*\.\s*)?DUAL\b'),
+    re.compile(r':\s*NEW\.\s*"?([\w$#]+)"?\s*:=\s*[\w$#."]+\.\s*NEXTVAL\b'),
+)
+
+
+def auto_increment_sql(triggers):
+    """
+    分析user_triggers的(table_name, trigger_type, trigger_body)，找出用序列实现自增的列
+    返回(自增列索引语句[(表名, sql)], 修改自增属性语句[(表名, sql)], 使用序列的行级触发器总数)
+    """
+    all_create_index = []
+    all_alter_sql = []
+    oracle_autocol_total = 0
+    auto_columns = set()
+    for table_name, trigger_type, trigger_body in triggers:
+        if trigger_type != 'BEFORE EACH ROW' or not trigger_body:
+            continue
+        trigger_body = trigger_body.upper()
+        if 'NEXTVAL' not in trigger_body:
+            continue
+        oracle_autocol_total += 1
+        for pattern in AUTO_INC_PATTERNS:
+            match = pattern.search(trigger_body)
+            if match:
+                break
+        if match is None or (table_name, match.group(1)) in auto_columns:
+            continue
+        column_name = match.group(1)
+        auto_columns.add((table_name, column_name))
+        all_create_index.append(
+            (table_name, 'create index ids_' + table_name[:26] + ' on ' + table_name + '(' + column_name + ');'))
+        all_alter_sql.append(
+            (table_name, 'alter table ' + table_name + ' modify ' + column_name + ' bigint auto_increment;'))
+    return all_create_index, all_alter_sql, oracle_autocol_total
+
+
+def index_sql(table_name, index_name, uniqueness, index_type, constraint_type, column_list):
+    """
+    生成单个索引的创建语句，以及合并到ALTER TABLE中的子句
+    外键以及bitmap等非normal类型的索引没有子句，只能单独执行
+    """
+    if constraint_type == 'P':
+        return ('ALTER TABLE ' + table_name + ' ADD CONSTRAINT ' + '`' + index_name + '`' + ' PRIMARY KEY (' +
+                column_list + ');', 'ADD CONSTRAINT `' + index_name + '` PRIMARY KEY (' + column_list + ')')
+    if constraint_type == 'R':
+        return ('ALTER TABLE ' + table_name + ' ADD CONSTRAINT ' + '`' + index_name + '`' + ' FOREIGN KEY (' +
+                column_list + ');', None)
+    if uniqueness == 'UNIQUE':
+        return ('CREATE UNIQUE INDEX ' + '`' + index_name + '`' + ' ON ' + table_name + '(' + column_list + ');',
+                'ADD UNIQUE INDEX `' + index_name + '`(' + column_list + ')')
+    if index_type == 'NORMAL':
+        return ('CREATE INDEX ' + '`' + index_name + '`' + ' ON ' + table_name + '(' + column_list + ');',
+                'ADD INDEX `' + index_name + '`(' + column_list + ')')
+    return ('CREATE ' + index_type + ' INDEX ' + '`' + index_name + '`' + ' ON ' + table_name + '(' + column_list +
+            ');', None)
+
+
+def group_index_sql(all_index):
+    """
+    按表合并INDEX_COLUMNS_SQL查询的索引，返回[(表名, 合并的ALTER TABLE语句, [(单个索引语句, 子句)])]
+    一张表可以合并的索引少于2个时，合并的语句为None
+    """
+    table_index = {}
+    for row in all_index:
+        table_index.setdefault(row[0], []).append(index_sql(*row))
+    result = []
+    for table_name, index_list in table_index.items():
+        clauses = [clause for create_index_sql, clause in index_list if clause]
+        if len(clauses) > 1:
+            batch_sql = 'ALTER TABLE ' + table_name + ' ' + ', '.join(clauses)
+            batch_list = [v for v in index_list if v[1]]
+            result.append((table_name, batch_sql, batch_list))
+            single_list = [v for v in index_list if not v[1]]
+            if single_list:
+                result.append((table_name, None, single_list))
+        else:
+            result.append((table_name, None, index_list))
+    return result
+
+
+def view_levels(view_names, dependencies):
+    """
+    按照视图之间的依赖关系分层，第一层不依赖其他视图，第N层只依赖前面几层的视图，同一层的视图可以同时创建
+    dependencies为USER_DEPENDENCIES中的(视图, 被依赖的视图)，循环依赖的视图放在最后一层
+    """
+    view_names = list(view_names)
+    depends_on = {view_name: set() for view_name in view_names}
+    for view_name, referenced_name in dependencies:
+        if view_name in depends_on and referenced_name in depends_on and view_name != referenced_name:
+            depends_on[view_name].add(referenced_name)
+    levels = []
+    created = set()
+    remaining = view_names
+    while remaining:
+        level = [view_name for view_name in remaining if depends_on[view_name] <= created]
+        if not level:  # 循环依赖
+            levels.append(remaining)
+            break
+        levels.append(level)
+        created.update(level)
+        remaining = [view_name for view_name in remaining if view_name not in created]
+    return levels
+
+
+def convert_view_sql(view_name, view_text):
+    # Oracle视图定义转换为MySQL的创建语句
+    create_view_sql = 'create view ' + view_name + ' as ' + view_text.replace('"', '')
+    create_view_sql = sql_format.sql_format(create_view_sql, wrap_add=None, mode='upper')  # sql格式化
+    create_view_sql = create_view_sql.replace('--', '-- -- ')  # 注释适配为MySQL
+    create_view_sql = create_view_sql.replace('nvl(', 'ifnull(')  # 函数替换
+    create_view_sql = create_view_sql.replace('unistr(\'\\0030\')', '0')  # 函数替换
+    create_view_sql = create_view_sql.replace('unistr(\'\\0031\')', '1')  # 函数替换
+    create_view_sql = create_view_sql.replace('unistr(\'\\0033\')', '3')  # 函数替换
+    return create_view_sql
+
+
 class DbMetadata(object):
     def __init__(self):
+        self.type_mapper = type_mapping.TypeMapper(type_mapping.load_custom_rules(configDB.config))  # 字段类型映射规则
+        self.ddl_sessions = int(configDB.config.get_mysql('ddl_sessions', 4))  # 并行创建索引、外键的MySQL会话数
+        self.compile_sessions = int(configDB.config.get_oracle('compile_sessions', 4))  # 并行编译视图、导出函数存储过程的Oracle会话数
+        self.ddl_timing = []  # 每条DDL的执行耗时
+        self.custom_tables = None  # -c选项的自定义表，只读取一次table.txt
+        self.task_recorder = task_recorder.TaskRecorder()  # 后台批量写入my_mig_task_info
         try:
             self.oracle_cursor = configDB.OraclePool()  # Oracle连接池
             self.mysql_cursor = configDB.MySQLPOOL.connection().cursor()  # MySQL连接池
@@ -50,10 +233,9 @@ class DbMetadata(object):
             print('connect database failed please check oracle client is correct or network is ok\n', e)
 
     def tbl_columns(self, table_name, fix_mode='N'):
-        # 获取Oracle的列字段类型以及字段长度以及映射数据类型到MySQL的规则
-        col_len = 0
+        # 获取Oracle的列字段类型以及字段长度，按照type_mapping规则表映射数据类型到MySQL
         output_table_col = []
-        default_str = ''
+        actual_lengths = {}
         sql = """SELECT A.COLUMN_NAME, A.DATA_TYPE, A.CHAR_LENGTH, 
         case when A.DATA_PRECISION is null then -1 else  A.DATA_PRECISION end DATA_PRECISION, 
         case when A.DATA_SCALE is null then -1 when A.DATA_SCALE >30 then least(A.DATA_PRECISION,30)-1 else  A.DATA_SCALE end DATA_SCALE, 
@@ -66,386 +248,27 @@ class DbMetadata(object):
             output_table_col = self.oracle_cursor.fetch_all(sql)
         except Exception as e:
             print(e, 'get table column failed')
-        result = []
-        exclude_default_str = ['SYSDATE', 'SYS_GUID', 'USER']
-        # primary_key = table_primary(table_name)
-        for column in output_table_col:  # 按照游标行遍历字段
-            '''
-            result.append({'column_name': column[0],
-                           'data_type': column[1],
-                           'data_length': column[2],
-                           'data_precision': column[3],
-                           'data_scale': column[4],
-                           'isnull': column[5],
-                           'comments': column[6],
-                           'data_default': column[7],
-                           'avg_col_len': column[8]
-                           })
-            '''
-            default_str = column[7]
-            if default_str is not None:
-                default_str = str(default_str).upper()
-                # 去掉默认值当中的空格
-                default_str = default_str.replace(' ', '')
-                #  去除oracle列中默认值的括号
-                if '(' in default_str or ')' in default_str:
-                    default_str = default_str.replace('(', '')
-                    default_str = default_str.replace(')', '')
-                # 去掉oracle列有函数的默认值
-                if default_str in exclude_default_str:
-                    default_str = ''
-            # 对游标cur_tbl_columns中每行的column[0-8]各字段进行层级判断
-            # 字符类型映射规则，字符串类型映射为MySQL类型varchar(n),注意NVARCHAR2(n),n是存储的字符而不是字节
-            if column[1] == 'VARCHAR2' or column[1] == 'NVARCHAR2':
-                tbl_name = table_name
-                col_name = column[0]
-                col_name = '"' + col_name + '"'
-                col_len = int(column[2])  # 获取的是字段长度括号内的大小，如varchar2(50),长度为50，nvarchar2(100)，长度是100
-                # 如果在MySQL创建表Row size too large，在创建表遇到异常之后会使用如下获取oracle字段的实际长度
-                if fix_mode == 'FIX':
-                    try:
-                        col_len = \
-                            self.oracle_cursor.fetch_one(
-                                """select nvl(max(length(%s)),0)  from \"%s\"""" % (col_name, tbl_name))[0]
-                    except Exception as e:
-                        print(e, 'get actual column length failed')
-                    if col_len == 0:  # 如果某些表没有数据。默认长度为100
-                        col_len = 100
-                    else:
-                        col_len = round(int(col_len) * 1.5)  # 查出的实际长度乘以1.5作为MySQL的长度
-                #  由于MySQL创建表的时候除了大字段，所有列长度不能大于64k，为了转换方便，如果Oracle字符串长度大于等于1000映射为MySQL的tinytext
-                #  由于MySQL大字段不能有默认值，所以这里的默认值都统一为null
-                if column[2] >= 10000:  # 此处设定了一个大值，目的是对此条件不生效，即这条规则当前弃用
-                    result.append({'fieldname': column[0],  # 如下为字段的属性值
-                                   'type': 'TINYTEXT',  # 列字段类型以及长度范围
-                                   'primary': column[0],  # 如果有主键字段返回true，否则false
-                                   'default': 'null',  # 字段默认值
-                                   'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                   'comment': column[6]
-                                   }
-                                  )
-
-                #  Oracle字符串小于1000的映射为MySQL的varchar，然后下面再对字符串的默认值做判断
-                elif column[7] is None:  # 对Oracle字符串类型默认值为null的判断
-                    result.append({'fieldname': column[0],  # 如下为字段的属性值
-                                   'type': 'VARCHAR' + '(' + str(col_len) + ')',  # 列字段类型以及长度范围
-                                   'primary': column[0],  # 如果有主键字段返回true，否则false
-                                   'default': default_str,  # 字段默认值
-                                   'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                   'comment': column[6]
-                                   }
-                                  )
-                else:  # 其余情况的默认值，MySQL保持默认不变
-                    result.append({'fieldname': column[0],  # 如下为字段的属性值
-                                   'type': 'VARCHAR' + '(' + str(col_len) + ')',  # 列字段类型以及长度范围
-                                   'primary': column[0],  # 如果有主键字段返回true，否则false
-                                   'default': default_str,  # 字段默认值
-                                   'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                   'comment': column[6]
-                                   }
-                                  )
-            # 字符类型映射规则，字符串类型映射为MySQL类型char(n)
-            elif column[1] == 'CHAR' or column[1] == 'NCHAR':
-                result.append({'fieldname': column[0],  # 如下为字段的属性值
-                               'type': 'CHAR' + '(' + str(column[2]) + ')',  # 列字段类型以及长度范围
-                               'primary': column[0],  # 如果有主键字段返回true，否则false
-                               'default': default_str,  # 字段默认值
-                               'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                               'comment': column[6]
-                               }
-                              )
-            elif column[1] == 'UROWID':
-                result.append({'fieldname': column[0],  # 如下为字段的属性值
-                               'type': 'VARCHAR' + '(' + str(column[2]) + ')',  # 列字段类型以及长度范围
-                               'primary': column[0],  # 如果有主键字段返回true，否则false
-                               'default': default_str,  # 字段默认值
-                               'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                               'comment': column[6]
-                               }
-                              )
-
-            # 时间日期类型映射规则，Oracle date类型映射为MySQL类型datetime
-            elif column[1] == 'DATE' or column[1] == 'TIMESTAMP(6)' or column[1] == 'TIMESTAMP(0)':
-                # Oracle 默认值sysdate映射到MySQL默认值current_timestamp
-                if column[7] == 'sysdate' or column[7] == '( (SYSDATE) )':
-                    result.append({'fieldname': column[0],  # 如下为字段的属性值
-                                   'type': 'DATETIME',  # 列字段类型以及长度范围
-                                   'primary': column[0],  # 如果有主键字段返回true，否则false
-                                   'default': 'current_timestamp()',  # 字段默认值
-                                   'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                   'comment': column[6]
-                                   }
-                                  )
-                # 其他时间日期默认值保持不变(原模原样对应)
-                else:
-                    result.append({'fieldname': column[0],  # 如下为字段的属性值
-                                   'type': 'DATETIME',  # 列字段类型以及长度范围
-                                   'primary': column[0],  # 如果有主键字段返回true，否则false
-                                   'default': '',  # 字段默认值
-                                   'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                   'comment': column[6]
-                                   }
-                                  )
-
-            # 数值类型映射规则，判断Oracle number类型是否是浮点，是否是整数，转为MySQL的int或者decimal。下面分了3种情况区分整数与浮点
-            # column[n] == -1,即DATA_PRECISION，DATA_SCALE，AVG_COL_LEN为null，仅在如下if条件判断是否为空
-            elif column[1] == 'NUMBER':
-                # 场景1:浮点类型判断，如number(5,2)映射为MySQL的DECIMAL(5,2)
-                # Oracle number(m,n) -> MySQL decimal(m,n)
-                if column[3] > 0 and column[4] > 0:
-                    result.append({'fieldname': column[0],
-                                   'type': 'DECIMAL' + '(' + str(column[3]) + ',' + str(column[4]) + ')',  # 列字段类型以及长度范围
-                                   'primary': column[0],  # 如果有主键字段返回true，否则false
-                                   'default': column[7],  # 字段默认值
-                                   'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                   'comment': column[6]
-                                   }
-                                  )
-                # 场景2:整数类型以及平均字段长度判断，如number(20,0)，如果AVG_COL_LEN比较大，映射为MySQL的bigint
-                # column[8] >= 6 ,Oracle number(m,0) -> MySQL bigint
-                elif column[3] > 0 and column[4] == 0 and column[8] >= 6:
-                    # number类型的默认值有3种情况，一种是null，一种是字符串值为null，剩余其他类型只提取默认值数字部分
-                    if column[7] is None:  # 对Oracle number字段类型默认值为null的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper().startswith('NULL'):  # 对默认值的字符串值等于'null'的做判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    else:  # 其余情况通过正则只提取数字部分，即去掉原Oracle中有括号的默认值
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': '' if column[7].upper() == """''""" else
-                                       re.findall(r'\b\d+\b', column[7])[0],
-                                       # 字段默认值如果是''包围则将MySQL默认值调整为null，其余单引号包围去掉括号，仅提取数字
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
+        # 如果在MySQL创建表Row size too large，在创建表遇到异常之后会使用如下获取oracle字符串字段的实际长度
+        if fix_mode == 'FIX':
+            actual_lengths = self.tbl_varchar_lengths(table_name, output_table_col)
+        return self.type_mapper.map_columns(output_table_col, actual_lengths)
 
-                # 场景3:整数类型以及平均字段长度判断，如number(10,0)，如果AVG_COL_LEN比较小，映射为MySQL的INT
-                # column[8] < 6 ,Oracle number(m,0) -> MySQL bigint
-                elif column[3] > 0 and column[4] == 0 and column[8] < 6:
-                    if column[7] is None:  # 对Oracle number字段类型默认值为null的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper().startswith('NULL'):  # 对默认值的字符串值等于'null'的做判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper() == '':  # 对默认值的字符串值等于''的做判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    else:  # 其余情况通过正则只提取数字部分，即去掉原Oracle中有括号的默认值
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': '' if column[7].upper() == """''""" else
-                                       re.findall(r'\b\d+\b', column[7])[0],
-                                       # 字段默认值如果是''包围则将MySQL默认值调整为null，其余单引号包围去掉括号，仅提取数字
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-
-                # 场景4:无括号包围的number整数类型以及长度判断，如id number,若AVG_COL_LEN比较大，映射为MySQL的bigint
-                # column[8] >= 6 ,Oracle number -> MySQL bigint
-                elif column[3] == -1 and column[4] == -1 and column[8] >= 6:
-                    if column[7] is None:  # 对Oracle number字段类型默认值为null的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper().startswith('NULL'):  # 对默认值的字符串值等于'null'的做判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper() == '':  # 对默认值的字符串值等于''的做判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    else:  # 其余情况通过正则只提取数字部分，即去掉原Oracle中有括号的默认值
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': '' if column[7].upper() == """''""" else
-                                       re.findall(r'\b\d+\b', column[7])[0],
-                                       # 字段默认值如果是''包围则将MySQL默认值调整为null，其余单引号包围去掉括号，仅提取数字
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-
-                # 场景5:无括号包围的number整数类型判断，如id number,若AVG_COL_LEN比较小，映射为MySQL的INT
-                # column[8] < 6 ,Oracle number -> MySQL int
-                elif column[3] == -1 and column[4] == -1 and column[8] < 6:
-                    if column[7] is None:  # 对默认值是否为null的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper().startswith('NULL'):  # 对数据库中默认值字符串为'null'的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    else:  # 其余情况number字段类型正则提取默认值数字部分
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': '' if column[7].upper() == """''""" else
-                                       re.findall(r'\b\d+\b', column[7])[0],
-                                       # 字段默认值如果是''包围则将MySQL默认值调整为null，其余单引号包围去掉括号，仅提取数字
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-
-                # 场景6:int整数类型判断，如id int,(oracle的int会自动转为number),若AVG_COL_LEN比较大，映射为MySQL的bigint
-                elif column[3] == -1 and column[4] == 0 and column[8] >= 6:
-                    if column[7] is None:  # 对默认值是否为null的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper().startswith('NULL'):  # 数据库中字段类型默认值为字符串'null'的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    else:  # 其余情况number字段类型正则提取默认值数字部分
-                        result.append({'fieldname': column[0],
-                                       'type': 'BIGINT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': '' if column[7].upper() == """''""" else
-                                       re.findall(r'\b\d+\b', column[7])[0],
-                                       # 字段默认值如果是''包围则将MySQL默认值调整为null，其余单引号包围去掉括号，仅提取数字
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-
-                # 场景7:int整数类型判断，如id int,(oracle的int会自动转为number)若AVG_COL_LEN比较小，映射为MySQL的INT
-                elif column[3] == -1 and column[4] == 0 and column[8] < 6:
-                    if column[7] is None:  # 对默认值是否为null的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    elif column[7].upper().startswith('NULL'):  # 数据库中字段类型默认值为字符串'null'的判断
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': column[7],  # 字段默认值,设为原值null
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-                    else:  # 其余情况number字段类型正则提取默认值数字部分
-                        result.append({'fieldname': column[0],
-                                       'type': 'INT',  # 列字段类型以及长度范围
-                                       'primary': column[0],  # 如果有主键字段返回true，否则false
-                                       'default': '' if column[7].upper() == """''""" else
-                                       re.findall(r'\b\d+\b', column[7])[0],
-                                       # 字段默认值如果是''包围则将MySQL默认值调整为null，其余单引号包围去掉括号，仅提取数字
-                                       'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                                       'comment': column[6]
-                                       }
-                                      )
-            # 大字段映射规则，文本类型大字段映射为MySQL类型longtext,大字段不能有默认值，这里统一为null
-            elif column[1] == 'CLOB' or column[1] == 'NCLOB' or column[1] == 'LONG':
-                result.append({'fieldname': column[0],  # 如下为字段的属性值
-                               'type': 'LONGTEXT',  # 列字段类型以及长度范围
-                               'primary': column[0],  # 如果有主键字段返回true，否则false
-                               'default': '',  # 字段默认值
-                               'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                               'comment': column[6]
-                               }
-                              )
-            # 大字段映射规则，16进制类型大字段映射为MySQL类型longblob
-            elif column[1] == 'BLOB' or column[1] == 'RAW' or column[1] == 'LONG RAW':
-                result.append({'fieldname': column[0],  # 如下为字段的属性值
-                               'type': 'LONGBLOB',  # 列字段类型以及长度范围
-                               'primary': column[0],  # 如果有主键字段返回true，否则false
-                               'default': '',  # 字段默认值
-                               'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                               'comment': column[6]
-                               }
-                              )
-            else:
-                result.append({'fieldname': column[0],  # 如果是非大字段类型，通过括号加上字段类型长度范围
-                               'type': column[1] + '(' + str(column[2]) + ')',  # 列字段类型以及长度范围
-                               'primary': column[0],  # 如果有主键字段返回true，否则false
-                               'default': column[7],  # 字段默认值
-                               'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
-                               'comment': column[6]
-                               }
-
-                              )
-        return result
+    def tbl_varchar_lengths(self, table_name, output_table_col):
+        """
+        FIX模式下一次扫描源表获取所有varchar2、nvarchar2字段的实际最大长度
+        实际长度乘以1.5作为MySQL的长度，没有数据的默认长度为100
+        """
+        col_names = [column[0] for column in output_table_col if column[1] in ('VARCHAR2', 'NVARCHAR2')]
+        col_lens = [int(column[2]) for column in output_table_col if column[1] in ('VARCHAR2', 'NVARCHAR2')]
+        if not col_names:
+            return {}
+        try:
+            col_lens = self.oracle_cursor.fetch_one("""select %s from \"%s\"""" % (
+                ','.join('nvl(max(length("%s")),0)' % col_name for col_name in col_names), table_name))
+        except Exception as e:
+            print(e, 'get actual column length failed')
+        return {col_name: 100 if col_len == 0 else round(int(col_len) * 1.5) for col_name, col_len in
+                zip(col_names, col_lens)}
 
     def get_info(self, run_method, mode, log_path, version):
         # 打印连接信息
@@ -549,8 +372,7 @@ class DbMetadata(object):
         # 创建迁移任务表，用来统计表插入以及完成的时间
         try:
             self.mysql_cursor.execute("""drop table if exists my_mig_task_info""")
-            self.mysql_cursor.execute(
-                """create table my_mig_task_info(table_name varchar(500),task_start_time datetime(3) default current_timestamp(3),  task_end_time datetime(3) default current_timestamp(3),thread int,run_time decimal(30,6),source_table_rows bigint default 0,target_table_rows bigint default 0, is_success varchar(100) default '',run_status varchar(10) default '',type varchar(100) default 'TABLE',detail varchar(100) default '')""")
+            self.mysql_cursor.execute(task_recorder.CREATE_TASK_TABLE_SQL)
         except Exception as e:
             print(e)
 
@@ -723,6 +545,18 @@ class DbMetadata(object):
         f = open("run_report.html", "a", encoding="utf-8")
         f.write(html)
 
+    def custom_table_list(self, log_path):
+        # 读取table.txt中的自定义表名，第一次调用之后缓存，各阶段用table_in_filter一次性查询所有自定义表
+        if self.custom_tables is None:
+            custom_tables = {}  # 去重并保持table.txt中的顺序
+            with open(log_path + "table.txt", "r") as f:
+                for line in f:
+                    table_name = line.strip('\n').upper().split(',')[0].strip()
+                    if table_name:
+                        custom_tables[table_name] = None
+            self.custom_tables = list(custom_tables)
+        return self.custom_tables
+
     def cte_tab(self, log_path, is_custom_table):
         # db_meta = DbMetadata()
         output_table_name = []  # 用于存储要迁移的部分表
@@ -875,262 +709,237 @@ class DbMetadata(object):
         print('#' * 50 + 'TABLE CREATE FINISH' + '#' * 50 + '\n\n\n')
         if len(ddl_failed_table_result) > 0:
             for fail_table_name in ddl_failed_table_result:
-                try:
-                    self.mysql_cursor.execute(
-                        "insert into  my_mig_task_info(table_name,detail,type) values('%s','%s','%s')" % (
-                            fail_table_name, 'TABLE NOT EXIST', 'TABLE'))
-                except Exception as e:
-                    print(e, 'insert table my_mig_task_info failed')
+                self.task_recorder.record(table_name=fail_table_name, detail='TABLE NOT EXIST', type='TABLE')
         return all_table_count, list_success_table, ddl_failed_table_result
 
     def cte_idx(self, log_path, is_custom_table):
         # 批量创建主键以及索引
-        all_constraints_count = 0  # 约束以及索引总数（排除掉非normal index）
-        all_constraints_success_count = 0  # mysql中约束以及索引创建成功的计数
-        function_based_index_count = 0  # function_based_index总数
-        function_based_index = []
+        executor = ddl_executor.DdlExecutor(self.ddl_sessions)
+        idx_task = self.submit_idx(executor, log_path, is_custom_table)
+        executor.shutdown()
+        return self.collect_idx(idx_task, log_path)
+
+    def submit_idx(self, executor, log_path, is_custom_table):
+        """
+        查询需要创建的索引并提交到executor，不等待执行结果，结果由collect_idx汇总
+        同一张表的索引在executor中依次执行，表被hold时等到该表数据迁移完成之后才开始创建
+        """
         user_name = self.oracle_cursor.fetch_one("""select user from dual""")
         user_name = user_name[0]
-        constraint_failed_count = 0
-        output_table_name = []  # 迁移部分表
-        create_index = ''
-        all_index = []  # 存储执行创建约束的结果集
         start_time = datetime.datetime.now()
         print('#' * 50 + 'CREATE ' + 'CONSTRAINT AND INDEX  ' + '#' * 50)
         print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
         # 以下是创建 NORMAL的主键以及普通索引
-        if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分约束
-            with open(log_path + "table.txt", "r") as f:  # 读取自定义表
-                for line in f:
-                    output_table_name.append(list(line.strip('\n').upper().split(',')))  # 将自定义表全部保存到list
-            for v_custom_table in output_table_name:  # 读取第N个表查询生成拼接sql
-                custom_index = self.oracle_cursor.fetch_all("""SELECT
-                           (CASE
-                             WHEN C.CONSTRAINT_TYPE = 'P' OR C.CONSTRAINT_TYPE = 'R' THEN
-                              'ALTER TABLE ' || T.TABLE_NAME || ' ADD CONSTRAINT ' ||
-                              '`'||T.INDEX_NAME||'`' || (CASE
-                                WHEN C.CONSTRAINT_TYPE = 'P' THEN
-                                 ' PRIMARY KEY ('
-                                ELSE
-                                 ' FOREIGN KEY ('
-                              END) || listagg(T.COLUMN_NAME,',') within group(order by T.COLUMN_position) || ');'
-                             ELSE
-                              'CREATE ' || (CASE
-                                WHEN I.UNIQUENESS = 'UNIQUE' THEN
-                                 I.UNIQUENESS || ' '
-                                ELSE
-                                 CASE
-                                   WHEN I.INDEX_TYPE = 'NORMAL' THEN
-                                    ''
-                                   ELSE
-                                    I.INDEX_TYPE || ' '
-                                 END
-                              END) || 'INDEX ' || '`'||T.INDEX_NAME||'`' || ' ON ' || T.TABLE_NAME || '(' ||
-                              listagg(T.COLUMN_NAME,',') within group(order by T.COLUMN_position) || ');'
-                           END) SQL_CMD
-                      FROM USER_IND_COLUMNS T, USER_INDEXES I, USER_CONSTRAINTS C
-                     WHERE T.INDEX_NAME = I.INDEX_NAME
-                       AND T.INDEX_NAME = C.CONSTRAINT_NAME(+)
-                       AND T.TABLE_NAME = '%s'
-                       and i.index_type != 'FUNCTION-BASED NORMAL'
-                     GROUP BY T.TABLE_NAME,
-                              T.INDEX_NAME,
-                              I.UNIQUENESS,
-                              I.INDEX_TYPE,
-                              C.CONSTRAINT_TYPE""" % v_custom_table[0])
-                for v_out in custom_index:  # 每次将上面单表全部结果集全部存到all_index的list里面
-                    all_index.append(v_out)
+        if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分约束，所有自定义表的索引一次查询
+            table_filter = table_in_filter('T.TABLE_NAME', self.custom_table_list(log_path))
         else:  # 命令行参数没有-c选项，创建所有约束
-            all_index = self.oracle_cursor.fetch_all("""SELECT
-                       (CASE
-                         WHEN C.CONSTRAINT_TYPE = 'P' OR C.CONSTRAINT_TYPE = 'R' THEN
-                          'ALTER TABLE ' || T.TABLE_NAME || ' ADD CONSTRAINT ' ||
-                          '`'||T.INDEX_NAME||'`' || (CASE
-                            WHEN C.CONSTRAINT_TYPE = 'P' THEN
-                             ' PRIMARY KEY ('
-                            ELSE
-                             ' FOREIGN KEY ('
-                          END) || listagg(T.COLUMN_NAME,',') within group(order by T.COLUMN_position) || ');'
-                         ELSE
-                          'CREATE ' || (CASE
-                            WHEN I.UNIQUENESS = 'UNIQUE' THEN
-                             I.UNIQUENESS || ' '
-                            ELSE
-                             CASE
-                               WHEN I.INDEX_TYPE = 'NORMAL' THEN
-                                ''
-                               ELSE
-                                I.INDEX_TYPE || ' '
-                             END
-                          END) || 'INDEX ' || '`'||T.INDEX_NAME||'`' || ' ON ' || T.TABLE_NAME || '(' ||
-                          listagg(T.COLUMN_NAME,',') within group(order by T.COLUMN_position) || ');'
-                       END) SQL_CMD
-                  FROM USER_IND_COLUMNS T, USER_INDEXES I, USER_CONSTRAINTS C
-                 WHERE T.INDEX_NAME = I.INDEX_NAME
-                   AND T.INDEX_NAME = C.CONSTRAINT_NAME(+)
-                   and i.index_type != 'FUNCTION-BASED NORMAL'
-                 GROUP BY T.TABLE_NAME,
-                          T.INDEX_NAME,
-                          I.UNIQUENESS,
-                          I.INDEX_TYPE,
-                          C.CONSTRAINT_TYPE""")  # 如果要每张表查使用T.TABLE_NAME = '%s',%s传进去是没有单引号，所以需要用单引号号包围
-        all_constraints_count = len(all_index)
+            table_filter = ''
+        all_index = self.oracle_cursor.fetch_all(INDEX_COLUMNS_SQL % table_filter)  # 存储每个索引的表名、索引名、类型以及列字段
+        all_constraints_count = len(all_index)  # 约束以及索引总数（排除掉非normal index）
+        # 多个MySQL会话并行创建不同表的索引，同一张表的索引依次创建
+        index_num = itertools.count(1)
         if all_constraints_count > 0:
             print('CREATE normal index:\n')
-            index_num = 0
-            for d in all_index:
-                index_num += 1
-                create_index_sql = d[0]  # 之前是wm_concat返回的是clob，所以用read读取大对象（d[0].read()），否则会报错
-                print('-- ' + str(index_num) + ' ' + str(datetime.datetime.now()) + '\n' + create_index_sql + '\n')
-                filename = log_path + 'create_index.sql'
-                f = open(filename, 'a', encoding='utf-8')
-                f.write('-- ' + str(index_num) + ' ' + str(datetime.datetime.now()) + '\n' + create_index_sql + '\n')
-                f.close()
-                try:
-                    self.mysql_cursor.execute(
-                        """insert into my_mig_task_info(table_name,task_start_time,run_status) values('%s',current_timestamp(3),'%s')""" % (
-                            create_index_sql, 'running'))
-                except Exception as e:
-                    print(e)
-                try:
-                    self.mysql_cursor.execute(create_index_sql)
-                    self.mysql_cursor.execute(
-                        """update my_mig_task_info set run_status='end' where table_name='%s' """ % create_index_sql)
-                    self.mysql_cursor.execute('commit')
-                    all_constraints_success_count += 1
-                except Exception as e:
-                    constraint_failed_count += 1
-                    print('\n' + '/* ' + str(e.args) + ' */' + '\n')
-                    print('CREATE CONSTRAINT INDEX FAILED!\n')
-                    filename = log_path + 'ddl_failed_table.log'
-                    f = open(filename, 'a', encoding='utf-8')
-                    f.write('\n-- ' + ' CONSTRAINTS CREATE ERROR ' + str(constraint_failed_count) + ' -- \n')
-                    f.write(create_index_sql + '\n\n\n')
-                    f.write('\n' + '/* ' + str(e.args) + ' */' + '\n')
-                    f.close()
-                    self.mysql_cursor.execute(
-                        """update my_mig_task_info set run_status='failed' where table_name='%s' """ % create_index_sql)
-                    self.mysql_cursor.execute('commit')
+            # 同一张表的主键、唯一索引以及普通索引合并为一条ALTER TABLE，MySQL只需重建或排序一次表
+            index_futures = [executor.submit(table_name, self.cte_table_idx, table_name, batch_sql, index_list,
+                                             log_path, index_num)
+                             for table_name, batch_sql, index_list in group_index_sql(all_index)]
         else:
+            index_futures = []
             print('NO normal index')
         # 以下是创建非normal索引
         if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分约束
-            for v_custom_table in output_table_name:  # 读取第N个表
-                function_index = self.oracle_cursor.fetch_all(
-                    """Select index_name from user_indexes where index_type='FUNCTION-BASED NORMAL' and table_name ='%s'""" %
-                    v_custom_table[0])  # 根据第N个表，获取所有所有名称
-                for v_out0 in function_index:  # 将上述获取的若干索引名称一一存入list
-                    function_based_index.append(v_out0)
-        else:  # 查询所有表的索引名称
-            function_based_index = self.oracle_cursor.fetch_all(
-                """Select index_name from user_indexes where index_type='FUNCTION-BASED NORMAL'""")
+            table_filter = table_in_filter('table_name', self.custom_table_list(log_path))
+        function_based_index = self.oracle_cursor.fetch_all(
+            """Select index_name,table_name from user_indexes where index_type='FUNCTION-BASED NORMAL' %s""" %
+            table_filter)
         function_based_index_count = len(function_based_index)  # 如果有非normal索引
         if function_based_index_count > 0:
             print('CREATE NON normal index:\n')
-        for v_function_based_index in function_based_index:
-            fun_index_name = v_function_based_index[0]
-            try:  # 下面是生成非normal索引的拼接sql，来源于dbms_metadata.get_ddl
-                create_index = self.oracle_cursor.fetch_one(
-                    """select trim(replace(regexp_replace(regexp_replace(SUBSTR(upper(to_char(dbms_metadata.get_ddl('INDEX','%s','%s'))), 1, INSTR(upper(to_char(dbms_metadata.get_ddl('INDEX','%s','%s'))), ' PCTFREE')-1),'"','',1,0,'i'),'%s'||'.','',1,0,'i'),chr(10),'')) from dual""" % (
-                        fun_index_name, user_name, fun_index_name, user_name, user_name))
-                create_index = create_index[0]
-                print(create_index)
-                self.mysql_cursor.execute(create_index)
-                print('success\n')
+        func_futures = [executor.submit(v_function_based_index[1], self.cte_func_idx, v_function_based_index[0],
+                                        user_name, v_function_based_index[1])
+                        for v_function_based_index in function_based_index]
+        return start_time, all_constraints_count, function_based_index_count, index_futures, func_futures
+
+    def collect_idx(self, idx_task, log_path):
+        # 等待submit_idx提交的索引创建完成，记录失败的索引，返回索引的统计数
+        start_time, all_constraints_count, function_based_index_count, index_futures, func_futures = idx_task
+        all_constraints_success_count = 0  # mysql中约束以及索引创建成功的计数
+        constraint_failed_count = 0
+        for future in concurrent.futures.as_completed(index_futures):
+            success_count, failed_index = future.result()
+            all_constraints_success_count += success_count
+            for create_index_sql, err in failed_index:
+                constraint_failed_count += 1
+                print('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                print('CREATE CONSTRAINT INDEX FAILED!\n')
+                filename = log_path + 'ddl_failed_table.log'
+                f = open(filename, 'a', encoding='utf-8')
+                f.write('\n-- ' + ' CONSTRAINTS CREATE ERROR ' + str(constraint_failed_count) + ' -- \n')
+                f.write(create_index_sql + '\n\n\n')
+                f.write('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                f.close()
+        for future in concurrent.futures.as_completed(func_futures):
+            create_index, err = future.result()
+            if err is None:
                 all_constraints_success_count += 1
-            except Exception as e:
+            else:
                 constraint_failed_count += 1
-                print('\n' + '/* ' + str(e.args) + ' */' + '\n')
+                print('\n' + '/* ' + str(err.args) + ' */' + '\n')
                 print('NON NORMAL INDEX CREATE ERROR\n')
                 filename = log_path + 'ddl_failed_table.log'
                 f = open(filename, 'a', encoding='utf-8')
                 f.write('\n-- ' + 'NON NORMAL INDEX CREATE ERROR ' + str(constraint_failed_count) + '\n')
                 f.write(create_index + ';\n')
-                f.write('\n' + '/* ' + str(e.args) + ' */' + '\n')
+                f.write('\n' + '/* ' + str(err.args) + ' */' + '\n')
                 f.close()
+        self.save_ddl_timing(log_path)
         print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
         end_time = datetime.datetime.now()
         print('CREATE INDEX CONSTRAINT ELAPSED TIME: ' + str((end_time - start_time).seconds))
         print('#' * 50 + 'CONSTRAINT INDEX FINISH' + '#' * 50 + '\n\n\n')
         return all_constraints_count, all_constraints_success_count, function_based_index_count, constraint_failed_count
 
+    def cte_table_idx(self, table_name, batch_sql, index_list, log_path, index_num, cursor=None):
+        """
+        创建一张表的索引，先执行合并的ALTER TABLE，失败之后再逐个创建
+        返回成功创建的索引数以及失败的[(索引语句, 异常)]
+        """
+        if batch_sql:
+            self.log_index_sql(log_path, next(index_num), batch_sql)
+            if self.exec_ddl(batch_sql, table_name, cursor=cursor) is None:
+                return len(index_list), []
+            # 合并的语句执行失败，再逐个创建该表的索引
+            print('BATCH CREATE INDEX ON ' + table_name + ' FAILED, CREATE ONE BY ONE\n')
+        success_count = 0
+        failed_index = []
+        for create_index_sql, clause in index_list:
+            self.log_index_sql(log_path, next(index_num), create_index_sql)
+            err = self.exec_ddl(create_index_sql, table_name, cursor=cursor)
+            if err is None:
+                success_count += 1
+            else:
+                failed_index.append((create_index_sql, err))
+        return success_count, failed_index
+
+    def cte_func_idx(self, fun_index_name, user_name, table_name='', cursor=None):
+        # 生成非normal索引的拼接sql，来源于dbms_metadata.get_ddl，返回(索引语句, 异常)
+        create_index = ''
+        try:
+            create_index = self.oracle_cursor.fetch_one(
+                """select trim(replace(regexp_replace(regexp_replace(SUBSTR(upper(to_char(dbms_metadata.get_ddl('INDEX','%s','%s'))), 1, INSTR(upper(to_char(dbms_metadata.get_ddl('INDEX','%s','%s'))), ' PCTFREE')-1),'"','',1,0,'i'),'%s'||'.','',1,0,'i'),chr(10),'')) from dual""" % (
+                    fun_index_name, user_name, fun_index_name, user_name, user_name))
+            create_index = create_index[0]
+            print(create_index)
+        except Exception as e:
+            return create_index, e
+        err = self.exec_ddl(create_index, table_name, cursor=cursor)
+        if err is None:
+            print('success\n')
+        return create_index, err
+
+    @staticmethod
+    def log_index_sql(log_path, index_num, create_index_sql):
+        print('-- ' + str(index_num) + ' ' + str(datetime.datetime.now()) + '\n' + create_index_sql + '\n')
+        filename = log_path + 'create_index.sql'
+        f = open(filename, 'a', encoding='utf-8')
+        f.write('-- ' + str(index_num) + ' ' + str(datetime.datetime.now()) + '\n' + create_index_sql + '\n')
+        f.close()
+
+    def exec_ddl(self, ddl_sql, table_name='', cursor=None):
+        """
+        在MySQL执行DDL，成功返回None，失败返回异常
+        运行状态以及耗时交给task_recorder批量写入my_mig_task_info，type为DDL，语句保存在task_sql
+        cursor为DdlExecutor分配的会话，不指定时使用self.mysql_cursor
+        """
+        if cursor is None:
+            cursor = self.mysql_cursor
+        begin_time = datetime.datetime.now()
+        try:
+            cursor.execute(ddl_sql)
+            run_status, err = 'end', None
+        except Exception as e:
+            run_status, err = 'failed', e
+        end_time = datetime.datetime.now()
+        run_time = (end_time - begin_time).total_seconds()
+        self.ddl_timing.append((str(begin_time), run_time, run_status, ddl_sql))
+        self.task_recorder.record(table_name=table_name, task_start_time=begin_time, task_end_time=end_time,
+                                  run_time=run_time, run_status=run_status, type='DDL', task_sql=ddl_sql)
+        return err
+
+    def save_ddl_timing(self, log_path):
+        # 每条DDL的开始时间、耗时、状态保存到ddl_timing.csv
+        csv_file = open(log_path + 'ddl_timing.csv', 'a', newline='', encoding='utf-8')
+        try:
+            writer = csv.writer(csv_file)
+            writer.writerows(self.ddl_timing)
+        except Exception as e:
+            print(e)
+        finally:
+            csv_file.close()
+        self.ddl_timing = []
+
     def fk(self, log_path, is_custom_table):
         # 批量创建外键
+        executor = ddl_executor.DdlExecutor(self.ddl_sessions)
+        fk_task = self.submit_fk(executor, log_path, is_custom_table)
+        executor.shutdown()
+        return self.collect_fk(fk_task, log_path)
+
+    def submit_fk(self, executor, log_path, is_custom_table):
         """
+        查询外键并提交到executor，结果由collect_fk汇总
+        外键同时占用子表和父表，需要在两张表的索引提交之后再提交，这样两张表的索引都创建完成才会创建外键
         11g以及之前的能用WMSYS.WM_CONCAT(A.COLUMN_NAME)，之后需使用listagg(A.COLUMN_NAME,',') within group(order by a.position)
         """
         all_fk_count = 0
-        all_fk_success_count = 0
         fk_err_count = 0
         begin_time = datetime.datetime.now()
-        fk_table = []  # 存储要创建外键的表
+        futures = []
         print('#' * 50 + 'CREATE ' + 'FOREIGN KEY ' + '#' * 50)
         print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
-        if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分外键
-            with open(log_path + "table.txt", "r") as f:
-                for line in f:  # 将自定义表存到list
-                    fk_table.append(list(line.strip('\n').upper().split(',')))
+        if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分外键，所有自定义表的外键一次查询
+            table_filter = table_in_filter('B.TABLE_NAME', self.custom_table_list(log_path))
         else:  # 创建全部外键
-            table_foreign_key = 'select table_name from USER_CONSTRAINTS where CONSTRAINT_TYPE= \'R\''
-            try:
-                fk_table = self.oracle_cursor.fetch_all(table_foreign_key)
-            except Exception as e:
-                print(e)
-                fk_table = []
-        if len(fk_table) > 0:
+            table_filter = ''
+        try:
+            all_foreign_key = self.oracle_cursor.fetch_all(FOREIGN_KEY_SQL % table_filter)
+        except Exception as e:
+            all_foreign_key = []
+            fk_err_count += 1
+            print('get foreign key failed ', e)
+        if len(all_foreign_key) > 0:
             print('START CREATE FOREIGN KEY')
-            for v_result_table in fk_table:  # 获得一张表创建外键的拼接语句，按照每张表顺序来创建外键
-                table_name = v_result_table[0]
-                try:
-                    all_foreign_key = self.oracle_cursor.fetch_all("""SELECT 'ALTER TABLE ' || B.TABLE_NAME || ' ADD CONSTRAINT ' ||
-                                B.CONSTRAINT_NAME || ' FOREIGN KEY (' ||
-                                (SELECT listagg(A.COLUMN_NAME,',') within group(order by a.position)
-                                   FROM USER_CONS_COLUMNS A
-                                  WHERE A.CONSTRAINT_NAME = B.CONSTRAINT_NAME) || ') REFERENCES ' ||
-                                (SELECT B1.table_name FROM USER_CONSTRAINTS B1
-                                  WHERE B1.CONSTRAINT_NAME = B.R_CONSTRAINT_NAME) || '(' ||
-                                (SELECT listagg(A.COLUMN_NAME,',') within group(order by a.position)
-                                   FROM USER_CONS_COLUMNS A
-                                  WHERE A.CONSTRAINT_NAME = B.R_CONSTRAINT_NAME) || ');'
-                           FROM USER_CONSTRAINTS B
-                          WHERE B.CONSTRAINT_TYPE = 'R' and TABLE_NAME='%s'""" % table_name)
-                except Exception as e:
-                    all_foreign_key = []
-                    fk_err_count += 1
-                    print('table ', table_name, 'create foreign key failed ', e)
-                for e in all_foreign_key:  # 根据上面的查询结果集，创建外键
-                    create_foreign_key_sql = e[0]
-                    print(create_foreign_key_sql)
-                    all_fk_count += 1  # 外键总数
-                    try:
-                        self.mysql_cursor.execute(
-                            """insert into my_mig_task_info(table_name,task_start_time,run_status) values('%s',current_timestamp(3),'%s')""" % (
-                                create_foreign_key_sql, 'running'))
-                    except Exception as e:
-                        print(e)
-                    try:
-                        self.mysql_cursor.execute(create_foreign_key_sql)
-                        print('FINISH CREATE FOREIGN KEY\n')
-                        all_fk_success_count += 1
-                        self.mysql_cursor.execute(
-                            """update my_mig_task_info set run_status='end' where table_name='%s' """ % create_foreign_key_sql)
-                        self.mysql_cursor.execute('commit')
-                    except Exception as e:
-                        fk_err_count += 1
-                        print('\n' + '/* ' + str(e.args) + ' */' + '\n')
-                        print('CREATE FOREIGN KEY ERROR PLEASE CHECK DDL!\n')
-                        # print(traceback.format_exc())
-                        filename = log_path + 'ddl_failed_table.log'
-                        f = open(filename, 'a', encoding='utf-8')
-                        f.write('\n-- ' + ' FOREIGNKEY CREATE ERROR ' + str(fk_err_count) + '\n')
-                        f.write(create_foreign_key_sql + ';\n')
-                        f.write('\n' + '/* ' + str(e.args) + ' */' + '\n')
-                        f.close()
-                        self.mysql_cursor.execute(
-                            """update my_mig_task_info set run_status='failed' where table_name='%s' """ % create_foreign_key_sql)
-                        self.mysql_cursor.execute('commit')
+            for e in all_foreign_key:  # 根据上面的查询结果集，按照每张表顺序来创建外键
+                create_foreign_key_sql = e[0]
+                all_fk_count += 1  # 外键总数
+                future = executor.submit((e[2], e[1]), self.exec_ddl, create_foreign_key_sql, e[2])
+                futures.append((future, create_foreign_key_sql))
         else:
             print('NO FOREIGN KEY')
+        return begin_time, all_fk_count, fk_err_count, futures
+
+    def collect_fk(self, fk_task, log_path):
+        # 等待submit_fk提交的外键创建完成，返回外键总数、成功数以及失败数
+        begin_time, all_fk_count, fk_err_count, futures = fk_task
+        all_fk_success_count = 0
+        for future, create_foreign_key_sql in futures:
+            err = future.result()
+            print(create_foreign_key_sql)
+            if err is None:
+                print('FINISH CREATE FOREIGN KEY\n')
+                all_fk_success_count += 1
+            else:
+                fk_err_count += 1
+                print('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                print('CREATE FOREIGN KEY ERROR PLEASE CHECK DDL!\n')
+                filename = log_path + 'ddl_failed_table.log'
+                f = open(filename, 'a', encoding='utf-8')
+                f.write('\n-- ' + ' FOREIGNKEY CREATE ERROR ' + str(fk_err_count) + '\n')
+                f.write(create_foreign_key_sql + ';\n')
+                f.write('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                f.close()
+        self.save_ddl_timing(log_path)
         print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
         end_time = datetime.datetime.now()
         print('CREATE FOREIGN KEY ELASPSED TIME: ' + str((end_time - begin_time).seconds))
@@ -1138,216 +947,108 @@ class DbMetadata(object):
         return all_fk_count, all_fk_success_count, fk_err_count
 
     def cte_trg(self, log_path, is_custom_table):
-        # 查找具有自增特性的表以及字段名称
-        all_inc_col_success_count = 0
-        all_inc_col_failed_count = 0
-        oracle_autocol_total = 0
-        normal_trigger_count = 0  # 用于统计oracle触发器（排除掉序列相关触发器）的总数
-        trigger_success_count = 0  # mysql中触发器创建成功的总数
-        trigger_failed_count = 0  # mysql中触发器创建失败的总数
-        normal_trigger = []  # 用于存自定义表读取之后的触发器名称
-        create_trigger = ''  # 触发器创建的sql
-        count_1 = 0  # 自增列索引创建失败的计数
+        # 创建自增列以及触发器
+        executor = ddl_executor.DdlExecutor(self.ddl_sessions)
+        trg_task = self.submit_trg(executor, log_path, is_custom_table)
+        executor.shutdown()
+        return self.collect_trg(trg_task, log_path, is_custom_table)
+
+    def submit_trg(self, executor, log_path, is_custom_table):
+        """
+        一次查询user_triggers，在本地分析序列实现的自增列，自增列的索引以及修改自增属性提交到executor，结果由collect_trg汇总
+        不再在Oracle创建trigger_name临时表，源库没有任何写操作
+        常规触发器在collect_trg中创建，避免数据迁移过程中触发
+        """
+        index_futures = []
+        alter_futures = []
         start_time = datetime.datetime.now()
         user_name = self.oracle_cursor.fetch_one("""select user from dual""")
         user_name = user_name[0]
-        # Oracle中无法对long类型数据截取，创建用于存储触发器字段信息的临时表TRIGGER_NAME
-        try:
-            count_num_tri = \
-                self.oracle_cursor.fetch_one("""select count(*) from user_tables where table_name='TRIGGER_NAME'""")[0]
-        except Exception as e:
-            count_num_tri = 0
-            print(e)
-        if count_num_tri == 1:  # 判断表trigger_name是否存在
-            try:
-                self.oracle_cursor.execute_sql("""truncate table trigger_name""")
-            except Exception:
-                print(traceback.format_exc())
-                print('truncate table trigger_name失败')
-        else:
-            try:
-                self.oracle_cursor.execute_sql(
-                    """create table trigger_name (table_name varchar2(200),trigger_type varchar2(100),trigger_body clob)""")
-            except Exception:
-                print(traceback.format_exc())
-                print('CREATE trigger_name IN ORACLE FAILED')
         print('#' * 50 + 'BEGIN CREATE AUTO COL' + '#' * 50)
-        if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分自增列
-            with open(log_path + "table.txt", "r") as f:  # 读取自定义表
-                for table_name in f.readlines():  # 按顺序读取每一个表
-                    table_name = table_name.strip('\n').upper()  # 去掉列表中每一个元素的换行符
-                    # Oracle中无法对long类型数据截取，创建用于存储触发器字段信息的临时表TRIGGER_NAME
-                    try:  # 按照每张表，将单张表结果集插入到trigger_name
-                        self.oracle_cursor.execute_sql(
-                            """insert into trigger_name select table_name ,trigger_type,to_lob(trigger_body) from user_triggers where table_name= '%s'  """ % table_name)
-                    except Exception:
-                        print(traceback.format_exc())
-                        print('insert into trigger_name ERROR')
-                    try:
-                        self.oracle_cursor.execute_sql("""update trigger_name set trigger_body=upper(trigger_body) """)
-                        self.oracle_cursor.execute_sql(
-                            """update trigger_name set trigger_body=replace(trigger_body,'INTO:','INTO :')""")
-                        self.oracle_cursor.execute_sql(
-                            """update trigger_name set trigger_body=replace(trigger_body,'SYS.DUAL ','DUAL')""")
-                        self.oracle_cursor.execute_sql(
-                            """update trigger_name set trigger_body=replace(trigger_body,'SYS.DUAL','DUAL')""")
-                        self.oracle_cursor.execute_sql(
-                            """update trigger_name set trigger_body=replace(trigger_body,chr(10),'')""")
-                    except Exception:
-                        print(traceback.format_exc())
-                        print('update trigger_name ERROR')
-
-        else:  # 创建所有自增列索引
-            try:
-                self.oracle_cursor.execute_sql("""truncate table trigger_name""")
-                self.oracle_cursor.execute_sql(
-                    """insert into trigger_name select table_name ,trigger_type,to_lob(trigger_body) from user_triggers""")
-            except Exception:
-                print(traceback.format_exc())
-                print('insert into trigger_name ERROR')
-            try:
-                self.oracle_cursor.execute_sql("""update trigger_name set trigger_body=upper(trigger_body) """)
-                self.oracle_cursor.execute_sql(
-                    """update trigger_name set trigger_body=replace(trigger_body,'INTO:','INTO :')""")
-                self.oracle_cursor.execute_sql(
-                    """update trigger_name set trigger_body=replace(trigger_body,'SYS.DUAL ','DUAL')""")
-                self.oracle_cursor.execute_sql(
-                    """update trigger_name set trigger_body=replace(trigger_body,'SYS.DUAL','DUAL')""")
-                self.oracle_cursor.execute_sql(
-                    """update trigger_name set trigger_body=replace(trigger_body,chr(10),'')""")
-            except Exception:
-                print(traceback.format_exc())
-                print('update trigger_name ERROR')
+        if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分自增列以及触发器
+            table_filter = table_in_filter('table_name', self.custom_table_list(log_path))
+        else:  # 创建所有自增列以及触发器
+            table_filter = ''
         try:
-            all_create_index = self.oracle_cursor.fetch_all(
-                """select distinct sql_create from (select to_char('create index ids_'||substr(table_name,1,26)||' on '||table_name||'('||upper(substr(substr(SUBSTR(trigger_body, INSTR(upper(trigger_body), ':NEW.') + 1,length(trigger_body) - instr(trigger_body, ':NEW.')), 1, instr(upper(SUBSTR(trigger_body, INSTR(upper(trigger_body), ':NEW.') + 1,length(trigger_body) - instr(trigger_body, ':NEW.'))), ' FROM DUAL;') - 1), 5)) ||');') as sql_create from trigger_name where trigger_type='BEFORE EACH ROW' and instr(upper(trigger_body), 'NEXTVAL')>0 AND TRIGGER_BODY LIKE '%INTO :%' )""")  # 在Oracle拼接sql生成用于在MySQL中自增列的索引
+            all_trigger = self.oracle_cursor.fetch_all(
+                """select table_name,trigger_name,trigger_type,trigger_body from user_triggers where 1 = 1 %s""" %
+                table_filter)
         except Exception as e:
-            all_create_index = []
+            all_trigger = []
             print(e)
-        auto_inc_count = len(all_create_index)
-        if auto_inc_count > 0:
+        all_create_index, all_alter_sql, oracle_autocol_total = auto_increment_sql(
+            [(v_trigger[0], v_trigger[2], v_trigger[3]) for v_trigger in all_trigger])
+        normal_trigger = [(v_trigger[1],) for v_trigger in all_trigger if v_trigger[2] != 'BEFORE EACH ROW']
+        if len(all_create_index) > 0:
             print('CREATE INDEX FOR AUTO COL:\n ')
             print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
+            # 自增列的索引以及修改自增属性按表提交，同一张表先创建索引再修改自增属性，不同表并行执行
+            index_futures = [(executor.submit(v_increa_index[0], self.exec_ddl, v_increa_index[1], v_increa_index[0]), v_increa_index[1])
+                             for v_increa_index in all_create_index]
+            alter_futures = [(executor.submit(v_increa_col[0], self.exec_ddl, v_increa_col[1], v_increa_col[0]), v_increa_col[1])
+                             for v_increa_col in all_alter_sql]
+        else:
+            print('NO AUTO COL')
+        return start_time, user_name, oracle_autocol_total, index_futures, alter_futures, normal_trigger
+
+    def collect_trg(self, trg_task, log_path, is_custom_table):
+        # 等待submit_trg提交的自增列创建完成，然后创建常规触发器，返回自增列以及触发器的统计数
+        start_time, user_name, oracle_autocol_total, index_futures, alter_futures, normal_trigger = trg_task
+        all_inc_col_success_count = 0
+        all_inc_col_failed_count = 0
+        normal_trigger_count = 0  # 用于统计oracle触发器（排除掉序列相关触发器）的总数
+        trigger_success_count = 0  # mysql中触发器创建成功的总数
+        trigger_failed_count = 0  # mysql中触发器创建失败的总数
+        create_trigger = ''  # 触发器创建的sql
+        count_1 = 0  # 自增列索引创建失败的计数
+        if index_futures or alter_futures:
             index_num = 0
-            for v_increa_index in all_create_index:
+            for future, create_autoincrea_index in index_futures:
+                err = future.result()
                 index_num += 1
-                create_autoincrea_index = v_increa_index[0]  # v_increa_index[0].read()  # 大字段用read读取大字段，否则无法执行
-                print(
-                    '-- ' + str(index_num) + ' ' + str(datetime.datetime.now()) + '\n' + create_autoincrea_index + '\n')
-                filename = log_path + 'create_index.sql'
-                f = open(filename, 'a', encoding='utf-8')
-                f.write(
-                    '-- ' + str(index_num) + ' ' + str(datetime.datetime.now()) + '\n' + create_autoincrea_index + '\n')
-                f.close()
-                try:
-                    self.mysql_cursor.execute(
-                        """insert into my_mig_task_info(table_name,task_start_time,run_status) values('%s',current_timestamp(3),'%s')""" % (
-                            create_autoincrea_index, 'running'))
-                except Exception as e:
-                    print(e)
-                try:
-                    self.mysql_cursor.execute(create_autoincrea_index)
-                    self.mysql_cursor.execute(
-                        """update my_mig_task_info set run_status='end' where table_name='%s' """ % create_autoincrea_index)
-                    self.mysql_cursor.execute('commit')
-                except Exception as e:
+                self.log_index_sql(log_path, index_num, create_autoincrea_index)
+                if err is not None:
                     count_1 += 1
                     all_inc_col_failed_count += 1
-                    print('\n' + '/* ' + str(e) + ' */' + '\n')
+                    print('\n' + '/* ' + str(err) + ' */' + '\n')
                     print('create_autoincrea_index ERROR\n')
-                    # print(traceback.format_exc())
                     filename = log_path + 'ddl_failed_table.log'
                     f = open(filename, 'a', encoding='utf-8')
                     f.write('-- ' + str(count_1) + ' AUTO_INCREAMENT COL INDEX CREATE ERROR' + ' -- ' + '\n')
                     f.write(create_autoincrea_index + '\n\n\n')
                     f.close()
-                    self.mysql_cursor.execute(
-                        """update my_mig_task_info set run_status='failed' where table_name='%s' """ % create_autoincrea_index)
-                    self.mysql_cursor.execute('commit')
-                    ddl_incindex_error = '\n' + '/* ' + str(e.args) + ' */' + '\n'
+                    ddl_incindex_error = '\n' + '/* ' + str(err.args) + ' */' + '\n'
                     logging.error(ddl_incindex_error)  # 自增用索引创建失败的sql语句输出到文件ddl_failed_table.log
             print('AUTO COL INDEX FINISH ' + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
 
             print('\nSTART MODIFY AUTO COL ATTRIBUTE:')
             print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
-            try:
-                all_alter_sql = self.oracle_cursor.fetch_all(
-                    """SELECT to_char('alter table ' || table_name || ' modify ' || upper( substr( substr( SUBSTR( trigger_body, INSTR( upper( trigger_body ), ':NEW.' ) + 1, length( trigger_body ) - instr( trigger_body, ':NEW.' )),1, instr( upper( SUBSTR( trigger_body, INSTR( upper( trigger_body ), ':NEW.' ) + 1, length( trigger_body ) - instr( trigger_body, ':NEW.' ))), ' FROM DUAL;' ) - 1  ),  5  )) || ' bigint auto_increment;' ) FROM trigger_name  WHERE trigger_type = 'BEFORE EACH ROW' AND TRIGGER_BODY LIKE '%INTO :%'  AND instr( upper( trigger_body ), 'NEXTVAL' )> 0""")
-            except Exception as e:
-                print(e)
-                all_alter_sql = []
             auto_num = 0
-            for v_increa_col in all_alter_sql:
+            for future, alter_increa_col in alter_futures:
+                err = future.result()
                 auto_num += 1
-                alter_increa_col = v_increa_col[0]  # v_increa_col[0].read()  # 大字段用read读取大字段，否则无法执行
-                print('-- ' + str(auto_num) + ' ' + str(datetime.datetime.now()) + '\n' + alter_increa_col + '\n')
-                filename = log_path + 'create_index.sql'
-                f = open(filename, 'a', encoding='utf-8')
-                f.write('-- ' + str(auto_num) + ' ' + str(datetime.datetime.now()) + '\n' + alter_increa_col + '\n')
-                f.close()
-                try:
-                    self.mysql_cursor.execute(
-                        """insert into my_mig_task_info(table_name,task_start_time,run_status) values('%s',current_timestamp(3),'%s')""" % (
-                            alter_increa_col, 'running'))
-                except Exception as e:
-                    print(e)
-                try:  # 注意下try要在for里面
-                    self.mysql_cursor.execute(alter_increa_col)
-                    self.mysql_cursor.execute(
-                        """update my_mig_task_info set run_status='end' where table_name='%s' """ % alter_increa_col)
-                    self.mysql_cursor.execute('commit')
+                self.log_index_sql(log_path, auto_num, alter_increa_col)
+                if err is None:
                     all_inc_col_success_count += 1
-                except Exception as e:  # 如果有异常打印异常信息，并跳过继续下个自增列修改
+                else:  # 如果有异常打印异常信息，并跳过继续下个自增列修改
                     all_inc_col_failed_count += 1
-                    print('\n' + '/* ' + str(e) + ' */' + '\n')
+                    print('\n' + '/* ' + str(err) + ' */' + '\n')
                     print('ALTER AUTO COL FAIL\n')
-                    # print(traceback.format_exc())
                     filename = log_path + 'ddl_failed_table.log'
                     f = open(filename, 'a', encoding='utf-8')
                     f.write('\n-- ' + ' MODIFY AUTO_COL ERROR ' + str(all_inc_col_failed_count) + ' -- \n')
                     f.write(alter_increa_col + ';\n')
-                    f.write('\n' + '/* ' + str(e) + ' */' + '\n')
+                    f.write('\n' + '/* ' + str(err) + ' */' + '\n')
                     f.close()
-                    self.mysql_cursor.execute(
-                        """update my_mig_task_info set run_status='failed' where table_name='%s' """ % alter_increa_col)
-                    self.mysql_cursor.execute('commit')
+            self.save_ddl_timing(log_path)
             print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
             end_time = datetime.datetime.now()
             print('ALTER AUTO COL ELAPSED TIME: ' + str((end_time - start_time).seconds))
             print('#' * 50 + 'FINISH AUTO COL' + '#' * 50 + '\n\n\n')
-            try:
-                oracle_autocol_total = self.oracle_cursor.fetch_one(
-                    """select count(*) from trigger_name  where trigger_type='BEFORE EACH ROW' and instr(upper(trigger_body), 'NEXTVAL')>0""")[
-                    0]  # 将自增列的总数存入list
-            except Exception as e:
-                print(e)
-                oracle_autocol_total = 0
-        else:
-            print('NO AUTO COL')
         print('#' * 50 + 'END AUTO COL' + '#' * 50 + '\n')
-        try:
-            self.oracle_cursor.execute_sql("""drop table trigger_name purge""")  # 删除之前在oracle创建的临时表
-        except Exception as e:
-            print(e)
 
         # 以下是创建常规触发器
-        if is_custom_table == 1:  # 如果命令行参数有-c选项，仅创建部分自增列
-            with open(log_path + "table.txt", "r") as f:  # 读取自定义表
-                for table_name in f.readlines():  # 按顺序读取每一个表
-                    table_name = table_name.strip('\n').upper()  # 去掉列表中每一个元素的换行符
-                    try:
-                        trigger_name = self.oracle_cursor.fetch_all(
-                            """select trigger_name from user_triggers where trigger_type !='BEFORE EACH ROW' and table_name='%s'""" % table_name)
-                        for v_trt_name in trigger_name:
-                            normal_trigger.append(v_trt_name)
-                    except Exception as e:
-                        print(e)
-        else:
-            try:
-                normal_trigger = self.oracle_cursor.fetch_all(
-                    """select trigger_name from user_triggers where trigger_type !='BEFORE EACH ROW'""")
-            except Exception as e:
-                print(e)
+        # submit_trg查询user_triggers时已经得到常规触发器的名称
         normal_trigger_count = len(normal_trigger)
         if normal_trigger_count > 0:
             print('START CREATE NORMAL TRIGGER:\n')
@@ -1379,79 +1080,108 @@ class DbMetadata(object):
 
     def cte_comt(self, log_path, is_custom_table):
         # 数据库对象的comment注释,这里仅包含表的注释，列的注释在上面创建表结构的时候已经包括
-        err_count = 0
-        all_comment_sql = []
-        output_table_name = []
+        executor = ddl_executor.DdlExecutor(self.ddl_sessions)
+        comt_task = self.submit_comt(executor, log_path, is_custom_table)
+        executor.shutdown()
+        self.collect_comt(comt_task, log_path)
+
+    def submit_comt(self, executor, log_path, is_custom_table):
+        # 查询表的注释并按表提交到executor，结果由collect_comt汇总
         begin_time = datetime.datetime.now()
         print('#' * 50 + 'START CREATE comment' + '#' * 50)
         print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
-        if is_custom_table == 1:  # 命令行选项-c指定后，仅创建部分注释
-            with open(log_path + "table.txt", "r") as f:  # 读取自定义表
-                for line in f:
-                    output_table_name.append(list(line.strip('\n').upper().split(',')))  # 读取txt中的自定义表到list
-            for v_custom_table in output_table_name:  # 根据第N个表查询生成拼接sql
-                try:
-                    custom_comment = self.oracle_cursor.fetch_all(
-                        """select 'alter table '||TABLE_NAME||' comment '||''''||COMMENTS||'''' as create_comment from USER_TAB_COMMENTS where COMMENTS is not null and table_name = '%s'  """ %
-                        v_custom_table[0])
-                except Exception as e:
-                    print(e)
-                    custom_comment = []
-                for v_out in custom_comment:  # 每次将上面单表全部结果集全部存到all_comment_sql的list里面
-                    all_comment_sql.append(v_out)
+        if is_custom_table == 1:  # 命令行选项-c指定后，仅创建部分注释，所有自定义表的注释一次查询
+            table_filter = table_in_filter('TABLE_NAME', self.custom_table_list(log_path))
         else:  # 创建全部注释
-            try:
-                all_comment_sql = self.oracle_cursor.fetch_all(
-                    """select 'alter table '||TABLE_NAME||' comment '||''''||COMMENTS||'''' as create_comment  from USER_TAB_COMMENTS where COMMENTS is not null """)
-            except Exception as e:
-                print(e)
-                all_comment_sql = []
-        if len(all_comment_sql) > 0:
-            for e in all_comment_sql:  # 一次性创建注释
-                # table_name = e[0]
-                create_comment_sql = e[0]
-                try:
-                    print('MODIFING COMMENT:')
-                    print(create_comment_sql)
-                    # cur_target_constraint.execute(create_comment_sql)
-                    self.mysql_cursor.execute(create_comment_sql)
-                    print('comment FINISH\n')
-                except Exception as e:
-                    err_count += 1
-                    print('\n' + '/* ' + str(e.args) + ' */' + '\n')
-                    print('comment FAILED!\n')
-                    # print(traceback.format_exc())
-                    filename = log_path + 'ddl_failed_table.log'
-                    f = open(filename, 'a', encoding='utf-8')
-                    f.write('\n-- ' + ' CREATE COMMENT ERROR ' + str(err_count) + '\n')
-                    f.write(create_comment_sql + ';\n')
-                    f.write('\n' + '/* ' + str(e.args) + ' */' + '\n')
-                    f.close()
-        else:
+            table_filter = ''
+        try:
+            all_comment_sql = self.oracle_cursor.fetch_all(
+                """select 'alter table '||TABLE_NAME||' comment '||''''||COMMENTS||'''' as create_comment,TABLE_NAME  from USER_TAB_COMMENTS where COMMENTS is not null %s""" %
+                table_filter)
+        except Exception as e:
+            print(e)
+            all_comment_sql = []
+        if len(all_comment_sql) == 0:
             print('NO COMMENT')
+        # 注释也是修改表定义，和该表的索引按顺序执行
+        futures = [(executor.submit(e[1], self.cte_table_comt, e[0]), e[0]) for e in all_comment_sql]
+        return begin_time, futures
+
+    def cte_table_comt(self, create_comment_sql, cursor=None):
+        # 执行一条表注释语句，成功返回None，失败返回异常
+        if cursor is None:
+            cursor = self.mysql_cursor
+        try:
+            cursor.execute(create_comment_sql)
+        except Exception as e:
+            return e
+        return None
+
+    def collect_comt(self, comt_task, log_path):
+        # 等待submit_comt提交的注释执行完成，记录失败的注释
+        begin_time, futures = comt_task
+        err_count = 0
+        for future, create_comment_sql in futures:
+            err = future.result()
+            print('MODIFING COMMENT:')
+            print(create_comment_sql)
+            if err is None:
+                print('comment FINISH\n')
+            else:
+                err_count += 1
+                print('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                print('comment FAILED!\n')
+                filename = log_path + 'ddl_failed_table.log'
+                f = open(filename, 'a', encoding='utf-8')
+                f.write('\n-- ' + ' CREATE COMMENT ERROR ' + str(err_count) + '\n')
+                f.write(create_comment_sql + ';\n')
+                f.write('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                f.close()
         print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
         end_time = datetime.datetime.now()
         print('CREATE  COMMENT ELAPSED TIME:' + str((end_time - begin_time).seconds))
         print('#' * 50 + 'comment FINISH' + '#' * 50 + '\n\n\n')
 
     def cp_vw(self):
-        # 重新编译Oracle视图
+        """
+        重新编译Oracle中状态为INVALID的视图，VALID的视图跳过
+        按照视图依赖分层，被依赖的视图先编译，同一层的视图用多个Oracle连接池会话并行编译
+        """
+        begin_time = datetime.datetime.now()
         try:
-            all_view_compile = self.oracle_cursor.fetch_all(
-                """select 'alter view '||view_name||' compile' from user_views""")
+            all_view = self.oracle_cursor.fetch_all(
+                """select object_name,status from user_objects where object_type='VIEW'""")
+            invalid_view = [v_view[0] for v_view in all_view if v_view[1] == 'INVALID']
+            view_dependencies = self.oracle_cursor.fetch_all(
+                """select name,referenced_name from user_dependencies where type='VIEW' and referenced_type='VIEW' and referenced_owner=user""") if invalid_view else []
         except Exception as e:
             print(e)
-            all_view_compile = []
-        for exe_compile in all_view_compile:
-            exe_compile_sql = exe_compile[0]
-            print(exe_compile_sql)
-            try:
-                self.oracle_cursor.execute_sql(exe_compile_sql)
-            except Exception as e:
-                print(e)
+            all_view = []
+            invalid_view = []
+            view_dependencies = []
+        compile_failed_count = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.compile_sessions) as executor:
+            for level in view_levels(invalid_view, view_dependencies):
+                futures = [(executor.submit(self.oracle_cursor.execute_sql, 'alter view ' + view_name + ' compile'),
+                            view_name) for view_name in level]
+                for future, view_name in futures:  # 这一层编译完成之后再编译依赖它们的视图
+                    print('alter view ' + view_name + ' compile')
+                    try:
+                        future.result()
+                    except Exception as e:
+                        compile_failed_count += 1
+                        print(e)
+        end_time = datetime.datetime.now()
+        print('RECOMPILE INVALID VIEW: ' + str(len(invalid_view)) + ', FAILED: ' + str(compile_failed_count) +
+              ', SKIPPED VALID VIEW: ' + str(len(all_view) - len(invalid_view)) + ', ELAPSED TIME: ' +
+              str((end_time - begin_time).total_seconds()) + '\n')
 
     def c_vw(self, log_path, is_custom_table):
-        # 获取视图定义以及创建
+        """
+        获取视图定义以及创建
+        根据USER_DEPENDENCIES把视图分层，被依赖的视图先创建，同一层的视图用多个MySQL会话并行创建
+        转换之后的视图语句缓存到view_sql_cache.json，视图定义没有变化时再次迁移不需要重新转换
+        """
         all_view_count = 0
         view_failed_result = []
         all_view_success_count = 0
@@ -1462,105 +1192,163 @@ class DbMetadata(object):
         else:  # 创建全部视图
             print('#' * 50 + 'START CREATE VIEW' + '#' * 50)
             print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
-            # Oracle中无法对long类型数据截取，创建用于存储视图信息的临时表content_view
-            try:
-                count_num_view = \
-                    self.oracle_cursor.fetch_one(
-                        """select count(*) from user_tables where table_name='CONTENT_VIEW'""")[0]
-            except Exception as e:
-                print(e)
-                count_num_view = 0
-            if count_num_view == 1:
-                try:
-                    self.oracle_cursor.execute_sql("""drop table CONTENT_VIEW purge""")
-                    self.oracle_cursor.execute_sql("""create table content_view (view_name varchar2(200),text clob)""")
-                    self.oracle_cursor.execute_sql(
-                        """insert into content_view(view_name,text) select view_name,to_lob(text) from USER_VIEWS where  view_name in (select object_name from user_objects where object_type='VIEW' and status='VALID')""")
-                except Exception as e:
-                    print(e)
-            else:
-                try:
-                    self.oracle_cursor.execute_sql("""create table content_view (view_name varchar2(200),text clob)""")
-                    self.oracle_cursor.execute_sql(
-                        """insert into content_view(view_name,text) select view_name,to_lob(text) from USER_VIEWS where  view_name in (select object_name from user_objects where object_type='VIEW' and status='VALID')""")
-                except Exception as e:
-                    print(e)
-            try:
+            try:  # USER_VIEWS的TEXT是long类型，直接读取为字符串，不需要在Oracle创建临时表转换为clob
                 all_view_create = self.oracle_cursor.fetch_all(
-                    """select  view_name,'create view '||view_name||' as '||replace(text, '"'  , '') as view_sql from CONTENT_VIEW """)
+                    """select view_name,text from USER_VIEWS where view_name in (select object_name from user_objects where object_type='VIEW' and status='VALID')""")
+                view_dependencies = self.oracle_cursor.fetch_all(
+                    """select name,referenced_name from user_dependencies where type='VIEW' and referenced_type='VIEW' and referenced_owner=user""")
             except Exception as e:
                 print(e)
                 all_view_create = []
+                view_dependencies = []
             all_view_count = len(all_view_create)
             if all_view_count > 0:
+                view_text = dict((e[0], e[1] or '') for e in all_view_create)
+                view_sql = self.convert_views(view_text, log_path)
+                executor = ddl_executor.DdlExecutor(self.ddl_sessions)
                 view_count = 0
-                for e in all_view_create:
-                    view_name = e[0]
-                    create_view_sql = e[1].read()  # 用read读取大字段，否则无法执行
-                    create_view_sql = sql_format.sql_format(create_view_sql, wrap_add=None, mode='upper')  # sql格式化
-                    create_view_sql = create_view_sql.replace('--', '-- -- ')  # 注释适配为MySQL
-                    create_view_sql = create_view_sql.replace('nvl(', 'ifnull(')  # 函数替换
-                    create_view_sql = create_view_sql.replace('unistr(\'\\0030\')', '0')  # 函数替换
-                    create_view_sql = create_view_sql.replace('unistr(\'\\0031\')', '1')  # 函数替换
-                    create_view_sql = create_view_sql.replace('unistr(\'\\0033\')', '3')  # 函数替换
-                    print(create_view_sql)
-                    view_count += 1
-                    filename = log_path + 'create_view.sql'
-                    f = open(filename, 'a', encoding='utf-8')
-                    f.write('\n-- ' + str(view_count) + ' ' + view_name + ' -- \n')
-                    f.write(create_view_sql + ';\n')
-                    f.write('\n')
-                    f.close()
-                    try:
-                        # cur_target_constraint.execute("""drop view  if exists %s""" % view_name)
-                        # cur_target_constraint.execute(create_view_sql)
-                        self.mysql_cursor.execute("""drop view  if exists %s""" % view_name)
-                        self.mysql_cursor.execute(create_view_sql)
-                        print('FINISH CREATE VIEW\n')
-                        all_view_success_count += 1
-                    except Exception as e:
-                        all_view_failed_count += 1
-                        view_failed_result.append(view_name)
-                        print('\n' + '/* ' + str(e.args) + ' */' + '\n')
-                        print('CREATE VIEW ERROR!\n')
-                        # print(traceback.format_exc())
-                        filename = log_path + 'ddl_failed_table.log'
+                for level_num, level in enumerate(view_levels(view_text, view_dependencies)):
+                    print('CREATE VIEW LEVEL ' + str(level_num + 1) + ', ' + str(len(level)) + ' VIEWS\n')
+                    futures = [(executor.submit(view_name, self.cte_view, view_name, view_sql[view_name]), view_name)
+                               for view_name in level]
+                    for future, view_name in futures:  # 等待这一层视图全部创建完成，再创建依赖它们的视图
+                        create_view_sql = view_sql[view_name]
+                        err = future.result()
+                        print(create_view_sql)
+                        view_count += 1
+                        filename = log_path + 'create_view.sql'
                         f = open(filename, 'a', encoding='utf-8')
-                        f.write(
-                            '\n-- ' + ' CREATE VIEW ' + view_name + ' ERROR ' + str(all_view_failed_count) + ' -- \n')
+                        f.write('\n-- ' + str(view_count) + ' ' + view_name + ' -- \n')
                         f.write(create_view_sql + ';\n')
-                        f.write('\n' + '/* ' + str(e.args) + ' */' + '\n')
+                        f.write('\n')
                         f.close()
+                        if err is None:
+                            print('FINISH CREATE VIEW\n')
+                            all_view_success_count += 1
+                        else:
+                            all_view_failed_count += 1
+                            view_failed_result.append(view_name)
+                            print('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                            print('CREATE VIEW ERROR!\n')
+                            filename = log_path + 'ddl_failed_table.log'
+                            f = open(filename, 'a', encoding='utf-8')
+                            f.write(
+                                '\n-- ' + ' CREATE VIEW ' + view_name + ' ERROR ' + str(all_view_failed_count) + ' -- \n')
+                            f.write(create_view_sql + ';\n')
+                            f.write('\n' + '/* ' + str(err.args) + ' */' + '\n')
+                            f.close()
+                executor.shutdown()
             else:
                 print('NO VIEW CREATE')
             print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
             end_time = datetime.datetime.now()
             print('CREATE VIEW ELAPSED TIME: ' + str((end_time - begin_time).seconds))
             print('*' * 50 + 'FINISH CREATE VIEW' + '*' * 50 + '\n\n\n')
-            self.oracle_cursor.execute_sql("""drop table content_view purge""")
-            return all_view_count, all_view_success_count, all_view_failed_count, view_failed_result
+        return all_view_count, all_view_success_count, all_view_failed_count, view_failed_result
+
+    @staticmethod
+    def convert_views(view_text, log_path):
+        """
+        转换视图定义为MySQL语句，返回{视图名: 创建语句}
+        缓存文件在日志目录的上一级目录，按照视图名以及Oracle定义的md5查找，定义没有变化直接使用缓存
+        """
+        cache_file = os.path.join(os.path.dirname(os.path.normpath(log_path)), 'view_sql_cache.json')
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                view_cache = json.load(f)
+        except Exception:
+            view_cache = {}
+        view_sql = {}
+        cache_hit = 0
+        for view_name, text in view_text.items():
+            cache_key = view_name + ':' + hashlib.md5(text.encode('utf-8')).hexdigest()
+            if cache_key in view_cache:
+                view_sql[view_name] = view_cache[cache_key]
+                cache_hit += 1
+            else:
+                view_sql[view_name] = view_cache[cache_key] = convert_view_sql(view_name, text)
+        print('VIEW SQL CACHE HIT ' + str(cache_hit) + '/' + str(len(view_text)) + '\n')
+        if cache_hit < len(view_text):
+            try:
+                with open(cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(view_cache, f, ensure_ascii=False)
+            except Exception as e:
+                print(e, 'save view sql cache failed')
+        return view_sql
+
+    def cte_view(self, view_name, create_view_sql, cursor=None):
+        # 在MySQL重建一个视图，成功返回None，失败返回异常
+        if cursor is None:
+            cursor = self.mysql_cursor
+        try:
+            cursor.execute("""drop view  if exists %s""" % view_name)
+            cursor.execute(create_view_sql)
+        except Exception as e:
+            return e
+        return None
 
     def func_proc(self, log_path):
-        # 输出函数以及存储过程定义
+        """
+        输出函数、存储过程以及包的定义
+        每个对象单独调用DBMS_METADATA.GET_DDL，多个Oracle连接池会话并行获取，获取到一个就追加写入一个
+        定义缓存到日志目录上一级的plsql_ddl_cache/用户@主机_端口_服务名目录，LAST_DDL_TIME没有变化的对象直接读取缓存
+        """
         index = 0
+        cache_hit = 0
+        begin_time = datetime.datetime.now()
         filename = log_path + 'ddl_function_procedure.sql'
         f = open(filename, 'a', encoding='utf-8')
         f.write('/*EXPORT FROM ORACLE DATABASE FUNCTION AND PROCEDURE ' + '*/\n')
         f.close()
         try:
-            ddl_out = self.oracle_cursor.fetch_all(
-                """SELECT DBMS_METADATA.GET_DDL(U.OBJECT_TYPE, u.object_name) ddl_sql,u.object_name,u.object_type,u.status,(select user from dual) FROM USER_OBJECTS u where U.OBJECT_TYPE IN ('FUNCTION','PROCEDURE','PACKAGE') order by OBJECT_TYPE""")
-            for v_out_ddl in ddl_out:
-                index += 1
-                ddl_sql = str(v_out_ddl[0])
-                object_name = v_out_ddl[1]
-                object_type = v_out_ddl[2]
-                status = v_out_ddl[3]
-                current_user = v_out_ddl[4]
-                f = open(filename, 'a', encoding='utf-8')
-                f.write('\n/*' + '[' + str(
-                    index) + '] ' + object_type + ' ' + object_name.upper() + ' [' + status + ']' + '*/\n')
-                f.write((ddl_sql.replace('"' + current_user + '".', '')).replace('"', ''))  # 去掉模式名以及双引号包围
-                f.close()
+            current_user = self.oracle_cursor.fetch_one("""select user from dual""")[0]
+            # 不同库、不同用户的同名对象使用不同的缓存目录
+            cache_dir = os.path.join(os.path.dirname(os.path.normpath(log_path)), 'plsql_ddl_cache', re.sub(
+                r'[^\w.@-]', '_', '%s@%s_%s_%s' % (current_user, configDB.oracle_host, configDB.oracle_port,
+                                                   configDB.oracle_service_name)))
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            all_object = self.oracle_cursor.fetch_all(
+                """SELECT u.object_name,u.object_type,u.status,to_char(u.last_ddl_time,'yyyymmddhh24miss') FROM USER_OBJECTS u where U.OBJECT_TYPE IN ('FUNCTION','PROCEDURE','PACKAGE') order by OBJECT_TYPE""")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.compile_sessions) as executor:
+                futures = dict((executor.submit(self.get_plsql_ddl, v_object[0], v_object[1], v_object[3], cache_dir),
+                                v_object) for v_object in all_object)
+                for future in concurrent.futures.as_completed(futures):
+                    object_name, object_type, status = futures[future][:3]
+                    try:
+                        ddl_sql, from_cache = future.result()
+                    except Exception as e:
+                        print('get ' + object_type + ' ' + object_name + ' ddl failed ' + str(e))
+                        continue
+                    index += 1
+                    cache_hit += from_cache
+                    f = open(filename, 'a', encoding='utf-8')
+                    f.write('\n/*' + '[' + str(
+                        index) + '] ' + object_type + ' ' + object_name.upper() + ' [' + status + ']' + '*/\n')
+                    f.write((ddl_sql.replace('"' + current_user + '".', '')).replace('"', ''))  # 去掉模式名以及双引号包围
+                    f.close()
         except Exception as e:
             print('get function and procedure content failed' + str(e))
+        end_time = datetime.datetime.now()
+        print('EXPORT FUNCTION AND PROCEDURE: ' + str(index) + ', FROM CACHE: ' + str(cache_hit) + ', ELAPSED TIME: ' +
+              str((end_time - begin_time).total_seconds()) + '\n')
+
+    def get_plsql_ddl(self, object_name, object_type, last_ddl_time, cache_dir):
+        """
+        获取一个函数、存储过程或者包的定义，返回(定义, 是否来自缓存)
+        缓存文件名包含LAST_DDL_TIME，对象修改之后文件名不同，重新获取并删除旧的缓存
+        """
+        cache_prefix = object_type + '.' + object_name + '.'
+        cache_file = os.path.join(cache_dir, cache_prefix + str(last_ddl_time) + '.sql')
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return f.read(), True
+        # fetch_one在连接放回连接池之前读取CLOB，多个线程并行获取时不会读取已经归还的连接
+        ddl_sql = self.oracle_cursor.fetch_one("""SELECT DBMS_METADATA.GET_DDL('%s','%s') FROM dual""" % (
+            object_type, object_name))[0]
+        for old_cache_file in os.listdir(cache_dir):
+            if old_cache_file.startswith(cache_prefix):
+                os.remove(os.path.join(cache_dir, old_cache_file))
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            f.write(ddl_sql)
+        return ddl_sql, False
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import collections
+import concurrent.futures
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import configDB
+
+
+class DdlExecutor(object):
+    """
+    使用多个MySQL会话并行执行DDL
+    每个任务需要指定涉及的表，同一张表的任务按照提交顺序依次执行，不同表的任务同时执行，
+    这样不会出现同一张表同时有两个DDL在运行，例如外键会同时占用子表和父表
+    hold之后的表，其任务会一直等待，直到release该表，用于表数据迁移完成之后才开始创建索引等
+    """
+
+    def __init__(self, sessions=4):
+        self.sessions = max(int(sessions), 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.sessions)
+        self._local = threading.local()  # 每个线程独占一个MySQL会话
+        self._lock = threading.Lock()
+        self._busy_tables = set()  # 正在执行DDL的表
+        self._held_tables = set()  # 暂不执行DDL的表
+        self._queues = {}  # 每张表等待执行的任务队列，任务为(表, 函数, 参数, future, 阶段)
+        self._futures = []
+        self._connections = []
+        self.trace = None  # mig_trace.ChromeTrace，不为空时记录每个任务的执行时间段
+        self.phase = ''  # 之后提交的任务在trace中的名称，为空时使用函数名
+
+    def cursor(self):
+        """获取当前线程的MySQL会话，第一次调用时从连接池创建"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            conn = configDB.MySQLPOOL.connection()
+            cursor = conn.cursor()
+            if str(cursor._con._con.server_version)[:1] == '8':
+                cursor._con._setsession_sql = ['SET AUTOCOMMIT=0;', 'SET foreign_key_checks=0;',
+                                               'set session sql_require_primary_key=OFF']
+            self._local.cursor = cursor
+            with self._lock:
+                self._connections.append((conn, cursor))
+        return cursor
+
+    def submit(self, tables, fn, *args):
+        """
+        提交任务，tables为表名或者表名列表，fn(*args, cursor=会话游标)在后台会话中执行
+        返回concurrent.futures.Future，结果为fn的返回值
+        """
+        if isinstance(tables, str):
+            tables = (tables,)
+        tables = tuple(set(str(t).upper() for t in tables if t))
+        future = Future()
+        job = (tables, fn, args, future, self.phase)
+        with self._lock:
+            self._futures.append(future)
+            if not tables:
+                self._start(job)
+            for t in tables:
+                self._queues.setdefault(t, collections.deque()).append(job)
+            self._dispatch(tables)
+        return future
+
+    def hold(self, tables):
+        """暂停执行这些表的任务，已提交以及之后提交的任务都会等待release"""
+        with self._lock:
+            self._held_tables.update(str(t).upper() for t in tables)
+
+    def release(self, table_name):
+        """开始执行该表等待的任务"""
+        table_name = str(table_name).upper()
+        with self._lock:
+            self._held_tables.discard(table_name)
+            self._dispatch((table_name,))
+
+    def release_all(self):
+        with self._lock:
+            tables = tuple(self._held_tables)
+            self._held_tables.clear()
+            self._dispatch(tables)
+
+    def _dispatch(self, tables):
+        # 需要持有self._lock调用，检查这些表排在最前面的任务，任务涉及的表都空闲并且都排在最前面就开始执行
+        for t in tables:
+            queue = self._queues.get(t)
+            if not queue:
+                continue
+            job = queue[0]
+            if all(self._queues[jt][0] is job and jt not in self._busy_tables and jt not in self._held_tables
+                   for jt in job[0]):
+                for jt in job[0]:
+                    self._queues[jt].popleft()
+                self._start(job)
+
+    def _start(self, job):
+        self._busy_tables.update(job[0])
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        tables, fn, args, future, phase = job
+        begin = time.time()
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, cursor=self.cursor()))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            if self.trace is not None:
+                self.trace.complete(phase or fn.__name__, 'ddl', begin, time.time(),
+                                    args={'tables': list(tables), 'function': fn.__name__})
+            with self._lock:
+                self._busy_tables.difference_update(tables)
+                self._dispatch(tables)
+
+    def wait(self):
+        """等待已提交的任务全部执行完毕，包括执行过程中新提交的任务，调用前需要release所有表"""
+        while True:
+            with self._lock:
+                futures = [f for f in self._futures if not f.done()]
+            if not futures:
+                return
+            concurrent.futures.wait(futures)
+
+    def shutdown(self):
+        self.wait()
+        self._executor.shutdown(wait=True)
+        for conn, cursor in self._connections:
+            try:
+                cursor.close()
+                conn.close()
+            except Exception as e:
+                print(e)
+        self._connections = []
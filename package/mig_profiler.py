@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import cProfile
+import glob
+import io
+import os
+import pstats
+import threading
+
+# 按照函数把耗时归类到数据迁移的各个阶段，匹配pstats的(文件名, 行号, 函数名)，使用累计耗时
+# fetch: Oracle执行分页查询以及fetchmany，包括类型转换：outputtypehandler(dataconvert)在execute中调用，
+#        NUMBER转Decimal、LOB转LONG由cx_Oracle在fetchmany内部用C完成，cProfile无法单独统计，不再单列转换阶段
+# encode: pymysql把参数转义并拼接为多行insert语句
+# insert: MySQL执行insert以及commit的网络和服务端耗时
+PHASE_RULES = (
+    ('fetch', lambda file, func: file == '~' and ('fetchmany' in func or "'execute' of 'cx_Oracle" in func)),
+    ('encode', lambda file, func: func in ('_mogrify', '_escape_args') and
+                                  file.endswith(os.path.join('pymysql', 'cursors.py'))),
+    ('insert', lambda file, func: func in ('query', 'commit') and
+                                  file.endswith(os.path.join('pymysql', 'connections.py'))),
+)
+
+
+def start(profile_dir):
+    # profile_dir为空时不做性能分析，cProfile只记录调用线程，每个线程需要单独启动
+    if not profile_dir:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop(profiler, profile_dir, name):
+    # 每个进程的每个线程单独写入一个pstats文件，迁移完成之后由主进程合并
+    if profiler is None:
+        return
+    profiler.disable()
+    try:
+        profiler.dump_stats(os.path.join(profile_dir, '%s_%s_%s.pstats' % (os.getpid(), threading.get_ident(),
+                                                                           name)))
+    except Exception as e:
+        print(e, 'dump profile stats failed')
+
+
+def match_phase(file, func):
+    for phase, rule in PHASE_RULES:
+        if rule(file, func):
+            return phase
+    return None
+
+
+def has_matched_caller(stats, key):
+    # 沿着pstats的调用者向上遍历整个调用链，只匹配函数数量很少，每个函数单独遍历
+    visited, pending = {key}, list(stats.stats[key][4])
+    while pending:
+        caller = pending.pop()
+        if caller in visited:
+            continue
+        visited.add(caller)
+        if match_phase(caller[0], caller[2]):
+            return True
+        if caller in stats.stats:
+            pending.extend(stats.stats[caller][4])
+    return False
+
+
+def phase_time(stats):
+    """
+    每个阶段的累计耗时，只统计调用链上没有其他匹配函数的最外层函数
+    匹配函数的上层调用链中已经有任意阶段的函数时，耗时已经包含在上层函数的累计耗时中，不再重复计算
+    """
+    phases = dict.fromkeys([phase for phase, rule in PHASE_RULES], 0.0)
+    for key, (cc, nc, tt, ct, callers) in stats.stats.items():
+        phase = match_phase(key[0], key[2])
+        if phase and not has_matched_caller(stats, key):
+            phases[phase] += ct
+    return phases
+
+
+def merge(profile_dir, log_path, top_n=30):
+    """
+    合并profile_dir下所有进程以及线程的pstats文件
+    写入log_path下的mig_profile.pstats以及mig_profile.txt，txt包括各阶段耗时以及累计耗时前top_n的函数
+    """
+    files = sorted(glob.glob(os.path.join(profile_dir, '*.pstats')))
+    if not files:
+        print('no profile stats found in ' + profile_dir)
+        return
+    stats = pstats.Stats(files[0])
+    for file in files[1:]:
+        try:
+            stats.add(file)
+        except Exception as e:
+            print(e, 'load profile stats failed', file)
+    stats.dump_stats(log_path + 'mig_profile.pstats')
+    phases = phase_time(stats)
+    summary = io.StringIO()
+    summary.write('PROFILE FILES: %s\n' % len(files))
+    summary.write('TOTAL THREAD TIME: %.3f seconds\n\n' % stats.total_tt)
+    summary.write('%-10s %15s %8s\n' % ('PHASE', 'SECONDS', 'PERCENT'))
+    for phase, seconds in list(phases.items()) + [('other', max(stats.total_tt - sum(phases.values()), 0))]:
+        summary.write('%-10s %15.3f %7.1f%%\n' % (phase, seconds,
+                                                  seconds * 100.0 / stats.total_tt if stats.total_tt else 0))
+    summary.write('\n')
+    stats.stream = summary
+    stats.sort_stats('cumulative').print_stats(top_n)
+    stats.sort_stats('tottime').print_stats(top_n)
+    with open(log_path + 'mig_profile.txt', 'w', encoding='utf-8') as f:
+        f.write(summary.getvalue())
+    print('PROFILE SUMMARY')
+    for phase, seconds in phases.items():
+        print('%-10s %.3f seconds' % (phase, seconds))
+    print('PLEASE CHECK ' + log_path + 'mig_profile.txt AND ' + log_path + 'mig_profile.pstats\n')
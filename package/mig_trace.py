@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class ChromeTrace(object):
+    """
+    记录迁移各阶段以及每批数据的时间段，保存为Chrome trace格式的json，可以用Perfetto或者chrome://tracing打开
+    主进程的阶段用span记录，DDL会话执行的任务由DdlExecutor记录，
+    子进程每批数据的查询以及插入通过MetricsAggregator的事件记录(作为sink注册)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = []
+        self.thread_names = {}  # (pid, tid) -> 线程名
+
+    def complete(self, name, cat, begin, end, pid=None, tid=None, args=None):
+        # begin、end为time.time()的秒数，trace中的时间单位为微秒
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': int(begin * 1000000),
+                 'dur': max(int((end - begin) * 1000000), 1),
+                 'pid': pid if pid is not None else os.getpid(),
+                 'tid': tid if tid is not None else threading.get_ident()}
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+            if pid is None and tid is None:
+                self.thread_names.setdefault((event['pid'], event['tid']), threading.current_thread().name)
+
+    @contextlib.contextmanager
+    def span(self, name, cat='phase', **args):
+        begin = time.time()
+        try:
+            yield
+        finally:
+            self.complete(name, cat, begin, time.time(), args=args)
+
+    def on_event(self, event):
+        # MetricsAggregator的sink，把子进程的事件转为对应进程以及线程的时间段
+        pid, tid = event['pid'], event['tid']
+        if event['event'] == 'batch':
+            fetch_end = event['ts'] + event['fetch_ms'] / 1000.0
+            insert_end = fetch_end + event['insert_ms'] / 1000.0
+            args = {'table': event['table'], 'thread': event['thread'], 'chunk': event['chunk'],
+                    'rows': event['rows'], 'bytes': event['bytes'], 'failed': event['failed']}
+            self.complete(event['table'] + ' chunk ' + str(event['chunk']), 'chunk', event['ts'], insert_end, pid, tid,
+                          args)
+            self.complete('fetch', 'oracle', event['ts'], fetch_end, pid, tid)
+            self.complete('insert', 'mysql', fetch_end, insert_end, pid, tid)
+        elif event['event'] in ('table_start', 'table_end'):
+            with self.lock:
+                self.events.append({'name': event['table'], 'cat': 'table',
+                                    'ph': 'B' if event['event'] == 'table_start' else 'E',
+                                    'ts': int(event['ts'] * 1000000), 'pid': pid, 'tid': tid,
+                                    'args': {'source_rows': event['source_rows']}})
+                self.thread_names.setdefault((pid, tid), 'migrate process')
+
+    def close(self):
+        pass
+
+    def save(self, filename):
+        with self.lock:
+            events = list(self.events)
+            for (pid, tid), thread_name in self.thread_names.items():
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                               'args': {'name': thread_name}})
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': 'oracle_mig_mysql'}})
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+            print('TIMELINE TRACE ' + filename + ' (open in https://ui.perfetto.dev)\n')
+        except Exception as e:
+            print(e, 'write trace file failed')
@@ -17,14 +17,36 @@ config.read(exepath + "/oracle_to_mysql/config.ini", encoding='utf-8')
 
 
 class ReadConfig:
-    def get_mysql(self, name):
+    def get_mysql(self, name, default=None):
+        if default is not None and not config.has_option('mysql', name):  # 旧版本配置文件没有的参数使用默认值
+            return default
         value = config.get('mysql', name)  # 通过config.get拿到配置文件中DATABASE的name的对应值
         return value
 
-    def get_oracle(self, name):
+    def get_oracle(self, name, default=None):
+        if default is not None and not config.has_option('oracle', name):  # 旧版本配置文件没有的参数使用默认值
+            return default
         value = config.get('oracle', name)  # 通过config.get拿到配置文件中DATABASE的name的对应值
         return value
 
+    def get_metrics(self, name, default=None):
+        # 迁移监控指标的参数，未配置[metrics]时使用默认值
+        if not config.has_option('metrics', name):
+            return default
+        return config.get('metrics', name)
+
+    def get_compare(self, name, default=None):
+        # 数据比对工具的参数，未配置[compare]时使用默认值
+        if not config.has_option('compare', name):
+            return default
+        return config.get('compare', name)
+
+    def get_type_mapping(self):
+        # 自定义字段类型映射规则，未配置[type_mapping]时返回空列表
+        if not config.has_section('type_mapping'):
+            return []
+        return config.items('type_mapping')
+
 
 if __name__ == '__main__':
     print('path值为：', exepath)  # 测试path内容
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+import time
+
+import pymysql
+
+import configDB
+
+# 迁移任务表，id为代理主键，按照type以及table_name汇总，不再按照DDL语句查找和更新
+CREATE_TASK_TABLE_SQL = """create table my_mig_task_info(id bigint not null auto_increment primary key,
+        table_name varchar(200) default '',task_start_time datetime(3) default current_timestamp(3),
+        task_end_time datetime(3) default current_timestamp(3),thread int,run_time decimal(30,6),
+        source_table_rows bigint default 0,target_table_rows bigint default 0,is_success varchar(100) default '',
+        run_status varchar(10) default '',type varchar(100) default 'TABLE',detail varchar(100) default '',task_sql text,
+        key idx_type_table(type,table_name),key idx_table_name(table_name))"""
+
+
+class TaskRecorder(object):
+    """
+    my_mig_task_info的后台写入线程
+    record只把记录放入内存队列，写入线程攒够batch_size条或者每隔flush_interval秒，用一条多行insert写入并提交一次
+    写入线程使用单独的MySQL连接，不占用迁移以及DDL的会话
+    """
+    _STOP = object()
+
+    def __init__(self, batch_size=500, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name='task_recorder', daemon=True)
+        self._thread.start()
+
+    def record(self, **columns):
+        """记录一条任务信息，参数为my_mig_task_info的列名以及值"""
+        self._queue.put(columns)
+
+    def flush(self):
+        """立即写入队列中的所有记录，写入完成之后返回"""
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+
+    def close(self):
+        """写入剩余的记录并关闭连接"""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        rows = []
+        last_flush = time.time()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if isinstance(item, dict):
+                rows.append(item)
+            if rows and (item is None or not isinstance(item, dict) or len(rows) >= self.batch_size or
+                         time.time() - last_flush >= self.flush_interval):
+                self._write(rows)
+                rows = []
+                last_flush = time.time()
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._STOP:
+                break
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception as e:
+                print(e)
+
+    def _write(self, rows):
+        # 列相同的记录合并为一条多行insert，整批只提交一次
+        groups = {}
+        for row in rows:
+            columns = tuple(sorted(row))
+            groups.setdefault(columns, []).append(tuple(row[column] for column in columns))
+        try:
+            if self._conn is None:
+                self._conn = pymysql.connect(host=configDB.mysql_host, user=configDB.mysql_user,
+                                             password=configDB.mysql_passwd, database=configDB.mysql_database,
+                                             charset=configDB.mysql_dbchar, port=configDB.mysql_port)
+            cursor = self._conn.cursor()
+            for columns, values in groups.items():
+                cursor.executemany('insert into my_mig_task_info(' + ','.join(columns) + ') values(' +
+                                   ','.join(['%s'] * len(columns)) + ')', values)
+            self._conn.commit()
+            cursor.close()
+        except Exception as e:
+            print(e, 'insert into my_mig_task_info failed')
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None  # 下次写入时重新连接
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Oracle字段类型映射到MySQL字段类型的规则表
+
+规则按顺序匹配，每条规则由以下几列组成:
+    Oracle类型 | 长度 | 精度 | 小数位 | 平均长度 | MySQL类型模板 | 默认值处理方式
+条件列写法:
+    *        不做判断
+    >0 >=6   比较运算，支持 > >= < <= = !=
+    -1       不带运算符表示等于，-1即Oracle中该属性为null
+MySQL类型模板可以使用 {length} {actual_length} {precision} {scale} {data_type} 占位符，
+actual_length仅在FIX模式下与length不同，为源表字段实际最大长度乘以1.5
+默认值处理方式:
+    clean    去掉空格以及括号并转大写，sysdate等函数默认值置空
+    raw      保持Oracle原始默认值
+    number   只提取默认值中的数字部分
+    sysdate  sysdate映射为current_timestamp()，其余置空
+    empty    默认值置空
+    null     默认值为null
+config.ini中[type_mapping]配置的规则优先于内置规则，格式与内置规则一致，如:
+    number_flag = NUMBER | * | 1 | 0 | * | TINYINT
+"""
+import operator
+import re
+import time
+
+# 内置映射规则，对应原tbl_columns中的if/elif判断
+TYPE_RULES = [
+    # Oracle类型                        长度        精度    小数位  平均长度  MySQL类型                       默认值
+    # 字符串长度大于等于10000映射为TINYTEXT，设定了一个大值，目的是此条规则当前不生效
+    ('VARCHAR2,NVARCHAR2',              '>=10000', '*',   '*',   '*',    'TINYTEXT',                     'null'),
+    # 注意NVARCHAR2(n),n是存储的字符而不是字节
+    ('VARCHAR2,NVARCHAR2',              '*',       '*',   '*',   '*',    'VARCHAR({actual_length})',     'clean'),
+    ('CHAR,NCHAR',                      '*',       '*',   '*',   '*',    'CHAR({length})',               'clean'),
+    ('UROWID',                          '*',       '*',   '*',   '*',    'VARCHAR({length})',            'clean'),
+    ('DATE,TIMESTAMP(6),TIMESTAMP(0)',  '*',       '*',   '*',   '*',    'DATETIME',                     'sysdate'),
+    # number(m,n) -> decimal(m,n)
+    ('NUMBER',                          '*',       '>0',  '>0',  '*',    'DECIMAL({precision},{scale})', 'raw'),
+    # number(m,0) -> AVG_COL_LEN比较大映射为bigint，否则为int
+    ('NUMBER',                          '*',       '>0',  '=0',  '>=6',  'BIGINT',                       'number'),
+    ('NUMBER',                          '*',       '>0',  '=0',  '<6',   'INT',                          'number'),
+    # 无括号的number
+    ('NUMBER',                          '*',       '-1',  '-1',  '>=6',  'BIGINT',                       'number'),
+    ('NUMBER',                          '*',       '-1',  '-1',  '<6',   'INT',                          'number'),
+    # int类型(oracle的int会自动转为number)
+    ('NUMBER',                          '*',       '-1',  '0',   '>=6',  'BIGINT',                       'number'),
+    ('NUMBER',                          '*',       '-1',  '0',   '<6',   'INT',                          'number'),
+    # 负数小数位number(m,-n)存储的也是整数
+    ('NUMBER',                          '*',       '*',   '<0',  '>=6',  'BIGINT',                       'number'),
+    ('NUMBER',                          '*',       '*',   '<0',  '<6',   'INT',                          'number'),
+    # 大字段不能有默认值
+    ('CLOB,NCLOB,LONG',                 '*',       '*',   '*',   '*',    'LONGTEXT',                     'empty'),
+    ('BLOB,RAW,LONG RAW',               '*',       '*',   '*',   '*',    'LONGBLOB',                     'empty'),
+]
+
+# 未匹配到任何规则的字段类型，通过括号加上字段长度
+FALLBACK_RULE = ('*', '*', '*', '*', '*', '{data_type}({length})', 'raw')
+
+EXCLUDE_DEFAULT_STR = ('SYSDATE', 'SYS_GUID', 'USER')
+
+_OPERATORS = (('>=', operator.ge), ('<=', operator.le), ('!=', operator.ne),
+              ('>', operator.gt), ('<', operator.lt), ('=', operator.eq))
+_NUMBER_PATTERN = re.compile(r'\b\d+\b')
+
+
+def _compile_condition(text):
+    """把条件列的文本编译为(运算函数, 比较值)，*返回None表示不判断"""
+    text = text.strip()
+    if text in ('', '*'):
+        return None
+    for symbol, func in _OPERATORS:
+        if text.startswith(symbol):
+            return func, int(text[len(symbol):])
+    return operator.eq, int(text)
+
+
+def _clean_default(data_default):
+    if data_default is None:
+        return None
+    default_str = str(data_default).upper().replace(' ', '')  # 去掉默认值当中的空格
+    default_str = default_str.replace('(', '').replace(')', '')  # 去除oracle列中默认值的括号
+    if default_str in EXCLUDE_DEFAULT_STR:  # 去掉oracle列有函数的默认值
+        default_str = ''
+    return default_str
+
+
+def _number_default(data_default):
+    # number类型的默认值为null、字符串null或者空串的保持原值，''包围的置空，其余只提取数字部分
+    if data_default is None or data_default.upper().startswith('NULL') or data_default == '':
+        return data_default
+    if data_default.upper() == "''":
+        return ''
+    return _NUMBER_PATTERN.findall(data_default)[0]
+
+
+def _sysdate_default(data_default):
+    if data_default == 'sysdate' or data_default == '( (SYSDATE) )':
+        return 'current_timestamp()'
+    return ''
+
+
+DEFAULT_TRANSFORMS = {
+    'clean': _clean_default,
+    'raw': lambda data_default: data_default,
+    'number': _number_default,
+    'sysdate': _sysdate_default,
+    'empty': lambda data_default: '',
+    'null': lambda data_default: 'null',
+}
+
+
+def parse_rule(text):
+    """解析config.ini中以|分隔的自定义规则"""
+    parts = [part.strip() for part in text.split('|')]
+    if len(parts) == 6:
+        parts.append('raw')
+    if len(parts) != 7:
+        raise ValueError('type mapping rule need 6 or 7 fields: ' + text)
+    return tuple(parts)
+
+
+class TypeMapper(object):
+    """
+    预编译映射规则，按Oracle类型分组，一次处理一张表的全部字段
+    相同字段定义的映射结果会被缓存，宽表以及大量同构表无需重复判断
+    """
+
+    def __init__(self, custom_rules=()):
+        self._rules = {}
+        self._fallback = self._compile(FALLBACK_RULE)
+        self._cache = {}
+        for rule in list(custom_rules) + TYPE_RULES:
+            compiled = self._compile(rule)
+            for data_type in rule[0].upper().split(','):
+                self._rules.setdefault(data_type.strip(), []).append(compiled)
+
+    @staticmethod
+    def _compile(rule):
+        checks = []
+        for index, text in zip((2, 3, 4, 8), rule[1:5]):  # 对应查询结果中长度、精度、小数位、平均长度的列序号
+            condition = _compile_condition(text)
+            if condition:
+                checks.append((index, condition[0], condition[1]))
+        template = rule[5]
+        transform = DEFAULT_TRANSFORMS[rule[6].lower()]
+        return tuple(checks), template, '{' in template, transform
+
+    def _match(self, column, actual_length):
+        for checks, template, is_format, transform in self._rules.get(column[1], ()):
+            if all(func(column[index], value) for index, func, value in checks):
+                break
+        else:
+            checks, template, is_format, transform = self._fallback
+        if is_format:
+            template = template.format(length=column[2], actual_length=actual_length, precision=column[3],
+                                       scale=column[4], data_type=column[1])
+        return template, transform(column[7])
+
+    def map_columns(self, columns, actual_lengths=None, use_cache=True):
+        """
+        columns为tbl_columns查询结果集，字段顺序为
+        COLUMN_NAME,DATA_TYPE,CHAR_LENGTH,DATA_PRECISION,DATA_SCALE,isnull,COMMENTS,DATA_DEFAULT,AVG_COL_LEN
+        actual_lengths为FIX模式下字段名对应的实际长度，use_cache为False时每个字段都重新匹配规则，用于基准测试
+        """
+        result = []
+        cache = self._cache
+        for column in columns:
+            actual_length = column[2]
+            if actual_lengths and column[0] in actual_lengths:
+                actual_length = actual_lengths[column[0]]
+            key = (column[1], column[2], column[3], column[4], column[7], column[8], actual_length)
+            mapped = cache.get(key) if use_cache else None
+            if mapped is None:
+                mapped = self._match(column, actual_length)
+                if use_cache:
+                    cache[key] = mapped
+            result.append({'fieldname': column[0],  # 如下为字段的属性值
+                           'type': mapped[0],  # 列字段类型以及长度范围
+                           'primary': column[0],  # 如果有主键字段返回true，否则false
+                           'default': mapped[1],  # 字段默认值
+                           'isnull': column[5],  # 字段是否允许为空，true为允许，否则为false
+                           'comment': column[6]
+                           })
+        return result
+
+
+def load_custom_rules(config):
+    """读取config.ini中[type_mapping]自定义规则"""
+    rules = []
+    for name, text in config.get_type_mapping():
+        try:
+            rule = parse_rule(text)
+            # 提前编译并格式化一次模板，未知的默认值处理方式、错误的条件以及模板占位符在这里发现
+            TypeMapper._compile(rule)
+            rule[5].format(length=1, actual_length=1, precision=1, scale=0, data_type=rule[0])
+            rules.append(rule)
+        except Exception as e:
+            print('type mapping rule ' + name + ' ignored', e)
+    return rules
+
+
+def synthetic_catalog(column_count):
+    """生成用于基准测试的字段定义"""
+    samples = [
+        ('VARCHAR2', 100, -1, -1, 'True', None, None, 20),
+        ('NVARCHAR2', 50, -1, -1, 'False', None, "'N' ", 3),
+        ('CHAR', 1, -1, -1, 'True', 'comment', "'Y'", 2),
+        ('DATE', 7, -1, -1, 'True', None, 'sysdate', 8),
+        ('TIMESTAMP(6)', 11, -1, -1, 'True', None, None, 11),
+        ('NUMBER', 22, 10, 2, 'True', None, '0', 4),
+        ('NUMBER', 22, 20, 0, 'False', None, None, 8),
+        ('NUMBER', 22, 5, 0, 'True', None, '(1)', 3),
+        ('NUMBER', 22, -1, -1, 'True', None, 'null', 7),
+        ('NUMBER', 22, -1, 0, 'True', None, "''", 2),
+        ('CLOB', 4000, -1, -1, 'True', None, None, 200),
+        ('BLOB', 4000, -1, -1, 'True', None, None, 300),
+        ('FLOAT', 22, 126, -1, 'True', None, None, 5),
+    ]
+    catalog = []
+    for i in range(column_count):
+        data_type, length, precision, scale, isnull, comment, default, avg_len = samples[i % len(samples)]
+        catalog.append(('COL_' + str(i), data_type, length, precision, scale, isnull, comment, default,
+                        avg_len + i % 5))
+    return catalog
+
+
+# 新规则表与旧if/elif判断结果不同的字段定义，基准测试时输出两边的结果
+CHANGED_SAMPLES = [
+    # 负数小数位number(m,-n)旧版不匹配任何分支，字段从建表语句中丢失，现在映射为BIGINT/INT
+    ('COL_NEG_SCALE_BIGINT', 'NUMBER', 22, 10, -2, 'True', None, None, 8),
+    ('COL_NEG_SCALE_INT', 'NUMBER', 22, 5, -1, 'True', None, None, 3),
+    # 整数字段默认值为空串时，旧版只有number(m,0)映射为INT以及无括号number映射为BIGINT两个分支单独判断，
+    # 其余分支提取数字部分时抛出IndexError，现在默认值保持为空串
+    ('COL_INT_EMPTY_DEFAULT', 'NUMBER', 22, -1, 0, 'True', None, '', 8),
+    ('COL_NUMBER_EMPTY_DEFAULT', 'NUMBER', 22, 20, 0, 'True', None, '', 8),
+]
+
+
+def compare_with_ladder(catalog, mapper=None):
+    """
+    逐字段与旧版tbl_columns的if/elif判断结果比较，返回不同的字段[(字段名, 旧结果, 新结果)]
+    旧版丢失的字段旧结果为None，旧版抛出的异常旧结果为异常对象
+    """
+    mapper = mapper or TypeMapper()
+    differences = []
+    for column, mapped in zip(catalog, mapper.map_columns(catalog)):
+        try:
+            expected = _ladder_map_column(column)
+        except Exception as e:
+            expected = e
+        if expected != mapped:
+            differences.append((column[0], expected, mapped))
+    return differences
+
+
+def benchmark(column_count=100000):
+    """
+    与逐字段if/elif判断方式对比映射100k字段的耗时
+    分别统计不使用缓存逐字段匹配规则表以及按字段定义缓存两种方式，synthetic_catalog只有几十种字段定义，缓存命中率很高
+    """
+    catalog = synthetic_catalog(column_count)
+    begin = time.perf_counter()
+    for column in catalog:
+        _ladder_map_column(column)
+    ladder_elapsed = time.perf_counter() - begin
+    begin = time.perf_counter()
+    TypeMapper().map_columns(catalog, use_cache=False)
+    uncached_elapsed = time.perf_counter() - begin
+    mapper = TypeMapper()
+    begin = time.perf_counter()
+    mapper.map_columns(catalog)
+    cached_elapsed = time.perf_counter() - begin
+    print('columns: %d distinct definitions: %d' % (column_count, len(mapper._cache)))
+    print('if/elif: %.3fs rule table uncached: %.3fs (%.1fx) rule table cached: %.3fs (%.1fx)' % (
+        ladder_elapsed, uncached_elapsed, ladder_elapsed / uncached_elapsed, cached_elapsed,
+        ladder_elapsed / cached_elapsed))
+    differences = compare_with_ladder(catalog)
+    if differences:
+        print('WARNING %d columns differ from if/elif mapping' % len(differences))
+        for column_name, expected, mapped in differences[:10]:
+            print(column_name, expected, mapped)
+    else:
+        print('all columns are mapped the same as if/elif mapping')
+    print('behaviour changes compared with if/elif mapping:')
+    for column_name, expected, mapped in compare_with_ladder(CHANGED_SAMPLES):
+        print('%s if/elif: %s rule table: %s %s' % (column_name, 'dropped' if expected is None else (
+            type(expected).__name__ if isinstance(expected, Exception) else expected['type'] + ' default ' + repr(
+                expected['default'])), mapped['type'], 'default ' + repr(mapped['default'])))
+
+
+def _ladder_map_column(column):
+    """
+    旧版tbl_columns非FIX模式的逐字段判断，仅用于基准测试以及结果比较
+    保留旧版的分支顺序以及默认值处理，不匹配任何分支的字段返回None，默认值无法提取数字时同样抛出IndexError
+    """
+    default_str = _clean_default(column[7])
+    data_type, precision, scale, avg_len, default = column[1], column[3], column[4], column[8], column[7]
+    if data_type == 'VARCHAR2' or data_type == 'NVARCHAR2':
+        if column[2] >= 10000:
+            type_str, default = 'TINYTEXT', 'null'
+        else:
+            type_str, default = 'VARCHAR' + '(' + str(int(column[2])) + ')', default_str
+    elif data_type == 'CHAR' or data_type == 'NCHAR':
+        type_str, default = 'CHAR' + '(' + str(column[2]) + ')', default_str
+    elif data_type == 'UROWID':
+        type_str, default = 'VARCHAR' + '(' + str(column[2]) + ')', default_str
+    elif data_type == 'DATE' or data_type == 'TIMESTAMP(6)' or data_type == 'TIMESTAMP(0)':
+        type_str = 'DATETIME'
+        default = 'current_timestamp()' if default == 'sysdate' or default == '( (SYSDATE) )' else ''
+    elif data_type == 'NUMBER':
+        if precision > 0 and scale > 0:
+            type_str = 'DECIMAL' + '(' + str(precision) + ',' + str(scale) + ')'
+        elif (precision > 0 and scale == 0) or (precision == -1 and scale in (-1, 0)):
+            type_str = 'BIGINT' if avg_len >= 6 else 'INT'
+            # 旧版只有number(m,0)映射为INT以及无括号number映射为BIGINT时单独判断了空串默认值
+            empty_branch = (precision > 0 and avg_len < 6) or (precision == -1 and scale == -1 and avg_len >= 6)
+            if default is None or default.upper().startswith('NULL') or (empty_branch and default.upper() == ''):
+                pass
+            else:
+                default = '' if default.upper() == """''""" else re.findall(r'\b\d+\b', default)[0]
+        else:
+            return None
+    elif data_type == 'CLOB' or data_type == 'NCLOB' or data_type == 'LONG':
+        type_str, default = 'LONGTEXT', ''
+    elif data_type == 'BLOB' or data_type == 'RAW' or data_type == 'LONG RAW':
+        type_str, default = 'LONGBLOB', ''
+    else:
+        type_str = data_type + '(' + str(column[2]) + ')'
+    return {'fieldname': column[0], 'type': type_str, 'primary': column[0], 'default': default,
+            'isnull': column[5], 'comment': column[6]}
+
+
+if __name__ == '__main__':
+    benchmark()